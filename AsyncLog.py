@@ -0,0 +1,154 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import signal
+import sys
+import time
+from collections import deque
+
+# ----------------- CONFIGURATION -----------------
+ROOT_LOGGER = "cyberkart"
+LOG_LEVEL = os.environ.get("CYBERKART_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname).1s %(name)s: %(message)s"
+QUEUE_SIZE = 10000          # records waiting for the writer thread; overflow is dropped
+RING_SIZE = 5000            # most recent records kept in memory for dump_ring()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread without ever blocking the caller.
+    Records are queued unformatted (formatting happens on the writer thread)
+    and dropped with a count when the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the last `capacity` records in memory so they can be dumped on demand"""
+
+    def __init__(self, capacity=RING_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def dump(self, stream=None):
+        stream = stream or sys.stderr
+        for record in list(self.records):
+            stream.write(self.format(record) + "\n")
+        stream.flush()
+
+
+class LogSite:
+    """
+    One hot-path call site with its own rate limit and sampling. At most one
+    record per `interval` seconds and one in every `sample` calls goes
+    through; the next record that passes reports how many were suppressed.
+    When the level is disabled a call is a single cached level check.
+    """
+    __slots__ = ("logger", "level", "interval", "sample", "calls", "suppressed", "next_time")
+
+    def __init__(self, logger, level=logging.DEBUG, interval=0.0, sample=1):
+        self.logger = logger
+        self.level = level
+        self.interval = interval
+        self.sample = max(1, int(sample))
+        self.calls = 0
+        self.suppressed = 0
+        self.next_time = 0.0
+
+    def enabled(self):
+        return self.logger.isEnabledFor(self.level)
+
+    def __call__(self, msg, *args):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        self.calls += 1
+        if self.calls % self.sample:
+            self.suppressed += 1
+            return
+        if self.interval:
+            now = time.monotonic()
+            if now < self.next_time:
+                self.suppressed += 1
+                return
+            self.next_time = now + self.interval
+
+        if self.suppressed:
+            msg = f"{msg} (+{self.suppressed} suppressed)"
+            self.suppressed = 0
+        self.logger.log(self.level, msg, *args, stacklevel=2)
+
+
+_listener = None
+_ring = None
+
+
+def setup(level=LOG_LEVEL, stream=None, ring_size=RING_SIZE, queue_size=QUEUE_SIZE):
+    """
+    Route every "cyberkart.*" logger through a non-blocking queue to one
+    background writer thread (console + ring buffer). Safe to call twice.
+    SIGUSR1 dumps the ring buffer to stderr where signals are available.
+    """
+    global _listener, _ring
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    if _listener is not None:
+        return root
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    console = logging.StreamHandler(stream or sys.stdout)
+    console.setFormatter(formatter)
+    _ring = RingBufferHandler(ring_size)
+    _ring.setFormatter(formatter)
+
+    log_queue = queue.Queue(queue_size)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, console, _ring, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+
+    if hasattr(signal, "SIGUSR1"):
+        try:
+            signal.signal(signal.SIGUSR1, lambda signum, frame: dump_ring())
+        except ValueError:
+            pass    # not on the main thread
+    return root
+
+
+def shutdown():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(component):
+    return logging.getLogger(f"{ROOT_LOGGER}.{component}")
+
+
+def set_level(level):
+    logging.getLogger(ROOT_LOGGER).setLevel(level)
+
+
+def dump_ring(stream=None):
+    """Write the in-memory history to `stream` (stderr by default)"""
+    if _ring is not None:
+        _ring.dump(stream)
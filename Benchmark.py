@@ -0,0 +1,315 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import time
+from datetime import datetime
+
+import numpy as np
+
+from Positioning import PositioningEngine, BEACONS, REFERENCE_RSSI
+from StoreLayout import StoreLayout
+
+# ----------------- CONFIGURATION -----------------
+RESULTS_FILE = "benchmark_results.json"
+MAP_RESULTS_FILE = "map_benchmark_results.json"
+
+CYCLE_PERIOD = 3.0          # firmware loop: 2 s scan + 1 s delay
+SCAN_WINDOW = 2.0
+CART_SPEED = 0.7            # m/s, a shopper pushing a cart
+SIM_STEP = 0.1              # trajectory integration step in seconds
+
+# RSSI channel models: true path-loss exponent, log-normal shadowing (dB),
+# probability an advertisement is missed, advertisements heard per scan
+RSSI_MODELS = {
+    "nominal": {"path_loss_exponent": 2.8, "shadowing_sigma": 4.0, "dropout": 0.1, "adverts_per_scan": 5},
+    "noisy": {"path_loss_exponent": 2.8, "shadowing_sigma": 7.0, "dropout": 0.3, "adverts_per_scan": 4},
+    "miscalibrated": {"path_loss_exponent": 3.3, "shadowing_sigma": 5.0, "dropout": 0.2, "adverts_per_scan": 5},
+}
+
+# Pipeline configurations -> PositioningEngine keyword arguments.
+# "map" entries get the store layout injected at run time.
+PIPELINES = {
+    "idw": {"use_kalman": False, "use_particle_filter": False},
+    "idw+kalman": {"use_particle_filter": False},
+    "idw+kalman+particle": {},
+    "idw+kalman+particle+map": {"map": True},
+}
+
+MAP_FRAMES = 200            # timed frames per map rendering scenario
+
+
+# ----------------- SIMULATION -----------------
+def simulate_trajectory(layout, duration, rng):
+    """
+    Ground-truth cart path: a heading random walk at CART_SPEED that turns
+    away whenever the next step would enter a shelf or leave the store.
+    Returns (t, xy) sampled every SIM_STEP seconds.
+    """
+    steps = int(duration / SIM_STEP) + 1
+    xy = np.empty((steps, 2))
+    xy[0] = layout.random_walkable(1, rng)[0]
+    heading = rng.uniform(0, 2 * np.pi)
+
+    for i in range(1, steps):
+        for _ in range(16):
+            heading += rng.normal(0, 0.3)
+            step = CART_SPEED * SIM_STEP * np.array([np.cos(heading), np.sin(heading)])
+            candidate = xy[i - 1] + step
+            if layout.is_walkable(candidate[0], candidate[1]):
+                break
+            heading = rng.uniform(0, 2 * np.pi)
+        else:
+            candidate = xy[i - 1]
+        xy[i] = candidate
+
+    return np.arange(steps) * SIM_STEP, xy
+
+
+def simulate_rssi(t, xy, model, rng, beacons=BEACONS):
+    """
+    Advertisements heard during each scan window, from the log-distance
+    path-loss model with shadowing and dropout.
+    Returns (ticks, truth_at_ticks, [(beacon_idx, rssi, timestamps) per tick]).
+    """
+    beacon_pos = np.array([(b[2], b[3]) for b in beacons])
+    ticks = np.arange(CYCLE_PERIOD, t[-1], CYCLE_PERIOD)
+    truth = np.column_stack((np.interp(ticks, t, xy[:, 0]), np.interp(ticks, t, xy[:, 1])))
+
+    per_scan = model["adverts_per_scan"]
+    batches = []
+    for tick in ticks:
+        stamps = tick - SCAN_WINDOW + SCAN_WINDOW * rng.random((per_scan, len(beacons)))
+        px = np.interp(stamps, t, xy[:, 0])
+        py = np.interp(stamps, t, xy[:, 1])
+        d = np.hypot(px - beacon_pos[:, 0], py - beacon_pos[:, 1])
+        d = np.maximum(d, 0.1)
+
+        rssi = (REFERENCE_RSSI - 10 * model["path_loss_exponent"] * np.log10(d)
+                + rng.normal(0, model["shadowing_sigma"], d.shape))
+        heard = rng.random(d.shape) >= model["dropout"]
+
+        beacon_idx = np.broadcast_to(np.arange(len(beacons)), d.shape)
+        batches.append((beacon_idx[heard], np.round(rssi[heard]).astype(int), stamps[heard]))
+
+    return ticks, truth, batches
+
+
+# ----------------- BENCHMARK -----------------
+def true_cells(truth, layout):
+    """
+    Ground-truth grid cell for each tick, shared by every pipeline: the
+    firmware grid snap of the true position, moved out of shelves like a
+    map-constrained pipeline's output, since the cart is never in a shelf
+    """
+    reference = PositioningEngine(layout=layout)
+    return np.array([reference.snap(x, y) for x, y in truth])
+
+
+def run_pipeline(name, ticks, truth, cells, batches, layout, seed):
+    params = dict(PIPELINES[name])
+    if params.pop("map", False):
+        params["layout"] = layout
+    engine = PositioningEngine(seed=seed, **params)
+
+    estimates = np.empty((len(ticks), 2))
+    snapped = np.empty((len(ticks), 2))
+
+    started = time.process_time()
+    for i, tick in enumerate(ticks):
+        beacon_idx, rssi, stamps = batches[i]
+        engine.add_readings(beacon_idx, rssi, stamps)
+        sx, sy, _, fx, fy = engine.update(tick)
+        estimates[i] = fx, fy
+        snapped[i] = sx, sy
+    cpu_seconds = time.process_time() - started
+
+    error = np.hypot(estimates[:, 0] - truth[:, 0], estimates[:, 1] - truth[:, 1])
+    snap_hits = np.all(np.isclose(snapped, cells), axis=1)
+    walkable = np.array([layout.is_walkable(x, y) for x, y in snapped])
+    if engine.layout is not None and not walkable.all():
+        raise RuntimeError(f"{name}: {int((~walkable).sum())} snapped positions inside a shelf")
+
+    return {
+        "pipeline": name,
+        "updates": int(len(ticks)),
+        "rmse_m": float(np.sqrt(np.mean(error ** 2))),
+        "p95_error_m": float(np.percentile(error, 95)),
+        "snap_accuracy": float(snap_hits.mean()),
+        "snap_walkable": float(walkable.mean()),
+        "updates_per_sec_per_core": float(len(ticks) / cpu_seconds) if cpu_seconds > 0 else None,
+    }
+
+
+def run_benchmark(duration=1800.0, trajectories=3, models=None, pipelines=None, seed=0):
+    layout = StoreLayout.load()
+    models = models or list(RSSI_MODELS)
+    pipelines = pipelines or list(PIPELINES)
+    rng = np.random.default_rng(seed)
+
+    results = []
+    for model_name in models:
+        model = RSSI_MODELS[model_name]
+        runs = {name: [] for name in pipelines}
+
+        for trajectory in range(trajectories):
+            t, xy = simulate_trajectory(layout, duration, rng)
+            ticks, truth, batches = simulate_rssi(t, xy, model, rng)
+            cells = true_cells(truth, layout)
+            for name in pipelines:
+                runs[name].append(run_pipeline(name, ticks, truth, cells, batches, layout, seed + trajectory))
+
+        for name in pipelines:
+            metrics = runs[name]
+            rates = [m["updates_per_sec_per_core"] for m in metrics if m["updates_per_sec_per_core"]]
+            results.append({
+                "model": model_name,
+                "pipeline": name,
+                "updates": sum(m["updates"] for m in metrics),
+                "rmse_m": float(np.mean([m["rmse_m"] for m in metrics])),
+                "p95_error_m": float(np.mean([m["p95_error_m"] for m in metrics])),
+                "snap_accuracy": float(np.mean([m["snap_accuracy"] for m in metrics])),
+                "snap_walkable": float(np.mean([m["snap_walkable"] for m in metrics])),
+                "updates_per_sec_per_core": float(np.mean(rates)) if rates else None,
+            })
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "duration_s": duration,
+        "trajectories": trajectories,
+        "store": {"width": layout.width, "height": layout.height, "layout": layout.source},
+        "beacons": [{"name": b[1], "x": b[2], "y": b[3]} for b in BEACONS],
+        "models": {name: RSSI_MODELS[name] for name in models},
+        "results": results,
+    }
+
+
+# ----------------- MAP RENDERING -----------------
+def run_map_benchmark(item_count=5000, frames=MAP_FRAMES, seed=0):
+    """
+    Frame time of the client MapWidget with `item_count` markers on screen.
+    Each frame is one update_dynamic_elements tick, the position channel
+    wake-up (cart redraw) and a window redraw.
+    Proximity removal is switched off so every item stays on the map.
+    """
+    os.environ.setdefault("KIVY_NO_ARGS", "1")
+    import Client
+    from kivy.base import EventLoop
+
+    EventLoop.ensure_window()
+    window = EventLoop.window
+    rng = np.random.default_rng(seed)
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        visualizer = Client.PositionVisualizer(size=window.size)
+        window.add_widget(visualizer)
+        visualizer.do_layout()
+    widget = visualizer.map_widget
+    widget.check_proximity = lambda: None
+    # position wake-ups are collected here and delivered inside the timed frame
+    wakeups = []
+    Client.POSITION_CHANNEL.schedule = wakeups.append
+
+    spots = StoreLayout.load().random_walkable(item_count, rng)
+
+    def load_items():
+        Client.ITEMS[:] = [(float(x), float(y), f"item{i}") for i, (x, y) in enumerate(spots)]
+        Client.touch_items()
+
+    def move_cart():
+        Client.POSITION_CHANNEL.publish(*(float(v) for v in rng.uniform(0.5, 6.5, 2)))
+
+    def move_item():
+        i = int(rng.integers(item_count))
+        Client.ITEMS[i] = (float(rng.uniform(0, 7)), float(rng.uniform(0, 7)), f"item{i}")
+        Client.touch_items()
+
+    scenarios = [("full_load", load_items, 5), ("idle", None, frames),
+                 ("cart_move", move_cart, frames), ("item_move", move_item, frames)]
+
+    results = []
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for name, mutate, count in scenarios:
+            update_ms, draw_ms = [], []
+            for _ in range(count):
+                if mutate:
+                    mutate()
+                started = time.perf_counter()
+                widget.update_dynamic_elements(0)
+                while wakeups:
+                    wakeups.pop()(0)
+                drawn = time.perf_counter()
+                window.dispatch("on_draw")
+                window.dispatch("on_flip")
+                finished = time.perf_counter()
+                update_ms.append((drawn - started) * 1000)
+                draw_ms.append((finished - drawn) * 1000)
+
+            total = np.add(update_ms, draw_ms)
+            results.append({
+                "scenario": name,
+                "frames": count,
+                "update_ms_mean": float(np.mean(update_ms)),
+                "draw_ms_mean": float(np.mean(draw_ms)),
+                "frame_ms_mean": float(np.mean(total)),
+                "frame_ms_p50": float(np.percentile(total, 50)),
+                "frame_ms_p95": float(np.percentile(total, 95)),
+            })
+
+    window.remove_widget(visualizer)
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "items": item_count,
+        "window": list(window.size),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Positioning accuracy and throughput benchmark")
+    parser.add_argument("--duration", type=float, default=1800.0, help="seconds of simulated shopping per trajectory")
+    parser.add_argument("--trajectories", type=int, default=3)
+    parser.add_argument("--model", action="append", choices=sorted(RSSI_MODELS))
+    parser.add_argument("--pipeline", action="append", choices=sorted(PIPELINES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help=f"results file (default {RESULTS_FILE}, or {MAP_RESULTS_FILE} with --map-items)")
+    parser.add_argument("--map-items", type=int, help="benchmark client map rendering with this many items instead")
+    args = parser.parse_args()
+
+    if args.map_items:
+        output = args.output or MAP_RESULTS_FILE
+        report = run_map_benchmark(args.map_items, seed=args.seed)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+        print(f"{'scenario':12} {'update':>8} {'draw':>8} {'frame':>8} {'p50':>8} {'p95':>8}  (ms, {report['items']} items)")
+        for r in report["results"]:
+            print(f"{r['scenario']:12} {r['update_ms_mean']:8.3f} {r['draw_ms_mean']:8.3f} "
+                  f"{r['frame_ms_mean']:8.3f} {r['frame_ms_p50']:8.3f} {r['frame_ms_p95']:8.3f}")
+        print(f"Results written to {output}")
+        return
+
+    output = args.output or RESULTS_FILE
+    report = run_benchmark(args.duration, args.trajectories, args.model, args.pipeline, args.seed)
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'model':15} {'pipeline':25} {'RMSE':>7} {'P95':>7} {'snap':>6} {'walk':>6} {'upd/s':>9}")
+    for r in report["results"]:
+        rate = r["updates_per_sec_per_core"] or 0.0
+        print(f"{r['model']:15} {r['pipeline']:25} {r['rmse_m']:7.3f} {r['p95_error_m']:7.3f} "
+              f"{r['snap_accuracy']:6.2f} {r['snap_walkable']:6.2f} {rate:9.0f}")
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
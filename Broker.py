@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+import AsyncLog
+
+# ----------------- CONFIGURATION -----------------
+KEEPALIVE = 60
+RECONNECT_DELAY = (1, 30)   # seconds, first and longest wait between reconnect attempts
+
+LOG = AsyncLog.get_logger("broker")
+
+
+class BrokerConnection:
+    """
+    One MQTT connection shared by everything in the process that talks to
+    the same broker, with a single network loop thread. Handlers register
+    per topic filter (wildcards allowed) and are called like paho callbacks,
+    handler(client, userdata, msg), on the network thread. Several handlers
+    may share a filter; the broker sees one subscription. Every filter is
+    subscribed again on each (re)connect, since clean sessions forget them.
+    `connected` is an Event to wait on instead of sleeping.
+    """
+
+    def __init__(self, host, port=1883, client_id=None):
+        self.host = host
+        self.port = port
+        self.client_id = client_id or f"cyberkart_{os.getpid()}_{int(time.time() * 1000)}"
+        self.routes = {}                # topic filter -> [handler, ...]
+        self.table = ()                 # ((filter, handlers), ...) read by the network thread without a lock
+        self.connect_listeners = []
+        self.disconnect_listeners = []
+        self.connected = threading.Event()
+        self.lock = threading.Lock()
+        self.started = False
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id)
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = self.on_message
+        self.client.reconnect_delay_set(*RECONNECT_DELAY)
+
+    # --- Connection ---
+    def start(self):
+        """Start connecting in the background (once); the loop keeps retrying while the broker is down"""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        LOG.info("Connecting to MQTT broker at %s:%s", self.host, self.port)
+        self.client.connect_async(self.host, self.port, KEEPALIVE)
+        self.client.loop_start()
+
+    def stop(self):
+        with self.lock:
+            if not self.started:
+                return
+            self.started = False
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.connected.clear()
+
+    def wait_connected(self, timeout=None):
+        """Start if needed and block until connected; False after `timeout` seconds"""
+        self.start()
+        return self.connected.wait(timeout)
+
+    def when_connected(self, callback):
+        """
+        Call `callback()` on every connect, from the network thread. Runs
+        right away when the connection is already up, so late registrations
+        are not left waiting for a reconnect.
+        """
+        with self.lock:
+            self.connect_listeners.append(callback)
+            up = self.connected.is_set()
+        if up:
+            callback()
+
+    def when_disconnected(self, callback):
+        with self.lock:
+            self.disconnect_listeners.append(callback)
+
+    def on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code.is_failure:
+            LOG.error("MQTT connection refused: %s", reason_code)
+            return
+        with self.lock:
+            topics = list(self.routes)
+            self.connected.set()
+            listeners = list(self.connect_listeners)
+        if topics:
+            client.subscribe([(topic, 0) for topic in topics])
+        LOG.info("MQTT connected; subscribed to %s", ", ".join(topics) or "nothing yet")
+        for callback in listeners:
+            self._call(callback)
+
+    def on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        with self.lock:
+            self.connected.clear()
+            listeners = list(self.disconnect_listeners)
+        if self.started:
+            LOG.warning("MQTT connection lost (%s); reconnecting", reason_code)
+        for callback in listeners:
+            self._call(callback)
+
+    # --- Routing ---
+    def subscribe(self, topic, handler):
+        with self.lock:
+            handlers = self.routes.setdefault(topic, [])
+            first = not handlers
+            handlers.append(handler)
+            self._rebuild()
+            up = self.connected.is_set()
+        if first and up:
+            self.client.subscribe(topic)
+
+    def unsubscribe(self, topic, handler):
+        with self.lock:
+            handlers = self.routes.get(topic, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            last = topic in self.routes and not handlers
+            if last:
+                del self.routes[topic]
+            self._rebuild()
+            up = self.connected.is_set()
+        if last and up:
+            self.client.unsubscribe(topic)
+
+    def _rebuild(self):
+        self.table = tuple((topic, tuple(handlers)) for topic, handlers in self.routes.items())
+
+    def on_message(self, client, userdata, msg):
+        for topic, handlers in self.table:
+            if mqtt.topic_matches_sub(topic, msg.topic):
+                for handler in handlers:
+                    self._call(handler, client, userdata, msg)
+
+    @staticmethod
+    def _call(callback, *args):
+        # one failing handler must not take the shared network loop down with it
+        try:
+            callback(*args)
+        except Exception:
+            LOG.exception("MQTT handler %r failed", callback)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        return self.client.publish(topic, payload, qos, retain)
+
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def get_connection(host, port=1883):
+    """The process's shared, started connection to `host`:`port`"""
+    with _connections_lock:
+        connection = _connections.get((host, port))
+        if connection is None:
+            connection = _connections[(host, port)] = BrokerConnection(host, port)
+    connection.start()
+    return connection
+
+
+def close_all():
+    with _connections_lock:
+        connections = list(_connections.values())
+        _connections.clear()
+    for connection in connections:
+        connection.stop()
@@ -0,0 +1,137 @@
+def to_cents(price):
+    return int(round(float(price) * 100))
+
+
+def parse_item_reply(reply):
+    """(barcode, name, price) of a GET_ITEM reply "ITEM:<barcode>:<name>:<price>"; None for anything else"""
+    parts = reply.split(":")
+    if not reply.startswith("ITEM:") or len(parts) < 4:
+        return None
+    return parts[1], parts[2], float(parts[3])
+
+
+def check_cached_scan(price_cache, barcode, reply):
+    """
+    The checkout's rule for a scan answered from the price cache, once the
+    server's GET_ITEM `reply` is in. Updates the cache and returns the cart
+    change it calls for: ("reprice", name, price) when the server knows the
+    barcode, ("undo", None, None) when it reports it not found. Anything
+    else, a timeout included, returns None and the cached answer stands.
+    """
+    item = parse_item_reply(reply)
+    if item is not None:
+        _, name, price = item
+        price_cache.put(barcode, name, price)
+        return "reprice", name, price
+    if reply.startswith("ERROR:") and "not found" in reply:
+        price_cache.discard(barcode)
+        return "undo", None, None
+    return None
+
+
+def apply_scan_check(cart, barcode, check):
+    """Make the cart change check_cached_scan() returned"""
+    if check is None:
+        return
+    action, name, price = check
+    if action == "reprice":
+        cart.reprice(barcode, name, price)
+    elif action == "undo":
+        cart.decrement(barcode)
+
+
+class CartModel:
+    """
+    Shopping cart keyed by barcode in scan order (dicts keep insertion
+    order), so finding a line is one lookup whatever the cart size. Items
+    are dicts with barcode, name, price and quantity, as the receipt and the
+    row widgets expect. The total is kept as a running sum of integer cents,
+    so it never drifts. Every change is reported to the bound listeners as
+    (event, item) with event "added", "updated" or "removed", or
+    ("cleared", None), so views only touch the affected row.
+    """
+
+    def __init__(self):
+        self.items = {}                 # barcode -> item dict
+        self.total_cents = 0
+        self.listeners = []
+
+    def bind(self, callback):
+        self.listeners.append(callback)
+
+    def changed(self, event, item):
+        for callback in self.listeners:
+            callback(event, item)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(list(self.items.values()))
+
+    def __contains__(self, barcode):
+        return barcode in self.items
+
+    def get(self, barcode):
+        return self.items.get(barcode)
+
+    @property
+    def total(self):
+        return self.total_cents / 100
+
+    # --- Changes ---
+    def add(self, barcode, name, price, quantity=1):
+        """Scan `quantity` of a product; a barcode already in the cart gets its quantity raised"""
+        item = self.items.get(barcode)
+        if item is not None:
+            return self.increment(barcode, quantity)
+        item = {'barcode': barcode, 'name': name, 'price': price, 'quantity': quantity}
+        self.items[barcode] = item
+        self.total_cents += to_cents(price) * quantity
+        self.changed("added", item)
+        return item
+
+    def increment(self, barcode, by=1):
+        item = self.items.get(barcode)
+        if item is None:
+            return None
+        item['quantity'] += by
+        self.total_cents += to_cents(item['price']) * by
+        self.changed("updated", item)
+        return item
+
+    def decrement(self, barcode):
+        """One less of `barcode`; the line is removed when its quantity reaches zero"""
+        item = self.items.get(barcode)
+        if item is None:
+            return None
+        if item['quantity'] <= 1:
+            return self.remove(barcode)
+        return self.increment(barcode, -1)
+
+    def remove(self, barcode):
+        item = self.items.pop(barcode, None)
+        if item is not None:
+            self.total_cents -= to_cents(item['price']) * item['quantity']
+            self.changed("removed", item)
+        return item
+
+    def reprice(self, barcode, name, price):
+        """Correct a line the server priced differently from what was charged"""
+        item = self.items.get(barcode)
+        if item is None or (item['name'] == name and item['price'] == price):
+            return item
+        self.total_cents += (to_cents(price) - to_cents(item['price'])) * item['quantity']
+        item['name'] = name
+        item['price'] = price
+        self.changed("updated", item)
+        return item
+
+    def clear(self):
+        self.items.clear()
+        self.total_cents = 0
+        self.changed("cleared", None)
+
+    def snapshot(self):
+        """Copies of the items, safe to keep after the cart changes (receipts)"""
+        return [dict(item) for item in self.items.values()]
@@ -1,16 +1,15 @@
-import paho.mqtt.client as mqtt
+from Startup import STARTUP     # first import, so the startup timeline starts at launch
 import time
 import json
-from PIL import Image
 import numpy as np
 import threading
-import os
-from datetime import datetime
+import logging
+from collections import deque, namedtuple
 
 # Kivy imports
 from kivy.app import App
-from kivy.uix.widget import Widget
-from kivy.graphics import Color, Rectangle, Ellipse, Triangle, Line, RoundedRectangle
+from kivy.uix.stencilview import StencilView
+from kivy.graphics import Color, Rectangle, Ellipse, Line, RoundedRectangle
 from kivy.clock import Clock
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.boxlayout import BoxLayout
@@ -20,16 +19,30 @@ from kivy.uix.label import Label
 from kivy.uix.popup import Popup
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.gridlayout import GridLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.core.window import Window
-from kivy.core.image import Image as CoreImage
 from kivy.metrics import dp
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-import io
+
+import AsyncLog
+import Broker
+from StoreLayout import StoreLayout
+from Proximity import ProximityEngine, PROXIMITY_THRESHOLD, parse_items_update
+from Routing import Router
+from CommandClient import CommandClient, reply_text
+from SearchIndex import SearchIndex, products_from_catalog
+from Cart import CartModel, parse_item_reply, check_cached_scan, apply_scan_check
+from PriceCache import PriceCache
+from ScanQueue import ScanQueue
+from Receipt import ReceiptWorker
+from MapView import Viewport, cluster_points, CLUSTER_CELL_PX
+from MapWidgets import BackgroundWidget, ItemMarkerBatch, PanZoomMixin
 
 from kivy.config import Config
 Config.set('input', 'mouse', 'mouse, disable_on_activity')
 Config.write()
+STARTUP.mark("modules imported")
 
 # RFID imports
 import sys
@@ -305,15 +318,20 @@ class MFRC522_Pi5:
 MQTT_BROKER = "192.168.137.8"
 MQTT_POSITION_TOPIC = "indoor/position"
 MQTT_CLIENT_TOPIC = "indoor/client"
-CLIENT_ID = "Position_Visualizer_Client"
 MQTT_ITEM_TOPIC = "indoor/items"
 
-# Proximity Check Configuration
-PROXIMITY_THRESHOLD = 0.3
 total_items_count = 0
-# map and grid parameters
+# map and grid parameters (MAP_SIZE is only the fallback when no layout file gives the store size)
 MAP_SIZE = 7.0
 GRID_SIZE = 1.0
+MAX_VISIBLE_MARKERS = 2000  # above this many items in view, markers are clustered
+SEARCH_DEBOUNCE = 0.15      # seconds of no typing before the product search runs
+CATALOG_TIMEOUT = 10.0      # seconds to wait for the catalogue snapshot that warms the price cache
+REPLAY_RETRY = (1.0, 30.0)  # seconds, first and longest wait before retrying a failed scan queue replay
+# cart marker motion between position updates
+CART_MAX_SPEED = 1.5        # m/s, caps the extrapolated velocity
+CART_EXTRAPOLATION = 1.0    # seconds of dead reckoning past the last sample
+CART_BLEND_TIME = 0.15      # seconds to absorb the jump when a sample arrives
 # beacon locations
 BEACONS = [
     (0.0, 0.0, "B1"),
@@ -330,37 +348,78 @@ item_markers = []
 item_labels = []
 
 # shared variables
-current_position = [0.5, 0.5]
-last_update_time = time.time()
 last_item_update_time = 0
 items_loaded = False
+# bumped by touch_items() whenever ITEMS is mutated so the map only
+# re-syncs its item markers when something actually changed
+items_version = 0
+
+# hot-path logging; per-message and per-tick traces are DEBUG and rate limited
+LOG = AsyncLog.get_logger("client")
+LOG_SNAPPED = AsyncLog.LogSite(LOG, logging.INFO, interval=5.0)
+LOG_PROXIMITY = AsyncLog.LogSite(LOG, logging.DEBUG, interval=5.0)
+LOG_ROUTE = AsyncLog.LogSite(LOG, logging.DEBUG, interval=5.0)
+
+# walkability raster of the store; positions inside shelves are snapped
+# back to the nearest aisle cell instead of being dropped
+with STARTUP.span("store layout loaded"):
+    STORE_LAYOUT = StoreLayout.load(width=MAP_SIZE, height=MAP_SIZE)
+
+def touch_items():
+    global items_version
+    items_version += 1
+
+PositionSample = namedtuple("PositionSample", "seq timestamp x y")
+
+class PositionChannel:
+    """
+    Latest-value channel from the MQTT network thread to the Kivy thread.
+    The single writer publishes an immutable PositionSample and rebinds one
+    attribute, which is atomic under the GIL, so readers always get a
+    consistent (x, y). A burst of samples between two frames wakes the UI
+    once and subscribers only see the newest one.
+    """
+
+    def __init__(self, x=0.5, y=0.5, schedule=None):
+        self.latest = PositionSample(0, time.time(), x, y)
+        self.subscribers = []
+        self.schedule = schedule
+        self.wake_pending = False
+
+    def subscribe(self, callback):
+        """callback(sample) runs on the UI thread whenever the position changed."""
+        self.subscribers.append(callback)
+
+    def snapshot(self):
+        return self.latest
+
+    def publish(self, x, y, timestamp=None):
+        """Writer side; returns False if the position did not change."""
+        latest = self.latest
+        if x == latest.x and y == latest.y:
+            return False
+        self.latest = PositionSample(latest.seq + 1, time.time() if timestamp is None else timestamp, x, y)
 
-# defined forbidden positions so that the items are not marked in odd positions
-FORBIDDEN_POSITIONS = [
-    (1.5, 1.5), (1.5, 2.5), (1.5, 3.5), (1.5, 4.5), (1.5, 5.5),
-    (3.5, 1.5), (3.5, 2.5), (3.5, 3.5), (3.5, 4.5), (3.5, 5.5),
-    (5.5, 1.5), (5.5, 2.5), (5.5, 3.5), (5.5, 4.5), (5.5, 5.5)
-]
+        # store before checking the flag; wake() clears it before reading
+        if not self.wake_pending and self.subscribers:
+            self.wake_pending = True
+            (self.schedule or Clock.schedule_once)(self.wake)
+        return True
 
-# ----------------- MQTT CALLBACKS ----------------
-def on_connect(client, userdata, flags, rc):
-    if rc == 0:
-        print("MQTT Connected successfully.")
-        print(f"Subscribed to: {MQTT_POSITION_TOPIC}, {MQTT_ITEM_TOPIC}")
-        client.subscribe(MQTT_POSITION_TOPIC)
-        client.subscribe(MQTT_ITEM_TOPIC)
-    else:
-        print(f"Connection failed with result code {rc}")
+    def wake(self, dt=None):
+        self.wake_pending = False
+        sample = self.latest
+        for callback in self.subscribers:
+            callback(sample)
+
+POSITION_CHANNEL = PositionChannel()
 
+# ----------------- MQTT CALLBACKS ----------------
 def is_valid_position(x, y):
-    # checking the validity of the position
-    for forbidden_x, forbidden_y in FORBIDDEN_POSITIONS:
-        if abs(x - forbidden_x) < 0.1 and abs(y - forbidden_y) < 0.1:
-            return False
-    return True
+    # checking the validity of the position (O(1) raster lookup)
+    return STORE_LAYOUT.is_walkable(x, y)
 
 def on_message_position(client, userdata, msg):
-    global current_position, last_update_time
     try:
         payload = msg.payload.decode().strip()
         parts = payload.split(',')
@@ -371,45 +430,42 @@ def on_message_position(client, userdata, msg):
         new_x = float(parts[0])
         new_y = float(parts[1])
 
-        # checking if the position is not apart of the forbidden list
-        if is_valid_position(new_x, new_y):
-            current_position[0] = new_x
-            current_position[1] = new_y
-            last_update_time = time.time()
-            print(f" POSITION UPDATE: ({new_x:.2f}, {new_y:.2f})")
-        else:
-            print(f"Received Invalid Position (filtered out): X={new_x:.2f}, Y={new_y:.2f}")
+        # positions inside a shelf are corrected to the nearest walkable cell
+        if not is_valid_position(new_x, new_y):
+            snapped_x, snapped_y = STORE_LAYOUT.snap(new_x, new_y)
+            LOG_SNAPPED("Received invalid position (snapped): (%.2f, %.2f) -> (%.2f, %.2f)",
+                        new_x, new_y, snapped_x, snapped_y)
+            new_x, new_y = snapped_x, snapped_y
+
+        POSITION_CHANNEL.publish(new_x, new_y)
     except Exception as e:
-        print(f"Error parsing POSITION MQTT payload: {e}")
+        LOG.error("Error parsing POSITION MQTT payload: %s", e)
+
+def set_items(new_items):
+    """Replace ITEMS; runs on the Kivy thread, which owns every ITEMS mutation."""
+    global last_item_update_time, items_loaded, total_items_count
+    ITEMS[:] = new_items
+    touch_items()
+    total_items_count = len(ITEMS)
+    last_item_update_time = time.time()
+    items_loaded = True
+    LOG.info("Received %d items from server", len(ITEMS))
+    if LOG.isEnabledFor(logging.DEBUG):
+        LOG.debug("Items: %s", [name for _, _, name in ITEMS])
 
 def on_message_items(client, userdata, msg):
-    global ITEMS, last_item_update_time, items_loaded, total_items_count
     try:
         payload = msg.payload.decode().strip()
-        print(f" RAW ITEM MESSAGE: {payload}")  # DEBUG
-
-        data = json.loads(payload)
-        if data.get("type") == "items_update":
-            new_items = []
-            for item in data["items"]:
-                x = item["x"]
-                y = item["y"]
-                name = item["name"]
-                new_items.append((x, y, name))
-                print(f" Loaded/Updated item: {name} at ({x}, {y}) - Types: {type(x)}, {type(y)}")  # DEBUG
-
-            ITEMS.clear()
-            ITEMS.extend(new_items)
-            total_items_count = len(ITEMS)
-            last_item_update_time = time.time()
-            items_loaded = True
-            print(f" Received {len(ITEMS)} items from server")
-            print(f"Items: {[name for _, _, name in ITEMS]}")
+        LOG.debug("Raw item message: %s", payload)
+
+        new_items = parse_items_update(payload)
+        if new_items is not None:
+            Clock.schedule_once(lambda dt: set_items(new_items))
 
     except json.JSONDecodeError as e:
-        print(f" Error parsing ITEMS MQTT JSON: {e}")
+        LOG.error("Error parsing ITEMS MQTT JSON: %s", e)
     except Exception as e:
-        print(f" Error processing ITEMS MQTT message: {e}")
+        LOG.error("Error processing ITEMS MQTT message: %s", e)
 
 # ----------------- SEARCH FUNCTIONALITY -----------------
 class VirtualKeyboard(BoxLayout):
@@ -534,8 +590,13 @@ class VirtualKeyboard(BoxLayout):
             self.add_widget(row_layout)
 
 
-class ProductCard(BoxLayout):
-    def __init__(self, name, price, quantity, barcode, search_app=None, **kwargs):
+class ProductCard(RecycleDataViewBehavior, BoxLayout):
+    """
+    One search result row. Created by ProductList with no arguments and
+    rebound to a product through refresh_view_attrs() as the list scrolls.
+    """
+
+    def __init__(self, name='', price='', quantity='', barcode='', search_app=None, **kwargs):
         super().__init__(**kwargs)
         self.orientation = 'horizontal'
         self.size_hint_y = None
@@ -543,6 +604,8 @@ class ProductCard(BoxLayout):
         self.padding = 10
         self.spacing = 15
         self.name = name
+        self.price = price
+        self.quantity = quantity
         self.barcode = barcode
         self.search_app = search_app
 
@@ -560,7 +623,7 @@ class ProductCard(BoxLayout):
         self.bind(pos=self.update_rect, size=self.update_rect)
 
         # Name label
-        name_label = Label(
+        self.name_label = name_label = Label(
             text=name,
             size_hint_x=0.8,
             font_size='24sp',
@@ -597,6 +660,15 @@ class ProductCard(BoxLayout):
         action_btn.bind(on_press=self.on_pin_pressed)
         self.add_widget(action_btn)
 
+    def refresh_view_attrs(self, rv, index, data):
+        """Rebind this (possibly recycled) card to the product dict `data`"""
+        self.name = data['name']
+        self.price = data['price']
+        self.quantity = data['quantity']
+        self.barcode = data['barcode']
+        self.search_app = rv.search_app
+        self.name_label.text = self.name
+
     def update_rect(self, *args):
         self.outline_rect.pos = (self.pos[0] - 1, self.pos[1] - 1)
         self.outline_rect.size = (self.size[0] + 2, self.size[1] + 2)
@@ -617,36 +689,62 @@ class ProductCard(BoxLayout):
                 return
 
             notification_message = f"PIN_ITEM:{self.name}:{self.barcode}"
-            response = self.search_app.send_command(notification_message)
+            request = self.search_app.request(notification_message)
             print(f" PIN notification sent: {notification_message}")
-            print(f" Server response: {response}")
+            # the reply is handled on the Kivy thread; the UI never waits on the server.
+            # The card may be recycled for another product by then, so the product goes along.
+            name, barcode, search_app = self.name, self.barcode, self.search_app
+            request.add_done_callback(lambda f: Clock.schedule_once(
+                lambda dt: self.on_pin_response(reply_text(f), name, barcode, search_app)))
+        else:
+            print(" Cannot send PIN notification: No search app reference")
 
-            if "ITEM_PINNED:" in response:
-                if ':' in response:
-                    actual_response = response.split(':', 1)[1]
-                else:
-                    actual_response = response
-
-                parts = actual_response.split(":")
-                if len(parts) >= 4 and parts[2] == "SUCCESS":
-                    location_str = parts[3]
-                    try:
-                        coords_str = location_str.replace("Location(", "").replace(")", "")
-                        x_str, y_str = coords_str.split(",")
-                        x = float(x_str.strip())
-                        y = float(y_str.strip())
-                        print(f" Server provided location: ({x}, {y})")
-
-                        if hasattr(self.search_app, 'main_app') and self.search_app.main_app:
-                            self.search_app.main_app.display_pinned_item_locally(self.name, x, y)
-                    except Exception as e:
-                        print(f" Error parsing location: {e}")
-                else:
-                    print(f" PIN failed: {actual_response}")
+    @staticmethod
+    def on_pin_response(response, name, barcode, search_app):
+        print(f" Server response for {name} ({barcode}): {response}")
+
+        if response.startswith("ITEM_PINNED:"):
+            parts = response.split(":")
+            if len(parts) >= 4 and parts[2] == "SUCCESS":
+                location_str = parts[3]
+                try:
+                    coords_str = location_str.replace("Location(", "").replace(")", "")
+                    x_str, y_str = coords_str.split(",")
+                    x = float(x_str.strip())
+                    y = float(y_str.strip())
+                    print(f" Server provided location: ({x}, {y})")
+
+                    if hasattr(search_app, 'main_app') and search_app.main_app:
+                        search_app.main_app.display_pinned_item_locally(name, x, y)
+                except Exception as e:
+                    print(f" Error parsing location: {e}")
             else:
-                print(f" Unexpected response format: {response}")
+                print(f" PIN failed: {response}")
         else:
-            print(" Cannot send PIN notification: No search app reference")
+            print(f" Unexpected response format: {response}")
+
+class ProductList(RecycleView):
+    """
+    Search results as a recycling list. Only the rows on screen plus a
+    small buffer exist as ProductCard widgets; scrolling rebinds them to
+    other products. `data` holds the catalogue's product dicts themselves,
+    so showing a result set never copies or builds per-result widgets.
+    """
+
+    def __init__(self, search_app=None, **kwargs):
+        super().__init__(**kwargs)
+        self.search_app = search_app
+        self.viewclass = ProductCard
+        layout = RecycleBoxLayout(
+            orientation='vertical',
+            size_hint_y=None,
+            default_size=(None, 80),
+            default_size_hint=(1, None),
+            spacing=15,
+            padding=5
+        )
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
 
 class ShoppingSearchApp(BoxLayout):
     def __init__(self, main_app=None, **kwargs):
@@ -654,14 +752,18 @@ class ShoppingSearchApp(BoxLayout):
         self.orientation = 'vertical'
         self.padding = 10
         self.spacing = 8
-        self.host = 'localhost'
+        self.host = MQTT_BROKER
         self.port = 1883
-        self.mqtt_client = None
         self.all_products = []
         self.popup = None
-        self.response_received = threading.Event()
-        self.last_response = None
         self.client_id = f"search_client_{time.time()}"
+        # replies arrive over the process's shared connection, already up when the popup opens
+        self.commands = CommandClient(self.host, self.port, client_id=self.client_id,
+                                      connection=Broker.get_connection(self.host, self.port))
+        self.catalogue_requests = []
+        self.search_index = SearchIndex([])
+        self.shown_query = ""
+        self.search_trigger = Clock.create_trigger(self.run_search, SEARCH_DEBOUNCE)
         self.main_app = main_app
         self.has_searched = False
 
@@ -717,23 +819,19 @@ class ShoppingSearchApp(BoxLayout):
         )
         self.add_widget(self.results_label)
 
-        # Products scroll view
-        self.scroll_view = ScrollView()
-        self.products_layout = BoxLayout(
-            orientation='vertical',
-            size_hint_y=None,
-            spacing=15,
-            padding=5
-        )
-        self.products_layout.bind(minimum_height=self.products_layout.setter('height'))
-        self.scroll_view.add_widget(self.products_layout)
-        self.add_widget(self.scroll_view)
+        # Products list (virtualized)
+        self.product_list = ProductList(search_app=self)
+        self.add_widget(self.product_list)
 
         # Virtual Keyboard
         self.keyboard = VirtualKeyboard(self.search_input)
         self.add_widget(self.keyboard)
 
     def exit_to_map(self, instance):
+        # lookups for a catalogue nobody will see any more
+        for request in self.catalogue_requests:
+            request.cancel()
+        self.commands.close()       # detach from the shared connection
         if self.popup:
             self.popup.dismiss()
         else:
@@ -742,54 +840,13 @@ class ShoppingSearchApp(BoxLayout):
                     widget.dismiss()
                     break
 
-    def connect_to_server(self):
-        try:
-            print(f" Connecting to MQTT broker at {self.host}:{self.port}")
-            self.mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id)
-            self.mqtt_client.on_connect = self.on_connect
-            self.mqtt_client.on_message = self.on_message
-            self.mqtt_client.connect(self.host, self.port, 60)
-            self.mqtt_client.loop_start()
-
-            time.sleep(2)
-            return self.mqtt_client.is_connected()
-        except Exception as e:
-            print(f" MQTT connection error: {e}")
-            return False
-
-    def on_connect(self, client, userdata, flags, rc, properties=None):
-        if rc == 0:
-            print(" Connected to MQTT broker")
-            client.subscribe("shopping_app/responses")
-        else:
-            print(f" Failed to connect, return code {rc}")
+    def request(self, command, timeout=None):
+        """Future for the server's reply to `command`; any number can be in flight"""
+        return self.commands.request(command, timeout)
 
-    def on_message(self, client, userdata, msg):
-        print(f" Received response: {msg.payload.decode()}")
-        self.last_response = msg.payload.decode()
-        self.response_received.set()
-
-    def send_command(self, command):
-        try:
-            if not self.mqtt_client:
-                if not self.connect_to_server():
-                    return "ERROR: Cannot connect to MQTT broker"
-
-            self.response_received.clear()
-            self.last_response = None
-
-            full_command = f"{self.client_id}:{command}"
-            print(f" Sending command: {full_command}")
-            self.mqtt_client.publish("shopping_app/commands", full_command)
-
-            if self.response_received.wait(timeout=5.0):
-                return self.last_response
-            else:
-                return "ERROR: No response from server"
-
-        except Exception as e:
-            self.mqtt_client = None
-            return f"ERROR: {str(e)}"
+    def send_command(self, command, timeout=None):
+        """Blocking request(); failures come back as "ERROR: ..." strings"""
+        return reply_text(self.request(command, timeout))
 
     def load_all_products(self):
         print(" Loading all products...")
@@ -797,75 +854,49 @@ class ShoppingSearchApp(BoxLayout):
 
     def fetch_all_products(self):
         print(" Fetching products from server...")
+        self.commands.connect()     # requests fail fast; this worker thread may wait for the broker
 
-        stock_response = self.send_command("STOCK")
-        prices_response = self.send_command("PRICES")
-
-        print(f" Stock response: {stock_response}")
-        print(f" Prices response: {prices_response}")
-
-        if ":" in stock_response and ":" in prices_response:
-            products = []
-            stock_data = {}
-
-            def strip_client_id(response):
-                if ':' in response:
-                    return response.split(':', 1)[1]
-                return response
-
-            stock_clean = strip_client_id(stock_response)
-            prices_clean = strip_client_id(prices_response)
-
-            # Parse stock data
-            for line in stock_clean.split('\n'):
-                line = line.strip()
-                if line and ':' in line:
-                    parts = line.split(':')
-                    if len(parts) >= 2:
-                        item = parts[0].strip()
-                        qty = parts[1].strip()
-                        stock_data[item] = qty
-                    else:
-                        print(f"  Skipping invalid stock line: {line}")
-
-            # Parse prices data
-            for line in prices_clean.split('\n'):
-                line = line.strip()
-                if line and ':' in line:
-                    parts = line.split(':')
-                    if len(parts) >= 2:
-                        item = parts[0].strip()
-                        price = parts[1].strip()
-                        if item in stock_data:
-                            barcode_response = self.send_command(f"GET_BARCODE:{item}")
-                            print(f" Barcode for {item}: {barcode_response}")
-                            barcode = "N/A"
-                            if barcode_response.startswith("BARCODE:"):
-                                barcode_parts = barcode_response.split(':')
-                                if len(barcode_parts) >= 3:
-                                    barcode = barcode_parts[2]
-                                else:
-                                    barcode = "N/A"
-
-                            products.append({
-                                'name': item,
-                                'price': price,
-                                'quantity': stock_data[item],
-                                'barcode': barcode
-                            })
-                    else:
-                        print(f"  Skipping invalid price line: {line}")
+        # one CATALOG reply carries the name, price, stock and barcode of every product
+        catalog_request = self.request("CATALOG", timeout=CATALOG_TIMEOUT)
+        self.catalogue_requests = [catalog_request]
+        response = reply_text(catalog_request)
 
-            Clock.schedule_once(lambda dt: self.set_all_products(products))
+        products = None
+        if response.startswith("ERROR"):
+            print(f" Error fetching products: {response}")
         else:
-            print(" Error fetching products")
+            try:
+                products = products_from_catalog(response)
+            except (ValueError, KeyError) as e:
+                print(f" Bad catalogue reply: {e}")
+
+        if products is None:
             Clock.schedule_once(lambda dt: setattr(self.results_label, 'text', "Error loading products from server"))
+            return
+        # the index is built here, off the Kivy thread
+        index = SearchIndex(products)
+        Clock.schedule_once(lambda dt: self.set_all_products(products, index))
 
-    def set_all_products(self, products):
+    def set_all_products(self, products, index=None):
         self.all_products = products
+        self.search_index = index or SearchIndex(products)
         print(f" Loaded {len(products)} products into memory")
+        # a query typed while the catalogue was loading is answered now
+        self.shown_query = None
+        if self.search_input.text:
+            self.search_trigger()
 
     def on_search_text(self, instance, value):
+        # every keystroke restarts the quiet period; queries typed over are never run
+        self.search_trigger.cancel()
+        self.search_trigger()
+
+    def run_search(self, dt):
+        value = self.search_input.text
+        if value == self.shown_query:
+            return
+        self.shown_query = value
+
         if not self.has_searched and len(value) > 0:
             self.has_searched = True
 
@@ -874,128 +905,18 @@ class ShoppingSearchApp(BoxLayout):
         elif len(value) == 0 and self.has_searched:
             self.display_products([])
         elif len(value) == 0:
-            self.products_layout.clear_widgets()
+            self.product_list.data = []
 
     def filter_products(self, query):
-        filtered = []
-        query_lower = query.lower()
-
-        for product in self.all_products:
-            name_match = query_lower in product['name'].lower()
-            barcode_match = query_lower in product['barcode'].lower()
-            
-            if name_match or barcode_match:
-                filtered.append(product)
-            #if (query_lower in product['name'].lower() or
-            #        query_lower in product['barcode'].lower()):
-            #    filtered.append(product)
-
-        self.display_products(filtered)
+        self.display_products(self.search_index.search(query))
 
     def display_products(self, products):
-        self.products_layout.clear_widgets()
+        self.product_list.data = products
+        self.product_list.scroll_y = 1
 
         if not products:
             if self.has_searched:
                 self.results_label.text = ""
-            return
-
-        for product in products:
-            card = ProductCard(
-                name=product['name'],
-                price=product['price'],
-                quantity=product['quantity'],
-                barcode=product['barcode'],
-                search_app=self
-            )
-            self.products_layout.add_widget(card)
-
-# ----------------- CHECKOUT FUNCTIONALITY -----------------
-def generate_pdf_receipt(cart_items, total, filename="CyberKart_Receipt.pdf"):
-    c = canvas.Canvas(filename, pagesize=letter)
-    width, height = letter
-    y = height - 60
-
-    # Header
-    c.setFont("Helvetica-Bold", 22)
-    c.drawCentredString(width / 2, y, "CyberKart")
-    y -= 30
-
-    c.setFont("Helvetica", 11)
-    c.drawCentredString(width / 2, y, "Kennesaw State University")
-    y -= 15
-    c.drawCentredString(width / 2, y, "1100 S Marietta Pkwy SE, Marietta, GA 30060")
-    y -= 15
-    c.drawCentredString(width / 2, y, "Phone: (470) 578-6000")
-    y -= 30
-
-    # Transaction Info
-    now = datetime.now().strftime("%m/%d/%y   Time %I:%M %p")
-    transaction_num = f"Trans {int(datetime.now().timestamp()) % 10000}"
-    c.setFont("Helvetica", 11)
-    c.drawString(80, y, f"{transaction_num}     Date {now}")
-    y -= 30
-
-    # Column Headers
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(80, y, "Item")
-    c.drawString(300, y, "Qty")
-    c.drawString(360, y, "Price")
-    c.drawString(430, y, "Amount")
-    y -= 15
-    c.line(70, y, 520, y)
-    y -= 20
-
-    # Item List
-    c.setFont("Helvetica", 11)
-    for item in cart_items:
-        item_name = item['name']
-        qty = str(item['quantity'])
-        price = f"${item['price']:.2f}"
-        amount = f"${item['price'] * item['quantity']:.2f}"
-
-        c.drawString(80, y, item_name)
-        c.drawString(310, y, qty)
-        c.drawString(365, y, price)
-        c.drawString(435, y, amount)
-        y -= 18
-
-        if y < 100:
-            c.showPage()
-            y = height - 100
-
-    y -= 10
-    c.line(70, y, 520, y)
-    y -= 25
-
-    # Totals
-    c.setFont("Helvetica-Bold", 12)
-    c.drawRightString(510, y, f"Total: ${total:.2f}")
-    y -= 40
-
-    # Payment Info
-    c.setFont("Helvetica", 11)
-    c.drawString(80, y, "Payment Method: VISA **** 1234")
-    y -= 15
-    c.drawString(80, y, f"Transaction Type: Sale")
-    y -= 15
-    c.drawString(80, y, f"Entry Method: Contactless")
-    y -= 15
-    c.drawString(80, y, f"Auth Time: {datetime.now().strftime('%I:%M %p')}")
-    y -= 15
-    c.drawString(80, y, f"Trace Number: 46640501")
-    y -= 30
-
-    # Footer
-    c.setFont("Helvetica-Oblique", 11)
-    c.drawCentredString(width / 2, y, "Thank you for shopping with CyberKart!")
-    y -= 20
-    c.drawCentredString(width / 2, y, "Please come again.")
-
-    c.showPage()
-    c.save()
-    return os.path.abspath(filename)
-
 
 class CartItem(BoxLayout):
     def __init__(self, item_data, remove_callback, add_callback, **kwargs):
@@ -1045,7 +966,7 @@ class CartItem(BoxLayout):
         # Product info layout
         info_layout = BoxLayout(orientation='vertical', size_hint_x=0.5, spacing=dp(2))
 
-        name_label = Label(
+        self.name_label = name_label = Label(
             text=self.item_data['name'],
             size_hint_y=0.6,
             halign='left',
@@ -1059,7 +980,7 @@ class CartItem(BoxLayout):
             width=lambda *x: name_label.setter('text_size')(name_label, (name_label.width, None))
         )
 
-        price_label = Label(
+        self.price_label = price_label = Label(
             text=f"${self.item_data['price']:.2f}",
             size_hint_y=0.4,
             color=(0.3, 0.3, 0.3, 1),  # Dark gray text
@@ -1072,14 +993,14 @@ class CartItem(BoxLayout):
         # Quantity layout
         qty_layout = BoxLayout(orientation='vertical', size_hint_x=0.2, spacing=dp(2))
 
-        qty_label = Label(
+        self.qty_label = qty_label = Label(
             text=f"Qty: {self.item_data['quantity']}",
             size_hint_y=0.5,
             color=(0.2, 0.4, 0.6, 1),  # Blue text
             font_size='20sp'
         )
 
-        total_label = Label(
+        self.total_label = total_label = Label(
             text=f"${self.item_data['price'] * self.item_data['quantity']:.2f}",
             size_hint_y=0.5,
             color=(0.1, 0.6, 0.3, 1),  # Green text
@@ -1124,6 +1045,13 @@ class CartItem(BoxLayout):
         self.add_widget(qty_layout)
         self.add_widget(button_layout)
 
+    def refresh(self):
+        """Show the current state of `item_data`; the row itself is kept"""
+        self.name_label.text = self.item_data['name']
+        self.price_label.text = f"${self.item_data['price']:.2f}"
+        self.qty_label.text = f"Qty: {self.item_data['quantity']}"
+        self.total_label.text = f"${self.item_data['price'] * self.item_data['quantity']:.2f}"
+
     def remove_item(self, instance):
         self.remove_callback(self.item_data['barcode'])
 
@@ -1145,22 +1073,34 @@ class ShoppingCartApp(BoxLayout):
         self.bind(pos=self.update_background, size=self.update_background)
 
         # MQTT Configuration
-        self.MQTT_BROKER = "192.168.137.8"
+        self.MQTT_BROKER = MQTT_BROKER
         self.MQTT_PORT = 1883
         self.MQTT_COMMANDS_TOPIC = "shopping_app/commands"
         self.MQTT_RESPONSES_TOPIC = "shopping_app/responses"
+        self.MQTT_CATALOG_TOPIC = "shopping_app/catalog"
         self.CLIENT_ID = f"checkout_client_{int(time.time())}"
 
-        # MQTT Client
-        self.mqtt_client = None
+        # MQTT: the process-wide connection, shared with the map and the search
+        self.connection = Broker.get_connection(self.MQTT_BROKER, self.MQTT_PORT)
         self.connected = False
 
         # PDF generation after checkout
         self.pending_cart_items = []
         self.pending_total = 0.0
+        self.receipts = ReceiptWorker()     # renders off the UI thread
 
-        # Store products from server
-        self.server_products = {}
+        # Barcode -> (name, price) answered locally; kept current by catalogue events
+        self.price_cache = PriceCache()
+        self.cache_syncing = False
+        self.cache_resync = False
+        self.commands = CommandClient(self.MQTT_BROKER, self.MQTT_PORT, client_id=f"{self.CLIENT_ID}_cache",
+                                      connection=self.connection)
+
+        # Scans made while the broker is unreachable, replayed in one batch on reconnect
+        self.scan_queue = ScanQueue()
+        self.restored_scans = self.scan_queue.pending()     # read before a reconnect can replay them
+        self.replaying = False
+        self.replay_delay = REPLAY_RETRY[0]
 
         # RFID payment functionality
         self._cancel_event = None
@@ -1168,40 +1108,51 @@ class ShoppingCartApp(BoxLayout):
         self._last_rfid_read_time = 0
         self._rfid_debounce_sec = 1.0
 
-        self.cart_items = []
+        # cart lines keyed by barcode; rows follow the model's change events
+        self.cart = CartModel()
+        self.cart_rows = {}
+        self.empty_label = None
+        self.cart.bind(self.on_cart_change)
+        self.cart.bind(self.on_cart_queue_change)
         self.setup_mqtt()
         self.setup_ui()
         self.initialize_rfid()
+        self.sync_price_cache()
+        self.restore_scan_queue()
 
     def initialize_rfid(self):
-        """Initialize the RFID reader"""
+        """Initialize the RFID reader in the background; the reset sequence sleeps and must not hold up startup"""
+        threading.Thread(target=self._initialize_rfid, daemon=True, name="rfid-init").start()
+
+    def _initialize_rfid(self):
         try:
             print(" Initializing RFID reader...")
-            self.rfid_reader = MFRC522_Pi5()
+            with STARTUP.span("RFID reader initialized"):
+                reader = MFRC522_Pi5()
+            self.rfid_reader = reader
             print(" RFID Reader initialized successfully")
         except Exception as e:
             print(f" Failed to initialize RFID reader: {e}")
             self.rfid_reader = None
 
     def setup_mqtt(self):
-        self.mqtt_client = mqtt.Client(client_id=self.CLIENT_ID)
-        self.mqtt_client.on_connect = self.on_mqtt_connect
-        self.mqtt_client.on_message = self.on_mqtt_message
-
-        try:
-            self.mqtt_client.connect(self.MQTT_BROKER, self.MQTT_PORT, 60)
-            self.mqtt_client.loop_start()
-        except Exception as e:
-            print(f"MQTT Connection failed: {e}")
-
-    def on_mqtt_connect(self, client, userdata, flags, rc):
-        if rc == 0:
-            self.connected = True
-            client.subscribe(self.MQTT_RESPONSES_TOPIC)
-            client.subscribe("indoor/checkout") # Subscribe to RFID payments
-            print("Connected to MQTT and subscribed to RFID payments")
-        else:
-            print(f"Failed to connect to MQTT, return code {rc}")
+        # the shared connection resubscribes these itself after a reconnect
+        self.connection.subscribe(self.MQTT_RESPONSES_TOPIC, self.on_mqtt_message)
+        self.connection.subscribe(self.MQTT_CATALOG_TOPIC, self.on_mqtt_message)
+        self.connection.subscribe("indoor/checkout", self.on_mqtt_message) # Subscribe to RFID payments
+        self.connection.when_connected(self.on_mqtt_connect)
+        self.connection.when_disconnected(self.on_mqtt_disconnect)
+
+    def on_mqtt_connect(self):
+        self.connected = True
+        print("Connected to MQTT and subscribed to RFID payments")
+        # catalogue events may have been missed while offline
+        self.sync_price_cache()
+        self.replay_scan_queue()
+
+    def on_mqtt_disconnect(self):
+        self.connected = False
+        LOG.warning("MQTT connection lost; scans are queued until it is back")
 
     def on_mqtt_message(self, client, userdata, msg):
         try:
@@ -1218,6 +1169,10 @@ class ShoppingCartApp(BoxLayout):
                 else:
                     Clock.schedule_once(lambda dt: self.process_server_response(payload), 0)
 
+            elif topic == self.MQTT_CATALOG_TOPIC:
+                if self.price_cache.apply_event(payload):
+                    self.sync_price_cache()
+
             # Handle RFID payment messages
             elif topic == "indoor/checkout":
                 if payload.startswith("PAYMENT_COMPLETE:"):
@@ -1249,23 +1204,18 @@ class ShoppingCartApp(BoxLayout):
             self.show_error_popup(f"Error: {error_msg}")
 
         elif response.startswith("ITEM:"):
-            parts = response.split(":")
-            if len(parts) >= 4:
-                barcode = parts[1]
-                item_name = parts[2]
-                price = float(parts[3])
+            item = parse_item_reply(response)
+            if item is not None:
+                barcode, item_name, price = item
 
-                self.server_products[barcode] = {
-                    "name": item_name,
-                    "price": price
-                }
+                self.price_cache.put(barcode, item_name, price)
 
                 self.add_to_cart_from_server(barcode, item_name, price)
 
     def send_command(self, command):
-        if self.mqtt_client and self.connected:
+        if self.connected:
             full_command = f"{self.CLIENT_ID}:{command}"
-            self.mqtt_client.publish(self.MQTT_COMMANDS_TOPIC, full_command)
+            self.connection.publish(self.MQTT_COMMANDS_TOPIC, full_command)
         else:
             self.show_error_popup("Not connected to server")
 
@@ -1422,66 +1372,177 @@ class ShoppingCartApp(BoxLayout):
     def process_barcode(self, instance):
         barcode = self.barcode_input.text.strip()
         if barcode:
-            self.send_command(f"GET_ITEM:{barcode}")
+            cached = self.price_cache.lookup(barcode)
+            if not self.connected:
+                self.scan_queue.append(barcode)
+                self.add_offline_scan(barcode)
+            elif cached is not None:
+                # answered locally; the server confirms in the background
+                name, price = cached
+                self.add_to_cart_from_server(barcode, name, price)
+                threading.Thread(target=self._verify_scan, args=(barcode,), daemon=True).start()
+            else:
+                self.send_command(f"GET_ITEM:{barcode}")
             self.barcode_input.text = ""
 
-    def add_to_cart_from_server(self, barcode, name, price):
-        item_found = False
-        for item in self.cart_items:
-            if item['barcode'] == barcode:
-                item['quantity'] += 1
-                item_found = True
-                break
-
-        if not item_found:
-            self.cart_items.append({
-                'barcode': barcode,
-                'name': name,
-                'price': price,
-                'quantity': 1
-            })
+    def add_offline_scan(self, barcode):
+        """Optimistic cart line for a queued scan: cached price, or a placeholder until replay"""
+        cached = self.price_cache.lookup(barcode)
+        if cached is not None:
+            self.add_to_cart_from_server(barcode, *cached)
+        else:
+            self.add_to_cart_from_server(barcode, f"Pending scan {barcode}", 0.0)
 
-        self.update_display()
+    def restore_scan_queue(self):
+        """Put scans queued before a restart back into the cart"""
+        for barcode in self.restored_scans:
+            self.add_offline_scan(barcode)
+        if self.restored_scans:
+            LOG.info("Restored %d queued scans", len(self.restored_scans))
 
-    def update_display(self):
-        self.cart_items_layout.clear_widgets()
+    def replay_scan_queue(self):
+        """
+        Confirm every queued scan with one GET_ITEMS round trip, off the Kivy
+        thread. While connected, a failed replay is retried with a growing
+        delay, and scans queued during a replay get a replay of their own.
+        """
+        if self.replaying or not self.scan_queue:
+            return
+        self.replaying = True
+
+        def replay():
+            found = None
+            try:
+                self.commands.connect()
+                found = self.scan_queue.replay(self.commands, self.price_cache)
+            finally:
+                self.replaying = False
+
+            if found is not None:
+                Clock.schedule_once(lambda dt: self.apply_replayed_scans(found))
+            if not self.connected:
+                return      # the reconnect replays the queue
+            if found is not None:
+                self.replay_delay = REPLAY_RETRY[0]
+                self.replay_scan_queue()    # scans queued while this replay was in flight, if any
+            else:
+                delay, self.replay_delay = self.replay_delay, min(self.replay_delay * 2, REPLAY_RETRY[1])
+                LOG.info("Retrying the scan queue replay in %.0f s", delay)
+                Clock.schedule_once(lambda dt: self.replay_scan_queue(), delay)
+
+        threading.Thread(target=replay, daemon=True).start()
+
+    def apply_replayed_scans(self, found):
+        unknown = []
+        for barcode, entry in found.items():
+            if entry is None:
+                self.cart.remove(barcode)
+                unknown.append(barcode)
+            else:
+                self.cart.reprice(barcode, entry[0], float(entry[1]))
+        if unknown:
+            self.show_error_popup(f"Not found, removed from cart: {', '.join(unknown)}")
+
+    def sync_price_cache(self):
+        """Fetch a catalogue snapshot into the price cache, off the Kivy thread"""
+        if self.cache_syncing:
+            # the snapshot in flight may predate whatever asked for this one; fetch again after it
+            self.cache_resync = True
+            return
+        self.cache_syncing = True
+        self.cache_resync = False
+
+        def fetch():
+            again = False
+            try:
+                self.commands.connect()
+                response = reply_text(self.commands.request("CATALOG", timeout=CATALOG_TIMEOUT))
+                if response.startswith("ERROR"):
+                    LOG.warning("Price cache not warmed: %s", response)
+                else:
+                    again = self.price_cache.load_snapshot(response)
+                    LOG.info("Price cache warmed with %d barcodes", len(self.price_cache))
+            except (ValueError, KeyError) as e:
+                LOG.error("Bad catalogue snapshot: %s", e)
+            finally:
+                self.cache_syncing = False
+            if again or self.cache_resync:
+                self.sync_price_cache()
+
+        threading.Thread(target=fetch, daemon=True).start()
+
+    def _verify_scan(self, barcode):
+        """Background GET_ITEM for a scan answered from the cache"""
+        response = reply_text(self.commands.request(f"GET_ITEM:{barcode}"))
+        # timeouts keep the cached answer; that is what the cache is for
+        check = check_cached_scan(self.price_cache, barcode, response)
+        if check is not None:
+            Clock.schedule_once(lambda dt: apply_scan_check(self.cart, barcode, check))
+            if check[0] == "undo":
+                # the server no longer knows this barcode: the scan is undone
+                self.show_error_popup(f"Error: {response.replace('ERROR:', '').strip()}")
 
-        if not self.cart_items:
-            empty_label = Label(
+    def add_to_cart_from_server(self, barcode, name, price):
+        self.cart.add(barcode, name, price)
+
+    def on_cart_change(self, event, item):
+        """Create, refresh or drop only the row the change is about"""
+        layout = self.cart_items_layout
+        if event == "added":
+            if self.empty_label is not None:
+                layout.remove_widget(self.empty_label)
+                self.empty_label = None
+            row = CartItem(item, self.remove_item, self.add_item_quantity)
+            self.cart_rows[item['barcode']] = row
+            layout.add_widget(row)
+        elif event == "updated":
+            self.cart_rows[item['barcode']].refresh()
+        elif event == "removed":
+            layout.remove_widget(self.cart_rows.pop(item['barcode']))
+        elif event == "cleared":
+            layout.clear_widgets()
+            self.cart_rows.clear()
+            self.empty_label = None
+
+        if not self.cart and self.empty_label is None:
+            self.empty_label = Label(
                 text="Cart is empty. Scan items to add them.",
                 size_hint_y=None,
                 height=dp(80),
                 color=(0.5, 0.5, 0.5, 1)
             )
-            self.cart_items_layout.add_widget(empty_label)
-        else:
-            for item in self.cart_items:
-                cart_item_widget = CartItem(item, self.remove_item, self.add_item_quantity)
-                self.cart_items_layout.add_widget(cart_item_widget)
+            layout.add_widget(self.empty_label)
+        self.total_label.text = f"Total: ${self.cart.total:.2f}"
 
-        total = sum(item['price'] * item['quantity'] for item in self.cart_items)
-        self.total_label.text = f"Total: ${total:.2f}"
+    def update_display(self):
+        """Rebuild every row from the model (full resync; changes go through on_cart_change)"""
+        self.on_cart_change("cleared", None)
+        for item in self.cart:
+            self.on_cart_change("added", item)
+
+    def on_cart_queue_change(self, event, item):
+        # a cleared cart (clear button, payment, receipt) leaves no scan to replay
+        if event == "cleared":
+            self.scan_queue.clear()
 
     def remove_item(self, barcode):
-        for item in self.cart_items:
-            if item['barcode'] == barcode:
-                if item['quantity'] > 1:
-                    item['quantity'] -= 1
-                else:
-                    self.cart_items = [i for i in self.cart_items if i['barcode'] != barcode]
-                break
-        self.update_display()
+        self.scan_queue.drop(barcode)
+        self.cart.decrement(barcode)
 
     def add_item_quantity(self, barcode):
-        for item in self.cart_items:
-            if item['barcode'] == barcode:
-                item['quantity'] += 1
-                break
-        self.update_display()
+        self.cart.increment(barcode)
 
     # -------- checkout & payment ----------
     def checkout(self, instance):
-        if not self.cart_items:
+        if self.scan_queue:
+            # offline scans may still be $0.00 placeholders; nothing is charged until the server confirms them
+            self.replay_scan_queue()
+            self.show_success_popup(
+                f"Confirming {len(self.scan_queue)} offline scan(s) with the server.\nPlease try again in a moment.",
+                title='Confirming scans')
+            return
+
+        if not self.cart:
             content = BoxLayout(
                 orientation='vertical',
                 spacing=dp(15),
@@ -1542,8 +1603,8 @@ class ShoppingCartApp(BoxLayout):
             empty_cart_popup.open()
             return
 
-        self._pending_total = sum(item['price'] * item['quantity'] for item in self.cart_items)
-        self.pending_cart_items = self.cart_items.copy()
+        self._pending_total = self.cart.total
+        self.pending_cart_items = self.cart.snapshot()
         
         # Create payment popup
         box = BoxLayout(orientation='vertical', spacing=dp(15), padding=dp(20))
@@ -1709,12 +1770,13 @@ class ShoppingCartApp(BoxLayout):
             self.payment_popup.dismiss()
 
         # 2. Store cart items and total for receipt generation (BEFORE clearing)
-        self.pending_cart_items = self.cart_items.copy()
+        self.pending_cart_items = self.cart.snapshot()
         self.pending_total = getattr(self, "_pending_total", 0.0)
 
         # 3. Send checkout command to server
-        checkout_items = [f"{item['barcode']}:{item['quantity']}" for item in self.cart_items]
+        checkout_items = [f"{item['barcode']}:{item['quantity']}" for item in self.cart]
         self.send_command("CHECKOUT " + " ".join(checkout_items))
+        self.scan_queue.clear()     # paid for; the cart itself is cleared after the receipt popup
 
         # 4. Show success message popup
         success_content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(15))
@@ -1807,33 +1869,25 @@ class ShoppingCartApp(BoxLayout):
         def send_email_receipt_handler(instance):
             email = email_input.text.strip()
             if email:
-                try:
-                    # generate_pdf_receipt returns a path
-                    pdf_path = generate_pdf_receipt(self.pending_cart_items, self.pending_total)
-                    # send a command to server to email the receipt (your server-side should handle)
-                    self.send_command(f"EMAIL_RECEIPT:{email}:{pdf_path}")
-                    self.show_success_popup(f"Receipt sent to {email}")
-                except Exception as e:
-                    # If PDF generation or sending failed, show an error but still finalize
-                    self.show_error_popup(f"Failed to send receipt: {e}")
+                # the worker copies the items, so the cart is cleared below while the PDF renders
+                self.receipts.submit(
+                    self.pending_cart_items, self.pending_total,
+                    lambda path, error: Clock.schedule_once(
+                        lambda dt: self.on_receipt_ready(email, path, error)))
             else:
                 # No email entered: show a small confirmation
                 self.show_success_popup("Transaction complete. No email provided.")
 
             # Finalize: clear cart and update UI
-            self.cart_items = []
+            self.cart.clear()
             self.pending_cart_items = []
-            self.update_display()
-            self.total_label.text = "Total: $0.00"
 
             email_popup.dismiss()
 
         # Handler: skip email (clear cart & close)
         def skip_email_handler(instance):
-            self.cart_items = []
+            self.cart.clear()
             self.pending_cart_items = []
-            self.update_display()
-            self.total_label.text = "Total: $0.00"
             email_popup.dismiss()
 
         # Bind handlers (done once, outside the handler bodies)
@@ -1846,12 +1900,22 @@ class ShoppingCartApp(BoxLayout):
         send_btn.bind(on_press=send_email_receipt_handler)
         cancel_btn.bind(on_press=skip_email_handler)
 
-    def show_success_popup(self, message):
+    def on_receipt_ready(self, email, pdf_path, error):
+        """UI thread: the receipt PDF has been written (or failed); email it"""
+        if error is not None:
+            # the transaction is already finalized; only the receipt is missing
+            self.show_error_popup(f"Failed to send receipt: {error}")
+            return
+        # send a command to server to email the receipt (your server-side should handle)
+        self.send_command(f"EMAIL_RECEIPT:{email}:{pdf_path}")
+        self.show_success_popup(f"Receipt sent to {email}")
+
+    def show_success_popup(self, message, title='Success'):
         content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(15))
         content.add_widget(Label(text=message))
         ok_btn = Button(text='OK', size_hint_y=None, height=dp(50))
         popup = Popup(
-            title='Success',
+            title=title,
             content=content,
             size_hint=(0.6, 0.3)
         )
@@ -1860,10 +1924,8 @@ class ShoppingCartApp(BoxLayout):
         popup.open()
 
     def clear_cart(self, instance):
-        self.cart_items = []
+        self.cart.clear()
         self.pending_cart_items = []
-        self.update_display()
-        self.total_label.text = "Total: $0.00"
         if hasattr(self, 'confirmation_popup'):
             self.confirmation_popup.dismiss()
 
@@ -1899,119 +1961,361 @@ class PinnedItemMarker(Button):
         if self.parent and hasattr(self.parent, 'remove_pinned_marker'):
             self.parent.remove_pinned_marker(self)
 
-class BackgroundWidget(Widget):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.bg_texture = None
-        self.load_background()
-        self.bind(pos=self.update_background, size=self.update_background)
-
-    def load_background(self):
-        try:
-            bg_image = Image.open('theMap.png')
-            img_data = io.BytesIO()
-            bg_image.save(img_data, format='png')
-            img_data.seek(0)
-            self.bg_texture = CoreImage(img_data, ext='png').texture
-            print(" Background image 'theMap.png' loaded successfully")
-        except FileNotFoundError:
-            print(" Warning: Background image 'theMap.png' not found")
-            self.bg_texture = None
-        except Exception as e:
-            print(f" Error loading background: {e}")
-            self.bg_texture = None
-
-    def update_background(self, *args):
-        self.canvas.clear()
-        if self.bg_texture:
-            with self.canvas:
-                Color(1, 1, 1, 1)
-                Rectangle(texture=self.bg_texture, pos=self.pos, size=self.size)
-
-class MapWidget(Widget):
-    def __init__(self, main_app=None, **kwargs):
+class CartMotion:
+    """
+    Render-side motion model for the cart marker. Keeps the last few
+    timestamped position samples and dead-reckons from the newest one with
+    their velocity, so the marker can be drawn at any frame time. When a new
+    sample disagrees with the extrapolated track, the difference is blended
+    out over CART_BLEND_TIME instead of jumping. Unchanged positions are not
+    sampled, so after CART_EXTRAPOLATION the marker returns to the last one.
+    Given a `layout`, dead reckoning stops at the last walkable point on its
+    way, so the marker never coasts through a shelf.
+    """
+
+    def __init__(self, history=8, max_speed=CART_MAX_SPEED,
+                 horizon=CART_EXTRAPOLATION, blend_time=CART_BLEND_TIME, layout=None):
+        self.samples = deque(maxlen=history)
+        self.layout = layout
+        self.max_speed = max_speed
+        self.horizon = horizon
+        self.blend_time = blend_time
+        self.velocity = (0.0, 0.0)
+        self.offset = (0.0, 0.0)
+        self.offset_time = 0.0
+
+    def add_sample(self, x, y, t):
+        if self.samples:
+            shown_x, shown_y = self.position_at(t)
+        else:
+            shown_x, shown_y = x, y
+        self.samples.append((t, x, y))
+
+        self.velocity = (0.0, 0.0)
+        if len(self.samples) >= 2:
+            t0, x0, y0 = self.samples[-2]
+            if t > t0:
+                vx, vy = (x - x0) / (t - t0), (y - y0) / (t - t0)
+                speed = np.hypot(vx, vy)
+                if speed > self.max_speed:
+                    vx, vy = vx * self.max_speed / speed, vy * self.max_speed / speed
+                self.velocity = (vx, vy)
+
+        self.offset = (shown_x - x, shown_y - y)
+        self.offset_time = t
+
+    def track(self, t):
+        t_last, x, y = self.samples[-1]
+        ahead = max(t - t_last, 0.0)
+        if ahead > self.horizon:
+            # no sample for a whole horizon: the cart has stopped, so glide
+            # back onto the last reported position instead of staying ahead
+            back = (ahead - self.horizon) / self.blend_time if self.blend_time > 0 else 1.0
+            ahead = self.horizon * max(0.0, 1.0 - back)
+        dx, dy = self.velocity[0] * ahead, self.velocity[1] * ahead
+        if self.layout is None or (dx == 0.0 and dy == 0.0):
+            return x + dx, y + dy
+
+        # walk the extrapolated segment in half-cell steps; a thin shelf cannot be skipped
+        steps = int(np.hypot(dx, dy) * 2 / self.layout.resolution) + 1
+        fractions = np.arange(1, steps + 1) / steps
+        walkable = self.layout.walkable_many(x + dx * fractions, y + dy * fractions)
+        if walkable.all():
+            return x + dx, y + dy
+        blocked = int(np.argmin(walkable))
+        reach = float(fractions[blocked - 1]) if blocked else 0.0
+        return x + dx * reach, y + dy * reach
+
+    def position_at(self, t):
+        x, y = self.track(t)
+        if self.blend_time > 0:
+            remaining = max(0.0, 1.0 - (t - self.offset_time) / self.blend_time)
+            x += self.offset[0] * remaining
+            y += self.offset[1] * remaining
+        return x, y
+
+    def settled(self, t):
+        """True once the marker no longer moves until the next sample."""
+        t_last = self.samples[-1][0]
+        return (t - t_last >= self.horizon + self.blend_time or self.velocity == (0.0, 0.0)) \
+            and t - self.offset_time >= self.blend_time
+
+class MapWidget(PanZoomMixin, StencilView):
+    """
+    Retained scene graph for the live map. The cart and the nearest target
+    are single instructions and the item markers are one ItemMarkerBatch;
+    all are created once and mutated in place, and each tick only touches
+    what changed since the previous one. The cart is moved every frame from
+    a CartMotion model, independently of the 0.5 s item/target tick.
+
+    The map pans (drag) and zooms (wheel, pinch, double tap to fit) through
+    a shared Viewport. Only items inside the viewport get markers; above
+    MAX_VISIBLE_MARKERS they are drawn as clusters instead.
+    """
+
+    def __init__(self, main_app=None, viewport=None, **kwargs):
         super().__init__(**kwargs)
         
         self.pinned_markers = main_app.pinned_markers
         self.pinned_item_names = main_app.pinned_item_names
         
         self.main_app = main_app
-        Clock.schedule_interval(self.update_dynamic_elements, 0.5)
-        Clock.schedule_interval(self.debug_positions, 5.0)
         self.last_item_count = 0
         self.last_target = None
 
+        self.viewport = viewport or Viewport(STORE_LAYOUT.width, STORE_LAYOUT.height)
+        self.touches = []
+
+        # item markers sit below the target highlight and the cart
+        self.item_markers = ItemMarkerBatch((0, 1, 0, 0.7))
+        self.cluster_markers = ItemMarkerBatch((0, 0.45, 0.2, 0.85),
+                                               [[-9, -9], [9, -9], [0, 11]])
+        self.canvas.add(self.item_markers.group)
+        self.canvas.add(self.cluster_markers.group)
+
+        with self.canvas:
+            Color(0.2, 0.45, 1, 0.85)
+            self.route_line = Line(points=[], width=2, joint='round')
+            self.target_color = Color(1, 1, 0, 0)
+            self.target_marker = Ellipse(pos=(0, 0), size=(9, 9))
+            Color(1, 0, 0)
+            self.cart_marker = Ellipse(pos=(0, 0), size=(12, 12))
+
+        self.proximity = ProximityEngine(PROXIMITY_THRESHOLD)
+        self.router = Router(STORE_LAYOUT)
+        self.route_planning = False
+        self.unpinned = np.empty(0, dtype=bool)
+        self.unpinned_key = None
+        self.drawn_items_version = None
+        self.drawn_pinned = None
+        self.drawn_position = None
+        self.layout_dirty = True
+        self.redraw_trigger = Clock.create_trigger(self.update_dynamic_elements)
+        self.viewport.bind(self.on_viewport)
+        self.bind(pos=self.follow_widget, size=self.follow_widget)
+
+        self.motion = CartMotion(layout=STORE_LAYOUT)
+        self.cart_dirty = True
+        self.cart_animating = False
+        self.on_position(POSITION_CHANNEL.snapshot())
+        POSITION_CHANNEL.subscribe(self.on_position)
+
+        Clock.schedule_interval(self.update_dynamic_elements, 0.5)
+        Clock.schedule_interval(self.debug_positions, 5.0)
+
+    def follow_widget(self, *args):
+        self.viewport.set_widget(self.pos, self.size)
+
+    def on_viewport(self, viewport):
+        self.layout_dirty = True
+        self.start_cart_animation()
+        self.redraw_trigger()
+
+    def on_position(self, sample):
+        """Woken by POSITION_CHANNEL when the cart position changed."""
+        self.motion.add_sample(sample.x, sample.y, sample.timestamp)
+        self.start_cart_animation()
+        self.update_cart(0)
+
+    def start_cart_animation(self):
+        self.cart_dirty = True
+        if not self.cart_animating:
+            self.cart_animating = True
+            Clock.schedule_interval(self.update_cart, 0)
+
+    def to_screen(self, x, y):
+        return self.viewport.to_screen(x, y)
+
     def debug_positions(self, dt):
-        print("\n" + "=" * 50)
-        print(" DEBUG POSITION COMPARISON")
-        print(f" TAG Position: ({current_position[0]:.3f}, {current_position[1]:.3f})")
+        if not LOG.isEnabledFor(logging.DEBUG):
+            return
+
+        sample = POSITION_CHANNEL.snapshot()
+        x, y = sample.x, sample.y
+        lines = ["DEBUG POSITION COMPARISON", f" TAG Position: ({x:.3f}, {y:.3f})"]
 
         if ITEMS:
             for i, (item_x, item_y, name) in enumerate(ITEMS):
-                distance = np.sqrt((current_position[0] - item_x) ** 2 + (current_position[1] - item_y) ** 2)
-                print(f" Item '{name}': ({item_x:.3f}, {item_y:.3f}) - Distance: {distance:.4f}")
+                distance = np.sqrt((x - item_x) ** 2 + (y - item_y) ** 2)
+                lines.append(f" Item '{name}': ({item_x:.3f}, {item_y:.3f}) - Distance: {distance:.4f}")
 
-                if current_position[0] == item_x and current_position[1] == item_y:
-                    print(f" EXACT MATCH FOUND for '{name}'!")
+                if x == item_x and y == item_y:
+                    lines.append(f" EXACT MATCH FOUND for '{name}'!")
                 elif distance < 0.001:
-                    print(f"  Very close match for '{name}' - distance: {distance:.6f}")
+                    lines.append(f"  Very close match for '{name}' - distance: {distance:.6f}")
         else:
-            print("ÃƒÂ°Ã…Â¸Ã¢â‚¬Å“Ã‚Â¦ No items in ITEMS list")
-        print("=" * 50 + "\n")
+            lines.append(" No items in ITEMS list")
+        LOG.debug("\n".join(lines))
 
     def update_dynamic_elements(self, dt):
+        pinned = frozenset(self.pinned_item_names)
+        items_dirty = (self.layout_dirty or self.drawn_items_version != items_version
+                       or self.drawn_pinned != pinned)
+        sample = POSITION_CHANNEL.snapshot()
+        position = (sample.x, sample.y)
+        moved = self.layout_dirty or self.drawn_position != position
+
+        # idle frame: nothing moved, nothing to draw or check
+        if not (items_dirty or moved):
+            return
+
+        if items_dirty:
+            self.sync_item_markers(pinned)
+        self.update_target(position, pinned)
+        self.update_route(position)
+
+        self.drawn_items_version = items_version
+        self.drawn_pinned = pinned
+        self.drawn_position = position
+        self.layout_dirty = False
+
+        self.check_proximity()
+
+    def update_cart(self, dt):
+        """Per-frame cart redraw while the marker is moving; unschedules itself once settled."""
+        now = time.time()
+        if not self.cart_dirty and self.motion.settled(now):
+            self.cart_animating = False
+            return False
+
+        x, y = self.motion.position_at(now)
+        sx, sy = self.to_screen(x, y)
+        self.cart_marker.pos = (sx - 6, sy - 6)
+        self.cart_dirty = False
+
+    def sync_item_markers(self, pinned):
+        """
+        Make the markers match the unpinned items inside the viewport:
+        individual markers when there are few enough, clusters otherwise.
+        """
         if len(ITEMS) != self.last_item_count:
-            print(f" ITEMS list changed: {self.last_item_count} -> {len(ITEMS)} items")
+            LOG.info("ITEMS list changed: %d -> %d items", self.last_item_count, len(ITEMS))
             self.last_item_count = len(ITEMS)
 
-        self.canvas.clear()
+        engine = self.proximity
+        engine.sync(ITEMS, items_version)
+        if self.unpinned_key != (engine.version, pinned):
+            self.unpinned = np.fromiter((item[2] not in pinned for item in engine.items),
+                                        dtype=bool, count=len(engine.items))
+            self.unpinned_key = (engine.version, pinned)
+
+        markers, clusters = self.item_markers, self.cluster_markers
+        if self.layout_dirty:
+            origin, scale = self.viewport.transform()
+            markers.set_transform(origin, scale)
+            clusters.set_transform(origin, scale)
+
+        visible = engine.visible(self.viewport.bounds())
+        visible = visible[self.unpinned[visible]]
+
+        if len(visible) > MAX_VISIBLE_MARKERS:
+            markers.clear()
+            markers.flush()
+            cx, cy, counts = cluster_points(engine.xs[visible], engine.ys[visible],
+                                            CLUSTER_CELL_PX / self.viewport.zoom)
+            clusters.clear()
+            clusters.add_many(list(range(len(counts))), np.column_stack((cx, cy)))
+            clusters.flush()
+            return
 
-        scale_x = self.width / MAP_SIZE
-        scale_y = self.height / MAP_SIZE
+        if len(clusters):
+            clusters.clear()
+            clusters.flush()
+
+        wanted = {}
+        seen = {}
+        for index in visible.tolist():
+            item_x, item_y, name = engine.items[index]
+            # duplicate names get their own marker
+            occurrence = seen.get(name, 0)
+            seen[name] = occurrence + 1
+            wanted[(name, occurrence)] = (item_x, item_y)
+
+        markers.remove_many([key for key in markers.slots if key not in wanted])
+
+        added, added_xy, moved, moved_xy = [], [], [], []
+        slots, coords = markers.slots, markers.coords
+        for key, xy in wanted.items():
+            slot = slots.get(key)
+            if slot is None:
+                added.append(key)
+                added_xy.append(xy)
+            elif coords[slot, 0] != xy[0] or coords[slot, 1] != xy[1]:
+                moved.append(key)
+                moved_xy.append(xy)
+        markers.move_many(moved, moved_xy)
+        markers.add_many(added, added_xy)
+        markers.flush()
+
+    def update_route(self, position):
+        """Walking route from the cart through every pinned item, in visiting order."""
+        targets = [(marker.x_coord, marker.y_coord) for marker in self.pinned_markers]
+        if not targets:
+            self.route_line.points = []
+            return
 
-        with self.canvas:
-            # 1. User position marker
-            x, y = current_position
-            Color(1, 0, 0)
-            Ellipse(pos=(self.x + x * scale_x - 6, self.y + y * scale_y - 6), size=(12, 12))
-
-            # 2. Plot current items from MQTT (skip pinned items)
-            for item_x, item_y, name in ITEMS:
-                if self.main_app and name in self.main_app.pinned_item_names:
-                    continue
-
-                Color(0, 1, 0, 0.7)
-                Triangle(points=[
-                    self.x + item_x * scale_x, self.y + item_y * scale_y + 8,
-                    self.x + item_x * scale_x - 6, self.y + item_y * scale_y - 4,
-                    self.x + item_x * scale_x + 6, self.y + item_y * scale_y - 4
-                ])
-
-            # 3. Closest Item target
-            if ITEMS:
-                closest_index = None
-                closest_distance = None
-                for idx, item in enumerate(ITEMS):
-                    item_x, item_y, item_name = item
-                    dist = np.sqrt((x - item_x) ** 2 + (y - item_y) ** 2)
-                    if closest_distance is None or dist < closest_distance:
-                        closest_distance = dist
-                        closest_index = idx
-
-                if closest_index is not None:
-                    target_x, target_y, target_name = ITEMS[closest_index]
-                    if not (self.main_app and target_name in self.main_app.pinned_item_names):
-                        Color(1, 1, 0)
-                        Ellipse(pos=(self.x + target_x * scale_x - 9 / 2,
-                                     self.y + target_y * scale_y - 9 / 2),
-                                size=(9, 9))
-
-                    if self.last_target != target_name:
-                        target_type = "PINNED" if (self.main_app and target_name in self.main_app.pinned_item_names) else "REGULAR"
-                        print(f" NEW TARGET: {target_name} at ({target_x:.1f}, {target_y:.1f}) [{target_type}]")
-                        self.last_target = target_name
+        planned = self.router.planned(position, targets)
+        if planned is None:
+            # the old line stays up until the worker has the new plan
+            self.plan_route(position, targets)
+            return
+        order, points = planned
 
-        self.check_proximity()
+        (ox, oy), (scale, _) = self.viewport.transform()
+        self.route_line.points = [v for x, y in points for v in (ox + x * scale, oy + y * scale)]
+
+    def plan_route(self, position, targets):
+        """
+        Plan on a worker thread: a new pin costs a Dijkstra over the whole
+        aisle graph, too slow for a frame in a large store. One plan runs at a
+        time; when it lands the route is redrawn from wherever the cart is then.
+        """
+        if self.route_planning:
+            return
+        self.route_planning = True
+
+        def plan():
+            started = time.perf_counter()
+            try:
+                order, _ = self.router.plan(position, targets)
+                LOG_ROUTE("Route through %d pins planned in %.2f ms", len(order), (time.perf_counter() - started) * 1000)
+                ok = True
+            except Exception:
+                LOG.exception("Route planning failed")
+                ok = False
+            Clock.schedule_once(lambda dt: self.on_route_planned(ok))
+
+        threading.Thread(target=plan, daemon=True, name="route-plan").start()
+
+    def on_route_planned(self, ok):
+        self.route_planning = False
+        # a failed plan is not retried straight away; the next move or pin change tries again
+        if ok and self.drawn_position is not None:
+            self.update_route(self.drawn_position)
+
+    def query_proximity(self, x, y):
+        self.proximity.sync(ITEMS, items_version)
+        return self.proximity.query(x, y)
+
+    def update_target(self, position, pinned):
+        """Highlight the item closest to the cart."""
+        nearest = self.query_proximity(*position).nearest
+        if nearest is None:
+            self.target_color.a = 0
+            return
+
+        target_x, target_y, target_name = nearest
+        if target_name in pinned:
+            self.target_color.a = 0
+        else:
+            sx, sy = self.to_screen(target_x, target_y)
+            self.target_marker.pos = (sx - 9 / 2, sy - 9 / 2)
+            self.target_color.a = 1
+
+        if self.last_target != target_name:
+            target_type = "PINNED" if target_name in pinned else "REGULAR"
+            LOG.info("New target: %s at (%.1f, %.1f) [%s]", target_name, target_x, target_y, target_type)
+            self.last_target = target_name
 
     def remove_pinned_marker_by_name(self, item_name):
         """
@@ -2030,36 +2334,24 @@ class MapWidget(Widget):
 
 
     def check_proximity(self):
-            x, y = current_position
-
-            print(f" Proximity check - Position: ({x:.2f}, {y:.2f})")
-            print(f" Checking {len(ITEMS)} items in ITEMS list")
-
-            items_to_remove_indices = []
-            for idx, item in enumerate(ITEMS):
-                item_x, item_y, item_name = item
-                dist = np.sqrt((x - item_x) ** 2 + (y - item_y) ** 2)
+            sample = POSITION_CHANNEL.snapshot()
+            x, y = sample.x, sample.y
 
-                print(f" Item {item_name} at ({item_x:.2f}, {item_y:.2f}) - Distance: {dist:.3f}")
+            LOG_PROXIMITY("Proximity check - position (%.2f, %.2f), %d items", x, y, len(ITEMS))
 
-                if dist < PROXIMITY_THRESHOLD:
-                    print(f" REACHED ITEM: {item_name} - Removing!")
-                    items_to_remove_indices.append(idx)
+            reached = self.query_proximity(x, y).reached
+            if reached:
+                # drop reached entries by value; indices may be stale by now
+                gone = set(reached)
+                ITEMS[:] = [item for item in ITEMS if item not in gone]
+                touch_items()
 
-            if items_to_remove_indices:
-                for idx in sorted(items_to_remove_indices, reverse=True):
-                    removed_item = ITEMS.pop(idx)
-                    item_name = removed_item[2]
-                    print(f" Removed from ITEMS list: {item_name}")
-                    
-                    # Original removal call (which likely fails due to name mismatch)
+                for item_x, item_y, item_name in reached:
+                    LOG.info("Reached item: %s at (%.2f, %.2f) - removed from ITEMS list", item_name, item_x, item_y)
                     self.main_app.remove_pinned_marker_by_name(item_name)
-                    
+
                 # --- NEW REFRESH CALL ---
                 self.refresh_map_pins() # Force visual cleanup of any stuck pins
-
-            else:
-                print("   No items reached in this check")
                 
     def refresh_map_pins(self):
         """
@@ -2089,10 +2381,14 @@ class PositionVisualizer(FloatLayout):
         self.pinned_markers = []
         self.pinned_item_names = set()
 
-        self.background_widget = BackgroundWidget()
+        # pan/zoom state shared by the background tiles, the markers and the pins
+        self.viewport = Viewport(STORE_LAYOUT.width, STORE_LAYOUT.height)
+        self.viewport.bind(self.layout_pins)
+
+        self.background_widget = BackgroundWidget(viewport=self.viewport, timeline=STARTUP)
         self.add_widget(self.background_widget)
 
-        self.map_widget = MapWidget(main_app=self)
+        self.map_widget = MapWidget(main_app=self, viewport=self.viewport)
         self.add_widget(self.map_widget)
 
         self.add_search_button()
@@ -2115,6 +2411,20 @@ class PositionVisualizer(FloatLayout):
                 print(f"? Pin object removed for: {item_name}")
                 return # Stop searching once found
 
+    def layout_pin(self, marker):
+        """Centre a pin on its store position; hide it while it is outside the viewport"""
+        sx, sy = self.viewport.to_screen(marker.x_coord, marker.y_coord)
+        marker.center = (sx, sy)
+        x0, y0 = self.viewport.pos
+        w, h = self.viewport.size
+        inside = x0 <= sx <= x0 + w and y0 <= sy <= y0 + h
+        marker.opacity = 1 if inside else 0
+        marker.disabled = not inside
+
+    def layout_pins(self, *args):
+        for marker in self.pinned_markers:
+            self.layout_pin(marker)
+
     def add_search_button(self):
         search_button = Button(
             text='Search Store',
@@ -2153,12 +2463,14 @@ class PositionVisualizer(FloatLayout):
         for i, (existing_x, existing_y, existing_name) in enumerate(ITEMS):
             if existing_name == item_name:
                 ITEMS[i] = (x, y, item_name)
+                touch_items()
                 print(f" Updated position for {item_name} in ITEMS list: ({existing_x}, {existing_y}) -> ({x}, {y})")
                 item_found = True
                 break
 
         if not item_found:
             ITEMS.append((x, y, item_name))
+            touch_items()
             print(f" Added {item_name} to ITEMS list for proximity checking")
 
         print(f" ITEMS list now has {len(ITEMS)} items: {[name for _, _, name in ITEMS]}")
@@ -2171,17 +2483,14 @@ class PositionVisualizer(FloatLayout):
             self.show_already_pinned_warning(item_name)
             return
 
-        screen_x = x / MAP_SIZE
-        screen_y = y / MAP_SIZE
-
         pinned_marker = PinnedItemMarker(
             item_name=item_name,
             x=x,
-            y=y,
-            pos_hint={'center_x': screen_x, 'center_y': screen_y}
+            y=y
         )
 
         self.add_widget(pinned_marker)
+        self.layout_pin(pinned_marker)
         self.pinned_markers.append(pinned_marker)
         self.pinned_item_names.add(item_name)
 
@@ -2224,6 +2533,7 @@ class PositionVisualizer(FloatLayout):
             for i, (x, y, name) in enumerate(ITEMS):
                 if name == marker.item_name:
                     ITEMS.pop(i)
+                    touch_items()
                     print(f" Also removed {marker.item_name} from ITEMS list to prevent generic icons")
                     break
             
@@ -2283,10 +2593,22 @@ class CombinedShoppingApp(App):
         
         Window.fullscreen = True
         
-        return CombinedApp()
+        STARTUP.mark("window created")
+        root = CombinedApp()
+        STARTUP.mark("widgets built")
+        return root
+
+    def on_start(self):
+        Window.bind(on_flip=self.on_first_frame)
+
+    def on_first_frame(self, window):
+        # on_flip fires once the frame is on screen: the map is interactive from here
+        window.unbind(on_flip=self.on_first_frame)
+        STARTUP.report("first map frame")
 
 # ----------------- MAIN EXECUTION -----------------
 def main():
+    AsyncLog.setup()
     print("Starting Combined Shopping Application")
     print("=" * 50)
     print(f"MQTT Broker: {MQTT_BROKER}")
@@ -2294,27 +2616,17 @@ def main():
     print(f"Item Topic: {MQTT_ITEM_TOPIC}")
     print("=" * 50)
 
-    # Set up MQTT Client for position tracking
-    client = mqtt.Client(client_id=CLIENT_ID)
-    client.on_connect = on_connect
-    client.message_callback_add(MQTT_POSITION_TOPIC, on_message_position)
-    client.message_callback_add(MQTT_ITEM_TOPIC, on_message_items)
-
-    try:
-        print(f"Connecting to MQTT broker at {MQTT_BROKER}...")
-        client.connect(MQTT_BROKER, 1883, 60)
-    except Exception as e:
-        print(f"Could not connect to MQTT broker: {e}")
-        return
-
-    # Start the MQTT network loop in a non-blocking thread
-    client.loop_start()
+    # One broker connection for the whole process: positions, items, checkout and search
+    connection = Broker.get_connection(MQTT_BROKER, 1883)
+    connection.subscribe(MQTT_POSITION_TOPIC, on_message_position)
+    connection.subscribe(MQTT_ITEM_TOPIC, on_message_items)
+    connection.when_connected(lambda: STARTUP.mark("broker connected"))
 
     # Start the combined Kivy application
     CombinedShoppingApp().run()
     
     # Cleanup
-    client.loop_stop()
+    Broker.close_all()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,181 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError
+
+import paho.mqtt.client as mqtt
+
+import AsyncLog
+from Broker import BrokerConnection
+
+# ----------------- CONFIGURATION -----------------
+COMMANDS_TOPIC = "shopping_app/commands"
+RESPONSES_TOPIC = "shopping_app/responses"
+REQUEST_TIMEOUT = 5.0       # seconds before a request without a reply fails
+CONNECT_TIMEOUT = 2.0
+
+LOG = AsyncLog.get_logger("commands")
+
+
+def _settle(future, result=None, error=None):
+    """Resolve `future` unless it was already resolved or cancelled"""
+    try:
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+    except InvalidStateError:
+        pass
+
+
+def reply_text(future):
+    """Reply of a finished request, with failures as "ERROR: ..." strings like server errors"""
+    try:
+        return future.result()
+    except Exception as e:     # TimeoutError, ConnectionError, CancelledError
+        return f"ERROR: {str(e) or 'Request cancelled'}"
+
+
+class CommandClient:
+    """
+    Request/response over the server's command topics with any number of
+    requests in flight. Each command goes out as
+    "<client id>#<request id>:<command>"; the server echoes everything
+    before the first colon, so a reply resolves exactly the Future that
+    asked for it and replies meant for other clients or requests are
+    ignored. Futures fail with TimeoutError after their own timeout and can
+    be cancelled; either way they are dropped from the pending map.
+    Given a shared `connection` (Broker.get_connection) it only adds a
+    response handler to it; otherwise it opens a connection of its own.
+    close() is final: later requests fail at once instead of listening again.
+    """
+
+    def __init__(self, host="localhost", port=1883, client_id=None, timeout=REQUEST_TIMEOUT,
+                 connection=None):
+        self.host = host
+        self.port = port
+        self.client_id = client_id or f"client_{int(time.time() * 1000)}"
+        self.timeout = timeout
+        self.connection = connection
+        self.owns_connection = connection is None
+        self.request_ids = itertools.count(1)
+        self.pending = {}               # request id -> Future
+        self.deadlines = []             # heap of (deadline, request id)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.running = False
+        self.closed = False
+        self.connect_lock = threading.Lock()
+
+    # --- Connection ---
+    def connect(self, wait=CONNECT_TIMEOUT):
+        """Listen for replies and start the timeout thread once; True when connected"""
+        with self.connect_lock:
+            if self.closed:
+                return False
+            if not self.running:
+                if self.connection is None:
+                    self.connection = BrokerConnection(self.host, self.port, self.client_id)
+                self.connection.subscribe(RESPONSES_TOPIC, self.on_message)
+                self.running = True
+                threading.Thread(target=self._expire_loop, daemon=True, name="command-timeouts").start()
+        return self.connection.wait_connected(wait)
+
+    def close(self):
+        """Fail what is pending and stop listening; a shared connection stays up for its other users"""
+        with self.wakeup:
+            self.closed = True
+        self.cancel_all()
+        with self.connect_lock:
+            with self.wakeup:
+                was_running, self.running = self.running, False
+                self.wakeup.notify()
+            if was_running:
+                self.connection.unsubscribe(RESPONSES_TOPIC, self.on_message)
+            if self.owns_connection and self.connection is not None:
+                self.connection.stop()
+                self.connection = None
+
+    # --- Requests ---
+    def request(self, command, timeout=None):
+        """
+        Send `command`; returns a Future resolving to the reply text (client
+        tag stripped). Never blocks, so it is safe on the Kivy thread: while
+        the broker is unreachable the Future fails at once with ConnectionError.
+        After close() it comes back already cancelled.
+        """
+        future = Future()
+        if self.closed:
+            future.cancel()
+            return future
+        if not self.connect(wait=0):
+            future.set_exception(ConnectionError("Cannot connect to MQTT broker"))
+            return future
+
+        request_id = str(next(self.request_ids))
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self.wakeup:
+            if self.closed:
+                # close() ran after the checks above
+                future.cancel()
+                return future
+            connection = self.connection
+            self.pending[request_id] = future
+            heapq.heappush(self.deadlines, (deadline, request_id))
+            self.wakeup.notify()
+        future.add_done_callback(lambda f: self._forget(request_id))
+
+        info = connection.publish(COMMANDS_TOPIC, f"{self.client_id}#{request_id}:{command}")
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            _settle(future, error=ConnectionError(f"Publish failed ({info.rc})"))
+        return future
+
+    def call(self, command, timeout=None):
+        """
+        Blocking request(), which first waits up to CONNECT_TIMEOUT for the
+        connection; raises TimeoutError, ConnectionError or CancelledError
+        """
+        self.connect()
+        return self.request(command, timeout).result()
+
+    def cancel_all(self):
+        with self.lock:
+            futures = list(self.pending.values())
+        for future in futures:
+            future.cancel()
+
+    def _forget(self, request_id):
+        with self.lock:
+            self.pending.pop(request_id, None)
+
+    def on_message(self, client, userdata, msg):
+        tag, _, body = msg.payload.decode(errors="replace").partition(":")
+        owner, _, request_id = tag.rpartition("#")
+        if owner != self.client_id:
+            return
+        with self.lock:
+            future = self.pending.pop(request_id, None)
+        if future is None:
+            LOG.debug("Late or unknown reply %s dropped", request_id)
+            return
+        _settle(future, body)
+
+    def _expire_loop(self):
+        while True:
+            with self.wakeup:
+                while self.running:
+                    now = time.monotonic()
+                    if self.deadlines and self.deadlines[0][0] <= now:
+                        break
+                    self.wakeup.wait(self.deadlines[0][0] - now if self.deadlines else None)
+                if not self.running:
+                    return
+                expired = []
+                while self.deadlines and self.deadlines[0][0] <= now:
+                    _, request_id = heapq.heappop(self.deadlines)
+                    future = self.pending.pop(request_id, None)
+                    if future is not None:
+                        expired.append(future)
+            for future in expired:
+                _settle(future, error=TimeoutError("No response from server"))
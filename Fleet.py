@@ -0,0 +1,214 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# ----------------- CONFIGURATION -----------------
+FLEET_TOPIC = "indoor/position/+"   # one sub-topic per cart: indoor/position/<cart id>
+STALE_AFTER = 10.0          # seconds without a position before a cart is shown as lost
+DROP_AFTER = 120.0          # seconds before a lost cart is forgotten
+ZONE_SIZE = 1.0             # metres per congestion zone (about one aisle wide)
+CONGESTION_LEVELS = (0.15, 0.3, 0.6)    # carts per m² of floor: busy, crowded, jammed
+SIM_SPEED = 0.7             # m/s for simulated carts
+
+
+def cart_id_from_topic(topic):
+    """'indoor/position/<cart id>' -> '<cart id>'"""
+    return topic.rsplit("/", 1)[-1]
+
+
+def parse_position(payload):
+    """'x,y[,uncertainty]' -> (x, y)"""
+    parts = payload.decode().strip().split(",")
+    if len(parts) < 2:
+        raise ValueError(f"Incomplete payload: {payload!r}")
+    return float(parts[0]), float(parts[1])
+
+
+class FleetState:
+    """
+    Latest position of every cart as a structure of arrays: slot i is cart
+    ids[i] at (x[i], y[i]), last heard at seen[i]. Network threads only
+    append to an inbox; the UI thread drains it once per frame and applies
+    the batch with a few vectorized writes, so the arrays have one writer
+    and need no lock. Only the newest position per cart in a batch is kept.
+    """
+
+    def __init__(self, layout=None, capacity=256):
+        self.layout = layout
+        self.ids = []                   # slot -> cart id
+        self.slots = {}                 # cart id -> slot
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.seen = np.zeros(capacity)
+        self.inbox = deque()
+        self.received = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _reserve(self, count):
+        if count <= len(self.x):
+            return
+        capacity = max(count, 2 * len(self.x))
+        for name in ("x", "y", "seen"):
+            grown = np.zeros(capacity)
+            grown[:len(self.ids)] = getattr(self, name)[:len(self.ids)]
+            setattr(self, name, grown)
+
+    # --- Network side ---
+    def ingest(self, cart_id, x, y, timestamp=None):
+        """Queue one position; safe to call from any thread"""
+        self.inbox.append((cart_id, x, y, time.time() if timestamp is None else timestamp))
+
+    def on_message(self, client, userdata, msg):
+        """paho callback for FLEET_TOPIC"""
+        try:
+            x, y = parse_position(msg.payload)
+        except (UnicodeDecodeError, ValueError):
+            return
+        self.ingest(cart_id_from_topic(msg.topic), x, y)
+
+    # --- UI side ---
+    def drain(self):
+        """
+        Apply every queued position. Returns (added, updated): ids of carts
+        seen for the first time and ids of every cart that reported.
+        """
+        latest = {}
+        inbox = self.inbox
+        while inbox:
+            cart_id, x, y, t = inbox.popleft()
+            latest[cart_id] = (x, y, t)
+        if not latest:
+            return [], []
+        self.received += len(latest)
+
+        updated = list(latest)
+        added = [cart_id for cart_id in updated if cart_id not in self.slots]
+        if added:
+            start = len(self.ids)
+            self._reserve(start + len(added))
+            for offset, cart_id in enumerate(added):
+                self.slots[cart_id] = start + offset
+            self.ids.extend(added)
+
+        slots = np.fromiter((self.slots[c] for c in updated), dtype=np.intp, count=len(updated))
+        values = np.array(list(latest.values()), dtype=float)
+        xs, ys = values[:, 0], values[:, 1]
+        if self.layout is not None:
+            xs, ys = self.layout.snap_many(xs, ys)  # positions inside shelves go to the aisle
+        self.x[slots] = xs
+        self.y[slots] = ys
+        self.seen[slots] = values[:, 2]
+        return added, updated
+
+    def positions(self, cart_ids):
+        """(len(cart_ids), 2) array of positions"""
+        slots = np.fromiter((self.slots[c] for c in cart_ids), dtype=np.intp, count=len(cart_ids))
+        return np.column_stack((self.x[slots], self.y[slots]))
+
+    def live(self, now=None, stale_after=STALE_AFTER):
+        """Boolean mask over slots of carts heard within `stale_after` seconds"""
+        now = time.time() if now is None else now
+        return self.seen[:len(self.ids)] >= now - stale_after
+
+    def expire(self, now=None, drop_after=DROP_AFTER):
+        """Forget carts silent for `drop_after` seconds (swap-remove); returns their ids"""
+        now = time.time() if now is None else now
+        dropped = [self.ids[s] for s in np.flatnonzero(self.seen[:len(self.ids)] < now - drop_after)]
+        for cart_id in dropped:
+            slot = self.slots.pop(cart_id)
+            last = len(self.ids) - 1
+            if slot != last:
+                moved = self.ids[last]
+                self.ids[slot] = moved
+                self.slots[moved] = slot
+                self.x[slot], self.y[slot], self.seen[slot] = self.x[last], self.y[last], self.seen[last]
+            self.ids.pop()
+        return dropped
+
+
+class CongestionMap:
+    """
+    Carts per square metre of floor in ZONE_SIZE zones. A zone's area only
+    counts its walkable cells, so a narrow aisle fills up before open floor
+    does and zones that are all shelving never light up.
+    """
+
+    def __init__(self, layout, zone=ZONE_SIZE, levels=CONGESTION_LEVELS):
+        self.zone = float(zone)
+        self.levels = np.asarray(levels, dtype=float)
+        self.cols = max(1, int(np.ceil(layout.width / self.zone)))
+        self.rows = max(1, int(np.ceil(layout.height / self.zone)))
+
+        # walkable area per zone, summed straight from the layout raster
+        centers_x = (np.arange(layout.cols) + 0.5) * layout.resolution
+        centers_y = (np.arange(layout.rows) + 0.5) * layout.resolution
+        zone_col = np.minimum((centers_x // self.zone).astype(np.intp), self.cols - 1)
+        zone_row = np.minimum((centers_y // self.zone).astype(np.intp), self.rows - 1)
+        cell_zone = zone_row[:, None] * self.cols + zone_col[None, :]
+        self.area = np.bincount(cell_zone.ravel(), weights=layout.walkable.ravel(),
+                                minlength=self.rows * self.cols) * layout.resolution ** 2
+
+    def zone_index(self, xs, ys):
+        col = np.clip((np.asarray(xs) // self.zone).astype(np.intp), 0, self.cols - 1)
+        row = np.clip((np.asarray(ys) // self.zone).astype(np.intp), 0, self.rows - 1)
+        return row * self.cols + col
+
+    def density(self, xs, ys):
+        """Carts per m² of walkable floor, per zone"""
+        counts = np.bincount(self.zone_index(xs, ys), minlength=self.rows * self.cols)
+        return np.divide(counts, self.area, out=np.zeros(len(self.area)), where=self.area > 0)
+
+    def congested(self, xs, ys):
+        """(zone indices, level 1..len(levels)) of every zone at or above the first level"""
+        level = np.searchsorted(self.levels, self.density(xs, ys), side="right")
+        zones = np.flatnonzero(level)
+        return zones, level[zones]
+
+    def rects(self, zones):
+        """(len(zones), 4) array of store rectangles x, y, w, h"""
+        row, col = np.divmod(np.asarray(zones, dtype=np.intp), self.cols)
+        size = np.full(len(row), self.zone)
+        return np.column_stack((col * self.zone, row * self.zone, size, size))
+
+
+def simulate(fleet, layout, carts, rate, stop, seed=0):
+    """
+    Feed `carts` synthetic carts at `rate` Hz each into `fleet` until `stop`
+    (a threading.Event) is set. Each cart walks towards a random walkable
+    waypoint and picks a new one on arrival. Used to load test the
+    supervisor without a broker.
+    """
+    rng = np.random.default_rng(seed)
+    ids = [f"SIM{i:04d}" for i in range(carts)]
+    position = layout.random_walkable(carts, rng)
+    target = layout.random_walkable(carts, rng)
+    step = SIM_SPEED / rate
+    next_tick = time.monotonic()
+
+    while not stop.is_set():
+        delta = target - position
+        dist = np.hypot(delta[:, 0], delta[:, 1])
+        arrived = dist <= step
+        position = np.where(arrived[:, None], target,
+                            position + delta * (step / np.maximum(dist, 1e-9))[:, None])
+        if arrived.any():
+            target[arrived] = layout.random_walkable(int(arrived.sum()), rng)
+
+        now = time.time()
+        for cart_id, (x, y) in zip(ids, position.tolist()):
+            fleet.ingest(cart_id, x, y, now)
+
+        next_tick += 1.0 / rate
+        stop.wait(max(0.0, next_tick - time.monotonic()))
+
+
+def start_simulation(fleet, layout, carts, rate):
+    """Run simulate() on a daemon thread; returns the Event that stops it"""
+    stop = threading.Event()
+    threading.Thread(target=simulate, args=(fleet, layout, carts, rate, stop),
+                     daemon=True, name="fleet-sim").start()
+    return stop
@@ -0,0 +1,390 @@
+import argparse
+import copy
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import AsyncLog
+import Broker
+from Cart import CartModel, parse_item_reply, check_cached_scan, apply_scan_check
+from CommandClient import CommandClient, reply_text
+from PriceCache import PriceCache
+from Proximity import ProximityEngine, parse_items_update
+from Routing import Router
+from SearchIndex import SearchIndex, products_from_catalog
+from StoreLayout import StoreLayout
+
+# ----------------- CONFIGURATION -----------------
+MQTT_BROKER = "192.168.137.8"
+MQTT_PORT = 1883
+POSITION_TOPIC = "indoor/position"      # each cart publishes to indoor/position/<cart id>
+ITEMS_TOPIC = "indoor/items"
+CATALOG_TOPIC = "shopping_app/catalog"
+RESULTS_FILE = "headless_results.json"
+
+SHOPPING_LIST = 5           # products each shopper looks for
+POSITION_RATE = 2.0         # position updates per second while walking
+WALK_SPEED = 0.7            # m/s, a shopper pushing a cart
+TYPE_DELAY = 0.15           # seconds between keystrokes in the search box
+RAMP_UP = 5.0               # seconds over which the carts' start times are spread
+MAX_WALK = 120.0            # seconds before a shopper gives up on an item
+CATALOG_TIMEOUT = 10.0
+OPERATIONS = ("search", "pin", "scan", "checkout", "position")
+
+LOG = AsyncLog.get_logger("headless")
+
+_LOCATION = re.compile(r"Location\(([-\d.]+),([-\d.]+)\)")
+
+
+class HeadlessCart:
+    """
+    One simulated cart: the client's cart model, price cache, search index
+    and proximity engine, driven by a scripted shopper instead of widgets.
+    It talks to the server over the same topics and commands as the tablet
+    and records how long each operation took, end to end:
+    search is the local query per keystroke, pin, scan and checkout are
+    command round trips, and position is the time for a published position
+    to come back from the broker.
+
+    Unless `live`, the shopper never changes the server: PIN_ITEM and
+    CHECKOUT are timed with the read-only GET_BARCODE and GET_ITEMS in their
+    place, and pinned locations come from the items the server publishes.
+    """
+
+    def __init__(self, cart_id, connection, catalog_text, index, layout, router, rng, live=False):
+        self.cart_id = cart_id
+        self.connection = connection
+        self.commands = CommandClient(connection.host, connection.port,
+                                      client_id=f"headless_{cart_id}", connection=connection)
+        self.cart = CartModel()
+        self.price_cache = PriceCache()
+        self.price_cache.load_snapshot(catalog_text)
+        self.index = copy.copy(index)   # shares the postings, keeps its own narrowing state
+        self.proximity = ProximityEngine()
+        self.store_items = []
+        self.pinned = []
+        self.items_version = 0
+        self.layout = layout
+        self.router = router
+        self.rng = rng
+        self.live = live
+        self.x, self.y = (float(v) for v in layout.random_walkable(1, rng)[0])
+
+        self.topic = f"{POSITION_TOPIC}/{cart_id}"
+        self.sent_positions = {}        # payload -> publish time, until it comes back
+        self.latencies = {op: [] for op in OPERATIONS}
+        self.errors = {op: 0 for op in OPERATIONS}
+
+        connection.subscribe(self.topic, self.on_position)
+        connection.subscribe(ITEMS_TOPIC, self.on_items)
+        connection.subscribe(CATALOG_TOPIC, self.on_catalog)
+
+    def close(self):
+        for topic, handler in ((self.topic, self.on_position), (ITEMS_TOPIC, self.on_items),
+                               (CATALOG_TOPIC, self.on_catalog)):
+            self.connection.unsubscribe(topic, handler)
+        self.commands.close()
+
+    # --- MQTT (network thread) ---
+    def on_position(self, client, userdata, msg):
+        sent = self.sent_positions.pop(msg.payload.decode(), None)
+        if sent is not None:
+            self.latencies["position"].append(time.perf_counter() - sent)
+
+    def on_items(self, client, userdata, msg):
+        items = parse_items_update(msg.payload.decode())
+        if items is not None:
+            self.store_items = items
+            self.items_version += 1
+
+    def on_catalog(self, client, userdata, msg):
+        if self.price_cache.apply_event(msg.payload.decode()):
+            self.commands.request("CATALOG", timeout=CATALOG_TIMEOUT).add_done_callback(self.on_snapshot)
+
+    def on_snapshot(self, future):
+        text = reply_text(future)
+        if not text.startswith("ERROR"):
+            self.price_cache.load_snapshot(text)
+
+    # --- Shopper script ---
+    def roundtrip(self, op, command):
+        started = time.perf_counter()
+        reply = reply_text(self.commands.request(command))
+        if reply.startswith("ERROR"):
+            self.errors[op] += 1
+        else:
+            self.latencies[op].append(time.perf_counter() - started)
+        return reply
+
+    def run(self, shopping_list, stop, delay=0.0):
+        if stop.wait(delay):
+            return
+        for product in shopping_list:
+            if stop.is_set():
+                return
+            self.search(product['name'], stop)
+            target = self.pin(product)
+            if target is not None and self.walk_to(product['name'], target, stop):
+                self.scan(product['barcode'])
+        if len(self.cart):
+            self.checkout()
+
+    def search(self, name, stop):
+        """Type `name` into the search a key at a time, as the popup's index answers it"""
+        for end in range(1, len(name) + 1):
+            started = time.perf_counter()
+            self.index.search(name[:end])
+            self.latencies["search"].append(time.perf_counter() - started)
+            if stop.wait(TYPE_DELAY):
+                return
+
+    def pin(self, product):
+        """PIN_ITEM round trip; the item's (x, y) from the reply, or None"""
+        if not self.live:
+            return self.dry_pin(product)
+        reply = self.roundtrip("pin", f"PIN_ITEM:{product['name']}:{product['barcode']}")
+        match = _LOCATION.search(reply)
+        if match is None:
+            return None
+        x, y = float(match.group(1)), float(match.group(2))
+        return self._pinned(x, y, product['name'])
+
+    def dry_pin(self, product):
+        """
+        GET_BARCODE round trip in place of PIN_ITEM. The location is the
+        published one, or a random aisle spot when the server has not
+        published the item.
+        """
+        reply = self.roundtrip("pin", f"GET_BARCODE:{product['name']}")
+        if reply.startswith("ERROR"):
+            return None
+        published = [(x, y) for x, y, name in self.store_items if name == product['name']]
+        if published:
+            x, y = published[0]
+        else:
+            x, y = (float(v) for v in self.layout.random_walkable(1, self.rng)[0])
+        return self._pinned(x, y, product['name'])
+
+    def _pinned(self, x, y, name):
+        self.pinned.append((x, y, name))
+        self.items_version += 1
+        return x, y
+
+    def walk_to(self, name, target, stop):
+        """
+        Walk the aisle route to `target`, as the map draws it, publishing
+        positions until proximity reports `name` reached
+        """
+        order, route = self.router.plan((self.x, self.y), [target])
+        if not order:
+            LOG.warning("%s: no walkable route to %s", self.cart_id, name)
+            return False
+        waypoints = deque(route[1:])
+        step = WALK_SPEED / POSITION_RATE
+        deadline = time.monotonic() + MAX_WALK
+        while not stop.is_set() and time.monotonic() < deadline:
+            left = step
+            while waypoints and left > 0:
+                dx, dy = waypoints[0][0] - self.x, waypoints[0][1] - self.y
+                dist = (dx * dx + dy * dy) ** 0.5
+                if dist <= left:
+                    self.x, self.y = waypoints.popleft()
+                    left -= dist
+                else:
+                    self.x += dx * left / dist
+                    self.y += dy * left / dist
+                    left = 0
+            self.publish_position()
+
+            self.proximity.sync(self.store_items + self.pinned, self.items_version)
+            if any(item[2] == name for item in self.proximity.query(self.x, self.y).reached):
+                self.pinned = [item for item in self.pinned if item[2] != name]
+                self.items_version += 1
+                return True
+            stop.wait(1.0 / POSITION_RATE)
+        return False
+
+    def publish_position(self):
+        payload = f"{self.x:.3f},{self.y:.3f}"
+        self.sent_positions[payload] = time.perf_counter()
+        self.connection.publish(self.topic, payload)
+
+    def scan(self, barcode):
+        """
+        A scan as the checkout handles it: a cache hit is added at once and
+        confirmed by GET_ITEM under the tablet's rule (check_cached_scan); a
+        miss is added once the server answers
+        """
+        cached = self.price_cache.lookup(barcode)
+        if cached is not None:
+            self.cart.add(barcode, *cached)
+        reply = self.roundtrip("scan", f"GET_ITEM:{barcode}")
+        if cached is not None:
+            apply_scan_check(self.cart, barcode, check_cached_scan(self.price_cache, barcode, reply))
+            return
+        item = parse_item_reply(reply)
+        if item is not None:
+            _, name, price = item
+            self.price_cache.put(barcode, name, price)
+            self.cart.add(barcode, name, price)
+
+    def checkout(self):
+        if self.live:
+            items = " ".join(f"{item['barcode']}:{item['quantity']}" for item in self.cart)
+            self.roundtrip("checkout", f"CHECKOUT {items}")
+        else:
+            # the same cart lines, looked up instead of deducted from stock
+            self.roundtrip("checkout", "GET_ITEMS:" + ",".join(item['barcode'] for item in self.cart))
+        self.cart.clear()
+
+    def summary(self):
+        return {
+            "cart": self.cart_id,
+            "latencies_ms": {op: [t * 1000 for t in samples] for op, samples in self.latencies.items()},
+            "errors": dict(self.errors),
+        }
+
+
+# ----------------- SIMULATION -----------------
+def run_carts(first, count, broker=MQTT_BROKER, port=MQTT_PORT, items=SHOPPING_LIST,
+              shared_connection=False, seed=0, live=False):
+    """
+    Run carts `first`..`first + count - 1` in this process until every
+    shopper has checked out. Each cart has a broker connection of its own,
+    as a tablet does, unless `shared_connection` puts them all on one.
+    The carts share one Router. `live` lets them pin and check out for real.
+    Returns HeadlessCart.summary() for each cart.
+    """
+    AsyncLog.setup()
+    layout = StoreLayout.load()
+    router = Router(layout)
+    rng = np.random.default_rng(seed + first)
+
+    loader = CommandClient(broker, port, client_id=f"headless_loader_{os.getpid()}",
+                           connection=Broker.get_connection(broker, port))
+    catalog_text = loader.call("CATALOG", timeout=CATALOG_TIMEOUT)
+    products = products_from_catalog(catalog_text)
+    index = SearchIndex(products)
+    LOG.info("Process %d: %d carts, %d products", os.getpid(), count, len(products))
+
+    carts = []
+    for i in range(first, first + count):
+        if shared_connection:
+            connection = Broker.get_connection(broker, port)
+        else:
+            connection = Broker.BrokerConnection(broker, port, client_id=f"headless_cart_{i}")
+            connection.start()
+        carts.append(HeadlessCart(f"SIM{i:04d}", connection, catalog_text, index, layout, router,
+                                  np.random.default_rng(seed + i), live=live))
+    for cart in carts:
+        cart.connection.wait_connected(CATALOG_TIMEOUT)
+
+    stop = threading.Event()
+    threads = []
+    for cart in carts:
+        picks = rng.choice(len(products), size=min(items, len(products)), replace=False)
+        shopping_list = [products[i] for i in picks]
+        thread = threading.Thread(target=cart.run, args=(shopping_list, stop, rng.uniform(0, RAMP_UP)),
+                                  daemon=True, name=f"shopper-{cart.cart_id}")
+        thread.start()
+        threads.append(thread)
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    time.sleep(1.0)     # let the last positions come back from the broker
+    summaries = [cart.summary() for cart in carts]
+    for cart in carts:
+        cart.close()
+        if not shared_connection:
+            cart.connection.stop()
+    loader.close()
+    Broker.close_all()
+    return summaries
+
+
+def run_simulation(carts, processes=1, **kwargs):
+    """Split `carts` over `processes` worker processes (1 runs them here); returns every cart's summary"""
+    if processes <= 1:
+        return run_carts(0, carts, **kwargs)
+    bounds = np.linspace(0, carts, processes + 1).astype(int)
+    # spawned workers start clean instead of inheriting this process's MQTT and logging threads
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(run_carts, int(lo), int(hi - lo), **kwargs)
+                   for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+        return [summary for future in futures for summary in future.result()]
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "max": None}
+    return {"count": len(samples), "p50": float(np.percentile(samples, 50)),
+            "p95": float(np.percentile(samples, 95)), "max": float(np.max(samples))}
+
+
+def build_report(summaries):
+    totals = {}
+    for op in OPERATIONS:
+        samples = [t for s in summaries for t in s["latencies_ms"][op]]
+        totals[op] = dict(percentiles(samples), errors=sum(s["errors"][op] for s in summaries))
+    return {
+        "carts": [{"cart": s["cart"], "errors": s["errors"],
+                   "latency_ms": {op: percentiles(s["latencies_ms"][op]) for op in OPERATIONS}}
+                  for s in summaries],
+        "totals_ms": totals,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated carts exercising the client protocol without a UI")
+    parser.add_argument("--broker", default=MQTT_BROKER)
+    parser.add_argument("--carts", type=int, default=10)
+    parser.add_argument("--processes", type=int, default=1, help="worker processes to spread the carts over")
+    parser.add_argument("--items", type=int, default=SHOPPING_LIST, help="products on each shopping list")
+    parser.add_argument("--shared-connection", action="store_true",
+                        help="one broker connection per process instead of one per cart")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--live", action="store_true",
+                        help="send real PIN_ITEM and CHECKOUT, which pin items and deduct stock; test servers only")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    args = parser.parse_args()
+
+    AsyncLog.setup()
+    if args.live:
+        LOG.warning("Live run against %s: carts will pin items and deduct stock", args.broker)
+    started = time.monotonic()
+    summaries = run_simulation(args.carts, args.processes, broker=args.broker, items=args.items,
+                               shared_connection=args.shared_connection, seed=args.seed, live=args.live)
+    report = build_report(summaries)
+    report["duration_s"] = time.monotonic() - started
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    def ms(value):
+        return f"{value:8.2f}" if value is not None else f"{'-':>8}"
+
+    print(f"{'cart':10}" + "".join(f" {op + ' p95':>14}" for op in OPERATIONS) + f" {'errors':>7}")
+    for cart in report["carts"]:
+        print(f"{cart['cart']:10}" + "".join(f" {ms(cart['latency_ms'][op]['p95']):>14}" for op in OPERATIONS)
+              + f" {sum(cart['errors'].values()):7d}")
+    print()
+    print(f"{'operation':10} {'count':>7} {'p50':>8} {'p95':>8} {'max':>8} {'errors':>7}  (ms)")
+    for op, t in report["totals_ms"].items():
+        print(f"{op:10} {t['count']:7d} {ms(t['p50'])} {ms(t['p95'])} {ms(t['max'])} {t['errors']:7d}")
+    print(f"{len(summaries)} carts in {report['duration_s']:.1f} s; results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,14 @@ const char* ssid = "Steven's Galaxy S22";
 const char* password = "zycb294^";
 const char* mqtt_server = "10.19.148.3";
 const char* mqtt_topic = "indoor/position";
+const char* mqtt_rssi_topic = "indoor/rssi"; // Raw advertisements for the Python trace recorder
+
+// Per-cart identity: the Wi-Fi MAC without colons. Positions are also published
+// to "indoor/position/<cartId>" and raw advertisements go to "indoor/rssi/<cartId>",
+// so a trace can be recorded for one cart while several are running.
+String cartId;
+String cartTopic;
+String cartRssiTopic;
 
 WiFiClient espClient;
 PubSubClient client(espClient);
@@ -94,6 +102,19 @@ struct Particle {
 Particle particles[NUM_PARTICLES];
 bool particleFilterInitialized = false;
 
+// --- Raw advertisements seen during the current scan (published after the scan) ---
+#define MAX_RAW_READINGS 48
+struct RawReading {
+  uint8_t beacon;
+  int8_t rssi;
+  unsigned long seenAt;
+};
+
+RawReading rawReadings[MAX_RAW_READINGS];
+int rawReadingCount = 0;
+// onResult() runs in the BLE task and loop() drains the buffer, so both sides take this lock
+portMUX_TYPE rawReadingsMux = portMUX_INITIALIZER_UNLOCKED;
+
 // --- Statistics for RSSI processing ---
 struct RSSIStats {
   int median;
@@ -109,16 +130,34 @@ float constrainValue(float val, float min_val, float max_val) {
   return val;
 }
 
-// --- Advanced Distance Estimation with Environmental Compensation ---
-float calculateDistance(int rssi, int beaconIndex) {
-  if (rssi >= 0) return -1;
+// --- Precomputed RSSI -> Distance Tables ---
+// isRSSIValid only lets integer RSSI in (-100, -30) through, so the path-loss
+// model is evaluated once per beacon and value instead of once per advertisement.
+#define RSSI_TABLE_MIN -99
+#define RSSI_TABLE_MAX -31
+#define RSSI_TABLE_SIZE (RSSI_TABLE_MAX - RSSI_TABLE_MIN + 1)
 
-  float refRSSI = beacons[beaconIndex].calibratedRefRSSI;
+float distanceTable[NUM_BEACONS][RSSI_TABLE_SIZE];
+
+// Call again whenever a beacon's calibratedRefRSSI changes
+void buildDistanceTables() {
   float envFactor = 1.0;
 
-  float distance = pow(10, (refRSSI - rssi) / (10 * PATH_LOSS_EXPONENT)) * envFactor;
+  for (int i = 0; i < NUM_BEACONS; i++) {
+    float refRSSI = beacons[i].calibratedRefRSSI;
+    for (int j = 0; j < RSSI_TABLE_SIZE; j++) {
+      int rssi = RSSI_TABLE_MIN + j;
+      float distance = pow(10, (refRSSI - rssi) / (10 * PATH_LOSS_EXPONENT)) * envFactor;
+      distanceTable[i][j] = constrainValue(distance, 0.1, 15.0);
+    }
+  }
+}
+
+// --- Advanced Distance Estimation with Environmental Compensation ---
+float calculateDistance(int rssi, int beaconIndex) {
+  if (rssi < RSSI_TABLE_MIN || rssi > RSSI_TABLE_MAX) return -1;
 
-  return constrainValue(distance, 0.1, 15.0);
+  return distanceTable[beaconIndex][rssi - RSSI_TABLE_MIN];
 }
 
 // --- Advanced RSSI Filtering ---
@@ -189,6 +228,17 @@ class MyAdvertisedDeviceCallbacks: public BLEAdvertisedDeviceCallbacks {
       if (macAddress == targetMac) {
         int rssi = advertisedDevice.getRSSI();
 
+        // Keep every advertisement, including ones rejected below, for trace recording
+        unsigned long seenAt = millis();
+        portENTER_CRITICAL(&rawReadingsMux);
+        if (rawReadingCount < MAX_RAW_READINGS) {
+          rawReadings[rawReadingCount].beacon = i;
+          rawReadings[rawReadingCount].rssi = rssi;
+          rawReadings[rawReadingCount].seenAt = seenAt;
+          rawReadingCount++;
+        }
+        portEXIT_CRITICAL(&rawReadingsMux);
+
         if (!isRSSIValid(rssi, i)) {
           return;
         }
@@ -514,6 +564,31 @@ void updateKalmanFilter(float measuredX, float measuredY, float uncertainty) {
   kf.P[1][1] = (1 - K_y) * kf.P[1][1];
 }
 
+// --- Publish the raw advertisements from the last scan ---
+// Payload: "beacon,rssi,millis;beacon,rssi,millis;..."
+void publishRawReadings() {
+  // Take the batch under the lock; formatting and publishing happen outside it
+  RawReading batch[MAX_RAW_READINGS];
+  portENTER_CRITICAL(&rawReadingsMux);
+  int count = rawReadingCount;
+  memcpy(batch, rawReadings, count * sizeof(RawReading));
+  rawReadingCount = 0;
+  portEXIT_CRITICAL(&rawReadingsMux);
+
+  if (count == 0 || !client.connected()) {
+    return;
+  }
+
+  char payload[MAX_RAW_READINGS * 20];
+  int len = 0;
+  for (int i = 0; i < count; i++) {
+    len += snprintf(payload + len, sizeof(payload) - len, "%d,%d,%lu;",
+                    batch[i].beacon, batch[i].rssi, batch[i].seenAt);
+  }
+
+  client.publish(cartRssiTopic.c_str(), payload);
+}
+
 // --- Wi-Fi + MQTT Helpers (ACTIVE) ---
 void setup_wifi() {
   Serial.print("Connecting to WiFi");
@@ -537,8 +612,9 @@ void reconnect() {
   // 2. Check/Reconnect MQTT
   while (!client.connected() && WiFi.status() == WL_CONNECTED) {
     Serial.print("Attempting MQTT connection...");
-    // Attempt to connect
-    if (client.connect("ESP32Tag")) {
+    // Attempt to connect; the id must be unique per cart or the broker
+    // drops the older session each time another cart connects
+    if (client.connect(("ESP32Tag-" + cartId).c_str())) {
       Serial.println("MQTT connected ✅");
     } else {
       Serial.print("MQTT connection failed, rc=");
@@ -582,6 +658,8 @@ void setup() {
   pBLEScan->setInterval(100);
   pBLEScan->setWindow(99);
 
+  buildDistanceTables();
+
   // Initialize RSSI buffers
   for (int i = 0; i < NUM_BEACONS; i++) {
     for (int j = 0; j < 20; j++) {
@@ -591,7 +669,13 @@ void setup() {
 
   // Enable WiFi and MQTT
   setup_wifi();
+  cartId = WiFi.macAddress();
+  cartId.replace(":", "");
+  cartTopic = String(mqtt_topic) + "/" + cartId;
+  cartRssiTopic = String(mqtt_rssi_topic) + "/" + cartId;
+  Serial.printf("Cart ID: %s\n", cartId.c_str());
   client.setServer(mqtt_server, 1883);
+  client.setBufferSize(MAX_RAW_READINGS * 20 + 64); // Raw RSSI batches exceed the 256 byte default
 }
 
 // --- Main Loop ---
@@ -607,6 +691,7 @@ void loop() {
 
   // Perform BLE scan
   BLEScanResults foundDevices = pBLEScan->start(2, false);
+  publishRawReadings();
 
   // Check beacon validity based on last seen time
   unsigned long currentTime = millis();
@@ -757,6 +842,7 @@ void loop() {
     }
     
     client.publish(mqtt_topic, payload);
+    client.publish(cartTopic.c_str(), payload);
     Serial.println("📤 Data published to MQTT");
   } else {
     Serial.println("❌ MQTT not connected. Cannot publish.");
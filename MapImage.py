@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# ----------------- CONFIGURATION -----------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MAP_IMAGE = os.path.join(BASE_DIR, "theMap.png")
+CACHE_DIR = os.path.join(BASE_DIR, ".map_cache")
+
+_HASH_CHUNK = 1 << 20
+
+
+def file_digest(path):
+    """Content hash of the floor plan; changes whenever the image does"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_digest(path, cache_dir=CACHE_DIR):
+    """
+    file_digest() remembered per (size, mtime) in the cache directory, so an
+    unchanged floor plan is not re-read just to find its cache entry.
+    """
+    index_path = os.path.join(cache_dir, "digests.json")
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    try:
+        with open(index_path, "r") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    entry = index.get(key)
+    if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return entry[2]
+
+    digest = file_digest(path)
+    index[key] = [stat.st_size, stat.st_mtime_ns, digest]
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(index_path, "w") as f:
+            json.dump(index, f)
+    except OSError:
+        pass
+    return digest
+
+
+def cache_path(path, cache_dir=CACHE_DIR):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}-{cached_digest(path, cache_dir)}.rgba.npy")
+
+
+def decode_rgba(path):
+    """
+    Decode the image to an (rows, cols, 4) uint8 array. Row 0 is the bottom
+    of the image, which is the row order OpenGL textures and store
+    coordinates use.
+    """
+    from PIL import Image
+
+    with Image.open(path) as img:
+        rgba = np.asarray(img.convert("RGBA"))
+    return np.ascontiguousarray(rgba[::-1])
+
+
+def load_rgba(path=MAP_IMAGE, cache_dir=CACHE_DIR):
+    """
+    Raw RGBA pixels of `path`, decoded once and then memory-mapped from an
+    on-disk cache keyed by the file's content hash. Stale entries for the
+    same image are removed when a new one is written.
+    """
+    cached = cache_path(path, cache_dir)
+    if os.path.exists(cached):
+        try:
+            return np.load(cached, mmap_mode="r")
+        except (OSError, ValueError):
+            pass    # truncated or corrupt entry, decode again
+
+    rgba = decode_rgba(path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        name_length = len(os.path.basename(cached))
+        prefix = os.path.basename(cached).rsplit("-", 1)[0] + "-"
+        for entry in os.listdir(cache_dir):
+            if entry.startswith(prefix) and entry.endswith(".rgba.npy") and len(entry) == name_length:
+                os.remove(os.path.join(cache_dir, entry))
+
+        tmp = f"{cached}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, rgba)
+        os.replace(tmp, cached)
+        return np.load(cached, mmap_mode="r")
+    except OSError:
+        return rgba     # read-only install: still works, just not cached
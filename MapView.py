@@ -0,0 +1,208 @@
+from collections import OrderedDict
+
+import numpy as np
+
+# ----------------- CONFIGURATION -----------------
+MAX_ZOOM = 400.0            # pixels per metre at the closest zoom
+ZOOM_STEP = 1.25            # one mouse-wheel notch
+TILE_SIZE = 256             # background tile edge in texture pixels
+TILE_CACHE_SIZE = 96        # tiles kept alive (256x256 RGBA = 256 KB each)
+CLUSTER_CELL_PX = 48        # clusters group markers within this many screen pixels
+
+
+class Viewport:
+    """
+    Pan/zoom state of the store map. Store coordinates are metres with y up,
+    screen coordinates are window pixels. Zoom is uniform (pixels per metre)
+    and never goes below the zoom that fits the whole store in the widget.
+    Listeners are called after every change.
+    """
+
+    def __init__(self, width, height, max_zoom=MAX_ZOOM):
+        self.width = float(width)
+        self.height = float(height)
+        self.max_zoom = max_zoom
+        self.pos = (0.0, 0.0)
+        self.size = (1.0, 1.0)
+        self.zoom = 1.0
+        self.center = (self.width / 2, self.height / 2)
+        self.fitted = True
+        self.version = 0
+        self.listeners = []
+
+    def bind(self, callback):
+        self.listeners.append(callback)
+
+    def changed(self):
+        self.version += 1
+        for callback in self.listeners:
+            callback(self)
+
+    @property
+    def min_zoom(self):
+        return min(self.size[0] / self.width, self.size[1] / self.height)
+
+    def set_widget(self, pos, size):
+        """Follow the widget's pixel rectangle; keeps the fitted view while the user has not zoomed"""
+        self.pos = (float(pos[0]), float(pos[1]))
+        self.size = (max(float(size[0]), 1.0), max(float(size[1]), 1.0))
+        if self.fitted:
+            self.zoom = self.min_zoom
+            self.center = (self.width / 2, self.height / 2)
+        else:
+            self.zoom = min(max(self.zoom, self.min_zoom), self.max_zoom)
+            self.clamp()
+        self.changed()
+
+    def fit(self):
+        self.fitted = True
+        self.set_widget(self.pos, self.size)
+
+    def clamp(self):
+        """Keep the view centre inside the store"""
+        self.center = (min(max(self.center[0], 0.0), self.width),
+                       min(max(self.center[1], 0.0), self.height))
+
+    # --- Transforms ---
+    def transform(self):
+        """(origin, scale) with screen = origin + store * scale"""
+        ox = self.pos[0] + self.size[0] / 2 - self.center[0] * self.zoom
+        oy = self.pos[1] + self.size[1] / 2 - self.center[1] * self.zoom
+        return (ox, oy), (self.zoom, self.zoom)
+
+    def to_screen(self, x, y):
+        (ox, oy), (scale, _) = self.transform()
+        return ox + x * scale, oy + y * scale
+
+    def to_store(self, sx, sy):
+        (ox, oy), (scale, _) = self.transform()
+        return (sx - ox) / scale, (sy - oy) / scale
+
+    def bounds(self):
+        """Visible store rectangle (x0, y0, x1, y1), not clipped to the store"""
+        x0, y0 = self.to_store(*self.pos)
+        x1, y1 = self.to_store(self.pos[0] + self.size[0], self.pos[1] + self.size[1])
+        return x0, y0, x1, y1
+
+    # --- Interaction ---
+    def pan(self, dx, dy):
+        """Drag by (dx, dy) screen pixels"""
+        self.center = (self.center[0] - dx / self.zoom, self.center[1] - dy / self.zoom)
+        self.fitted = False
+        self.clamp()
+        self.changed()
+
+    def zoom_at(self, factor, sx, sy):
+        """Zoom by `factor` keeping the store point under screen (sx, sy) in place"""
+        zoom = min(max(self.zoom * factor, self.min_zoom), self.max_zoom)
+        if zoom == self.zoom:
+            return
+        x, y = self.to_store(sx, sy)
+        self.zoom = zoom
+        # solve for the centre that puts (x, y) back under (sx, sy)
+        self.center = (x - (sx - self.pos[0] - self.size[0] / 2) / zoom,
+                       y - (sy - self.pos[1] - self.size[1] / 2) / zoom)
+        self.fitted = zoom <= self.min_zoom
+        if self.fitted:
+            self.center = (self.width / 2, self.height / 2)
+        self.clamp()
+        self.changed()
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+
+class MapTiles:
+    """
+    Splits a bottom-up RGBA floor plan into a pyramid of TILE_SIZE tiles.
+    Level L samples every 2**L-th source pixel, so a tile always has at most
+    TILE_SIZE x TILE_SIZE pixels whatever the zoom. Pixels are sliced from the
+    (memory-mapped) source only when a tile is requested.
+    """
+
+    def __init__(self, rgba, width, height, tile_size=TILE_SIZE):
+        self.rgba = rgba
+        self.rows, self.cols = rgba.shape[:2]
+        self.width = float(width)
+        self.height = float(height)
+        self.tile_size = tile_size
+        self.px_per_m = self.cols / self.width
+        self.max_level = max(0, int(np.ceil(np.log2(max(self.rows, self.cols) / tile_size))))
+
+    def level_for(self, zoom):
+        """Coarsest level that still has at least one source pixel per screen pixel"""
+        ratio = self.px_per_m / zoom
+        if ratio <= 1:
+            return 0
+        return min(int(np.floor(np.log2(ratio))), self.max_level)
+
+    def tile_span(self, level):
+        """Source pixels covered by one tile edge at `level`"""
+        return self.tile_size << level
+
+    def visible(self, bounds, level):
+        """Keys (level, tx, ty) of the tiles overlapping store rectangle `bounds`"""
+        x0, y0, x1, y1 = bounds
+        span = self.tile_span(level)
+        last_tx = (self.cols - 1) // span
+        last_ty = (self.rows - 1) // span
+        tx0 = max(0, int(x0 * self.px_per_m // span))
+        tx1 = min(last_tx, int(x1 * self.px_per_m // span))
+        ty0 = max(0, int(y0 * (self.rows / self.height) // span))
+        ty1 = min(last_ty, int(y1 * (self.rows / self.height) // span))
+        return [(level, tx, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+
+    def pixels(self, key):
+        """Contiguous RGBA array of a tile"""
+        level, tx, ty = key
+        span, step = self.tile_span(level), 1 << level
+        block = self.rgba[ty * span:(ty + 1) * span:step, tx * span:(tx + 1) * span:step]
+        return np.ascontiguousarray(block)
+
+    def rect(self, key):
+        """Store rectangle (x, y, w, h) covered by a tile"""
+        level, tx, ty = key
+        span = self.tile_span(level)
+        c0, c1 = tx * span, min(self.cols, (tx + 1) * span)
+        r0, r1 = ty * span, min(self.rows, (ty + 1) * span)
+        sx = self.width / self.cols
+        sy = self.height / self.rows
+        return c0 * sx, r0 * sy, (c1 - c0) * sx, (r1 - r0) * sy
+
+
+def cluster_points(xs, ys, cell):
+    """
+    Group points on a `cell`-sized store grid anchored at the origin, so
+    clusters do not jump while panning. Returns centroid xs, ys and counts.
+    """
+    if len(xs) == 0:
+        return np.empty(0), np.empty(0), np.empty(0, dtype=np.intp)
+    keys = np.floor(xs / cell).astype(np.int64) * 1_000_003 + np.floor(ys / cell).astype(np.int64)
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    cx = np.bincount(inverse, weights=xs) / counts
+    cy = np.bincount(inverse, weights=ys) / counts
+    return cx, cy, counts
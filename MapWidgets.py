@@ -0,0 +1,270 @@
+import threading
+from contextlib import nullcontext
+
+import numpy as np
+
+from kivy.uix.stencilview import StencilView
+from kivy.graphics import Color, Rectangle, InstructionGroup, Mesh
+from kivy.clock import Clock
+from kivy.graphics.texture import Texture
+
+import MapImage
+from MapView import MapTiles, LRUCache, ZOOM_STEP, TILE_CACHE_SIZE
+
+# ----------------- CONFIGURATION -----------------
+MAP_IMAGE = 'theMap.png'
+TILE_LOADS_PER_FRAME = 2    # background tiles uploaded per frame; the rest follow next frame
+
+
+class BackgroundWidget(StencilView):
+    """
+    Floor plan drawn as TILE_SIZE tiles of the level matching the current
+    zoom. Only tiles overlapping the viewport have a Rectangle; textures are
+    uploaded lazily, a few per frame, and kept in an LRU cache.
+    """
+
+    def __init__(self, viewport=None, timeline=None, **kwargs):
+        super().__init__(**kwargs)
+        self.viewport = viewport
+        self.timeline = timeline        # StartupTimer that times the floor plan decode, if any
+        self.tiles = None
+        self.tile_cache = LRUCache(TILE_CACHE_SIZE)
+        self.tile_rects = {}            # key -> Rectangle on the canvas
+        self.refresh_trigger = Clock.create_trigger(self.refresh_tiles)
+
+        self.tile_group = InstructionGroup()
+        with self.canvas:
+            Color(1, 1, 1, 1)
+        self.canvas.add(self.tile_group)
+
+        if self.viewport is not None:
+            self.load_background()
+            self.viewport.bind(lambda viewport: self.refresh_trigger())
+
+    def load_background(self):
+        # decoding the floor plan off the Kivy thread lets the first frame paint without it
+        threading.Thread(target=self._load_background, daemon=True, name="map-background").start()
+
+    def _load_background(self):
+        tiles = None
+        try:
+            with self.timeline.span("map background loaded") if self.timeline else nullcontext():
+                rgba = MapImage.load_rgba(MAP_IMAGE)
+                tiles = MapTiles(rgba, self.viewport.width, self.viewport.height)
+            print(f" Background image '{MAP_IMAGE}' loaded successfully")
+        except FileNotFoundError:
+            print(f" Warning: Background image '{MAP_IMAGE}' not found")
+        except Exception as e:
+            print(f" Error loading background: {e}")
+        Clock.schedule_once(lambda dt: self.set_tiles(tiles))
+
+    def set_tiles(self, tiles):
+        """Kivy thread: start showing the tiles; textures upload a few per frame"""
+        self.tiles = tiles
+        self.refresh_trigger()
+
+    def tile_texture(self, key):
+        texture = self.tile_cache.get(key)
+        if texture is None:
+            pixels = self.tiles.pixels(key)
+            texture = Texture.create(size=(pixels.shape[1], pixels.shape[0]), colorfmt='rgba')
+            # bytes, not the array's buffer: Kivy reads buffers as flat, writable char[:] views
+            texture.blit_buffer(pixels.tobytes(), colorfmt='rgba', bufferfmt='ubyte')
+            self.tile_cache.put(key, texture)
+        return texture
+
+    def place(self, rect, key):
+        x, y, w, h = self.tiles.rect(key)
+        rect.pos = self.viewport.to_screen(x, y)
+        rect.size = (w * self.viewport.zoom, h * self.viewport.zoom)
+
+    def refresh_tiles(self, *args):
+        if self.tiles is None or self.viewport is None:
+            return
+
+        level = self.tiles.level_for(self.viewport.zoom)
+        wanted = set()
+        loads = 0
+        complete = True
+        for key in self.tiles.visible(self.viewport.bounds(), level):
+            if key not in self.tile_rects:
+                if key not in self.tile_cache:
+                    if loads >= TILE_LOADS_PER_FRAME:
+                        complete = False
+                        continue
+                    loads += 1
+                rect = Rectangle(texture=self.tile_texture(key))
+                self.tile_group.add(rect)
+                self.tile_rects[key] = rect
+            wanted.add(key)
+
+        # until every new tile is in, the previous ones stay up underneath
+        for key, rect in list(self.tile_rects.items()):
+            if key in wanted or not complete:
+                self.place(rect, key)
+            else:
+                self.tile_group.remove(self.tile_rects.pop(key))
+
+        if not complete:
+            self.refresh_trigger()
+
+
+class ItemMarkerBatch:
+    """
+    Triangle markers for many items drawn as a few Meshes under one Color.
+    Item coordinates live in a NumPy array indexed by slot; vertices are
+    rebuilt only for dirty slots and only dirty meshes are re-uploaded.
+    Kivy meshes index vertices with 16-bit ints, so markers are split into
+    chunks of MARKERS_PER_MESH.
+    """
+    MARKERS_PER_MESH = 65535 // 3
+    # marker triangle around the item position, in pixels
+    TEMPLATE = np.array([[0, 8], [-6, -4], [6, -4]], dtype=np.float32)
+
+    def __init__(self, rgba, template=None):
+        if template is not None:
+            self.TEMPLATE = np.asarray(template, dtype=np.float32)
+        self.group = InstructionGroup()
+        self.group.add(Color(*rgba))
+        self.meshes = []
+        self.slots = {}                 # key -> slot
+        self.keys = []                  # slot -> key
+        self.coords = np.empty((0, 2))
+        # (slot, vertex, [x, y, u, v]) for the default Mesh vertex format
+        self.vertices = np.zeros((0, 3, 4), dtype=np.float32)
+        self.origin = np.zeros(2)
+        self.scale = np.ones(2)
+        self.dirty_chunks = set()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def position(self, key):
+        slot = self.slots.get(key)
+        return None if slot is None else tuple(self.coords[slot])
+
+    def _reserve(self, count):
+        if count <= len(self.coords):
+            return
+        capacity = max(count, 2 * len(self.coords), 64)
+        coords = np.empty((capacity, 2))
+        coords[:len(self.keys)] = self.coords[:len(self.keys)]
+        vertices = np.zeros((capacity, 3, 4), dtype=np.float32)
+        vertices[:len(self.keys)] = self.vertices[:len(self.keys)]
+        self.coords, self.vertices = coords, vertices
+
+    def _write(self, slots):
+        screen = self.origin + self.coords[slots] * self.scale
+        self.vertices[slots, :, :2] = screen[:, None, :] + self.TEMPLATE
+        self.dirty_chunks.update(np.unique(slots // self.MARKERS_PER_MESH).tolist())
+
+    def set_transform(self, origin, scale):
+        """Map store coordinates to widget pixels; re-lays out every marker."""
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        if self.keys:
+            self._write(np.arange(len(self.keys)))
+
+    def add_many(self, keys, coords):
+        if not keys:
+            return
+        start = len(self.keys)
+        self._reserve(start + len(keys))
+        self.coords[start:start + len(keys)] = coords
+        for offset, key in enumerate(keys):
+            self.slots[key] = start + offset
+        self.keys.extend(keys)
+        self._write(np.arange(start, len(self.keys)))
+
+    def move_many(self, keys, coords):
+        if not keys:
+            return
+        slots = np.fromiter((self.slots[k] for k in keys), dtype=np.intp, count=len(keys))
+        self.coords[slots] = coords
+        self._write(slots)
+
+    def clear(self):
+        self.slots.clear()
+        self.keys.clear()
+
+    def remove_many(self, keys):
+        # swap-remove: the last marker fills the freed slot
+        touched = []
+        for key in keys:
+            slot = self.slots.pop(key)
+            last = len(self.keys) - 1
+            if slot != last:
+                moved = self.keys[last]
+                self.keys[slot] = moved
+                self.slots[moved] = slot
+                self.coords[slot] = self.coords[last]
+                self.vertices[slot] = self.vertices[last]
+                touched.append(slot)
+            self.keys.pop()
+            self.dirty_chunks.add(last // self.MARKERS_PER_MESH)
+        if touched:
+            self.dirty_chunks.update(t // self.MARKERS_PER_MESH for t in touched)
+
+    def flush(self):
+        """Upload dirty chunks to their meshes, adding or dropping meshes as needed."""
+        per_mesh = self.MARKERS_PER_MESH
+        chunk_count = -(-len(self.keys) // per_mesh)
+        while len(self.meshes) > chunk_count:
+            self.group.remove(self.meshes.pop())
+        while len(self.meshes) < chunk_count:
+            mesh = Mesh(mode='triangles')
+            self.group.add(mesh)
+            self.meshes.append(mesh)
+            self.dirty_chunks.add(len(self.meshes) - 1)
+
+        for chunk in sorted(self.dirty_chunks):
+            if chunk >= chunk_count:
+                continue
+            start = chunk * per_mesh
+            stop = min(len(self.keys), start + per_mesh)
+            mesh = self.meshes[chunk]
+            mesh.vertices = self.vertices[start:stop].ravel().tolist()
+            mesh.indices = list(range(3 * (stop - start)))
+        self.dirty_chunks.clear()
+
+
+class PanZoomMixin:
+    """
+    Drag to pan, wheel or pinch to zoom and double tap to fit, applied to
+    `self.viewport`. Mixed into map widgets; expects `self.touches = []`.
+    """
+
+    def on_touch_down(self, touch):
+        if not self.collide_point(*touch.pos):
+            return super().on_touch_down(touch)
+        if touch.is_mouse_scrolling:
+            factor = ZOOM_STEP if touch.button == 'scrolldown' else 1 / ZOOM_STEP
+            self.viewport.zoom_at(factor, *touch.pos)
+            return True
+        if touch.is_double_tap:
+            self.viewport.fit()
+            return True
+        touch.grab(self)
+        self.touches.append(touch)
+        return True
+
+    def on_touch_move(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_move(touch)
+        if len(self.touches) == 1:
+            self.viewport.pan(touch.dx, touch.dy)
+        elif len(self.touches) >= 2:
+            other = self.touches[0] if touch is self.touches[1] else self.touches[1]
+            before = np.hypot(touch.px - other.x, touch.py - other.y)
+            after = np.hypot(touch.x - other.x, touch.y - other.y)
+            if before > 0:
+                self.viewport.zoom_at(after / before, (touch.x + other.x) / 2, (touch.y + other.y) / 2)
+        return True
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_up(touch)
+        touch.ungrab(self)
+        if touch in self.touches:
+            self.touches.remove(touch)
+        return True
@@ -0,0 +1,384 @@
+import threading
+import time
+
+import numpy as np
+
+# ----------------- CONFIGURATION -----------------
+# Mirrors the calibration block in Indoor_Position_System.ino
+REFERENCE_RSSI = -58
+PATH_LOSS_EXPONENT = 2.8
+SNAP_RESOLUTION = 1.0
+ROOM_SIZE = 7.0
+
+MIN_VALID_BEACONS = 3
+RSSI_WINDOW = 20            # readings kept per beacon (rssiReadings[20])
+BEACON_TIMEOUT = 10.0       # seconds without an advertisement before a beacon is dropped
+MAX_FALLBACK_CYCLES = 10
+FILTER_RESET_DISTANCE = 3.0
+NUM_PARTICLES = 50
+
+# Absolute RSSI window accepted by isRSSIValid (exclusive of -100 and -30)
+RSSI_MIN = -99
+RSSI_MAX = -31
+RSSI_EMPTY = -100           # value used to mark an unused slot in the reading buffer
+
+# Log-normal shadowing used to turn an RSSI reading into a distance variance
+RSSI_SHADOWING_SIGMA = 4.0
+
+# (mac, name, x, y, calibratedRefRSSI) - same order as beacons[] in the firmware
+BEACONS = [
+    ("F7:23:2C:3B:84:B4", "BEACON_1", 0.0, 0.0, REFERENCE_RSSI),
+    ("E5:BD:D7:34:2A:73", "BEACON_2", 7.0, 0.0, REFERENCE_RSSI),
+    ("C2:E0:A6:C2:4F:F2", "BEACON_3", 0.0, 7.0, REFERENCE_RSSI),
+    ("FC:FE:32:00:1F:FD", "BEACON_4", 7.0, 7.0, REFERENCE_RSSI),
+]
+
+
+# ----------------- DISTANCE LOOKUP TABLES -----------------
+class DistanceTables:
+    """
+    Per-beacon RSSI -> distance / variance tables.
+
+    RSSI is an integer confined to [RSSI_MIN, RSSI_MAX], so calculateDistance()
+    and isRSSIValid() collapse into one row per beacon. All tables live in a
+    single tuple that is swapped in one assignment, so a reader never sees a
+    mix of old and new calibration.
+    """
+
+    def __init__(self, ref_rssi, path_loss_exponent=PATH_LOSS_EXPONENT,
+                 shadowing_sigma=RSSI_SHADOWING_SIGMA):
+        self.path_loss_exponent = path_loss_exponent
+        self.shadowing_sigma = shadowing_sigma
+        self.rssi_values = np.arange(RSSI_MIN, RSSI_MAX + 1)
+        self._write_lock = threading.Lock()
+        self._tables = self._build(np.asarray(ref_rssi, dtype=float))
+
+    def _build(self, ref_rssi):
+        ref = ref_rssi[:, None]
+        rssi = self.rssi_values[None, :]
+        n = self.path_loss_exponent
+
+        distance = np.power(10.0, (ref - rssi) / (10.0 * n))
+        distance = np.clip(distance, 0.1, 15.0)
+
+        # d = 10^((ref - rssi) / 10n)  =>  sigma_d = d * ln(10) * sigma_rssi / 10n
+        variance = (distance * np.log(10.0) * self.shadowing_sigma / (10.0 * n)) ** 2
+
+        # Relative outlier window from isRSSIValid
+        valid = (rssi >= ref - 40) & (rssi <= ref + 25)
+
+        for table in (distance, variance, valid):
+            table.setflags(write=False)
+        ref_rssi = ref_rssi.copy()
+        ref_rssi.setflags(write=False)
+        return ref_rssi, distance, variance, valid
+
+    @property
+    def ref_rssi(self):
+        return self._tables[0]
+
+    def recalibrate(self, ref_rssi=None, path_loss_exponent=None):
+        """Rebuild every table from new calibration and swap them in at once"""
+        with self._write_lock:
+            if path_loss_exponent is not None:
+                self.path_loss_exponent = path_loss_exponent
+            if ref_rssi is None:
+                ref_rssi = self._tables[0]
+            self._tables = self._build(np.asarray(ref_rssi, dtype=float))
+
+    def set_beacon_calibration(self, beacon_index, ref_rssi):
+        with self._write_lock:
+            new_ref = np.array(self._tables[0], dtype=float)
+            new_ref[beacon_index] = ref_rssi
+            self._tables = self._build(new_ref)
+
+    def lookup(self, beacon_index, rssi):
+        """
+        Vectorized gather for a batch of readings.
+        Returns (distance, variance, valid) arrays shaped like the inputs;
+        distance and variance are only meaningful where valid is True.
+        """
+        _, distance, variance, valid = self._tables
+        beacon_index = np.asarray(beacon_index, dtype=np.intp)
+        col = np.asarray(rssi, dtype=np.intp) - RSSI_MIN
+
+        in_range = (col >= 0) & (col < distance.shape[1])
+        col = np.clip(col, 0, distance.shape[1] - 1)
+
+        ok = in_range & valid[beacon_index, col]
+        return distance[beacon_index, col], variance[beacon_index, col], ok
+
+
+# ----------------- POSITIONING ENGINE -----------------
+class PositioningEngine:
+    """
+    Python port of the ESP32 positioning loop: median RSSI filtering,
+    IDW multilateration, Kalman filter, particle filter and grid snapping.
+    Feed it raw advertisements with add_readings() and call update() once
+    per scan cycle.
+
+    With a StoreLayout the particle filter is map-constrained: particles that
+    land in, or cross, a shelf during the predict step stay where they were
+    and have their weight scaled by blocked_penalty (0 kills them at the
+    next resample). The check is a gather into the layout's signed distance
+    field, so it costs the same per particle as the unconstrained filter.
+
+    use_kalman / use_particle_filter switch stages off so pipeline variants
+    (IDW only, IDW + Kalman, ...) can be compared on the same input.
+    """
+
+    def __init__(self, beacons=BEACONS, path_loss_exponent=PATH_LOSS_EXPONENT,
+                 filter_reset_distance=FILTER_RESET_DISTANCE, process_noise=0.5,
+                 measurement_noise=2.0, num_particles=NUM_PARTICLES,
+                 particle_step=0.2, room_size=ROOM_SIZE,
+                 snap_resolution=SNAP_RESOLUTION, layout=None, blocked_penalty=0.1,
+                 use_kalman=True, use_particle_filter=True, seed=None):
+        self.beacons = list(beacons)
+        self.beacon_names = [b[1] for b in self.beacons]
+        self.mac_to_index = {b[0].upper(): i for i, b in enumerate(self.beacons)}
+        self.beacon_pos = np.array([(b[2], b[3]) for b in self.beacons], dtype=float)
+
+        self.tables = DistanceTables([b[4] for b in self.beacons], path_loss_exponent)
+
+        self.filter_reset_distance = filter_reset_distance
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.num_particles = num_particles
+        self.particle_step = particle_step
+        self.room_size = room_size
+        self.snap_resolution = snap_resolution
+        self.layout = layout
+        self.blocked_penalty = blocked_penalty
+        self.use_kalman = use_kalman
+        self.use_particle_filter = use_particle_filter
+        self.rng = np.random.default_rng(seed)
+
+        num_beacons = len(self.beacons)
+        self.readings = np.full((num_beacons, RSSI_WINDOW), RSSI_EMPTY, dtype=np.int16)
+        self.reading_index = np.zeros(num_beacons, dtype=np.intp)
+        self.last_seen = np.full(num_beacons, -np.inf)
+        self.rssi = np.full(num_beacons, RSSI_EMPTY, dtype=np.int16)
+        self.rssi_variance = np.zeros(num_beacons)
+        self.distance = np.full(num_beacons, -1.0)
+        self.distance_variance = np.zeros(num_beacons)
+        self.valid = np.zeros(num_beacons, dtype=bool)
+
+        self.reset()
+
+    def reset(self):
+        self.readings.fill(RSSI_EMPTY)
+        self.reading_index.fill(0)
+        self.last_seen.fill(-np.inf)
+        self.valid.fill(False)
+
+        center = self.room_size / 2.0
+        self.kf_x = center
+        self.kf_y = center
+        self.kf_P = np.array([1.0, 1.0])
+        self.consecutive_fallback_cycles = 0
+
+        self.particles = None
+        self.weights = None
+
+    # --- RSSI ingestion ---
+    def add_readings(self, beacon_index, rssi, timestamps=None):
+        """Push a batch of raw advertisements (parallel arrays) into the per-beacon buffers"""
+        beacon_index = np.atleast_1d(np.asarray(beacon_index, dtype=np.intp))
+        rssi = np.atleast_1d(np.asarray(rssi, dtype=np.int16))
+        if timestamps is None:
+            timestamps = np.full(len(rssi), time.time())
+        else:
+            timestamps = np.atleast_1d(np.asarray(timestamps, dtype=float))
+
+        _, _, ok = self.tables.lookup(beacon_index, rssi)
+        if not ok.any():
+            return 0
+
+        beacon_index = beacon_index[ok]
+        rssi = rssi[ok]
+        timestamps = timestamps[ok]
+
+        for b in np.unique(beacon_index):
+            mask = beacon_index == b
+            values = rssi[mask][-RSSI_WINDOW:]
+            slots = (self.reading_index[b] + np.arange(len(values))) % RSSI_WINDOW
+            self.readings[b, slots] = values
+            self.reading_index[b] = (self.reading_index[b] + len(values)) % RSSI_WINDOW
+            self.last_seen[b] = max(self.last_seen[b], timestamps[mask].max())
+
+        self._update_beacon_stats(np.unique(beacon_index))
+        return int(ok.sum())
+
+    def add_advertisement(self, mac, rssi, timestamp=None):
+        index = self.mac_to_index.get(mac.upper())
+        if index is None:
+            return 0
+        return self.add_readings([index], [rssi], None if timestamp is None else [timestamp])
+
+    def _update_beacon_stats(self, beacon_index):
+        """calculateRSSIStats() for a set of beacons, then one table gather for their distances"""
+        readings = self.readings[beacon_index].astype(float)
+        present = readings > RSSI_EMPTY
+        count = present.sum(axis=1)
+        has_data = count > 0
+        safe_count = np.maximum(count, 1)
+
+        # Integer mean as in the firmware (C int division truncates toward zero)
+        mean = np.trunc(np.where(present, readings, 0).sum(axis=1) / safe_count)
+
+        # Upper median of the valid readings; empty slots sort to the end
+        ordered = np.sort(np.where(present, readings, np.inf), axis=1)
+        median = ordered[np.arange(len(beacon_index)), count // 2 * has_data]
+        median = np.where(has_data, median, RSSI_EMPTY).astype(np.int16)
+
+        variance = (np.where(present, readings - mean[:, None], 0) ** 2).sum(axis=1) / safe_count
+        variance = np.where(has_data, variance, 0.0)
+
+        distance, distance_variance, ok = self.tables.lookup(beacon_index, median)
+
+        self.rssi[beacon_index] = median
+        self.rssi_variance[beacon_index] = variance
+        self.distance[beacon_index] = np.where(ok, distance, -1.0)
+        self.distance_variance[beacon_index] = np.where(ok, distance_variance, 0.0)
+        self.valid[beacon_index] = has_data & (variance < 100.0)
+
+    # --- Position estimation ---
+    def calculate_position(self):
+        """IDW (P=3) multilateration; returns (x, y, uncertainty) or None"""
+        usable = self.valid & (self.distance > 0)
+        if usable.sum() < MIN_VALID_BEACONS:
+            return None
+
+        d = self.distance[usable]
+        pos = self.beacon_pos[usable]
+
+        weights = 1.0 / (self.rssi_variance[usable] + 1.0) * (1.0 / d)
+        weights /= weights.sum()
+
+        pull = 1.0 / d ** 3
+        x, y = (pos * pull[:, None]).sum(axis=0) / pull.sum()
+
+        expected = np.hypot(x - pos[:, 0], y - pos[:, 1])
+        uncertainty = float(np.clip((np.abs(expected - d) * weights).sum(), 0.1, 2.0))
+        return float(x), float(y), uncertainty
+
+    def update_kalman(self, measured_x, measured_y, uncertainty):
+        self.kf_P += self.process_noise
+        gain = self.kf_P / (self.kf_P + uncertainty)
+        self.kf_x += gain[0] * (measured_x - self.kf_x)
+        self.kf_y += gain[1] * (measured_y - self.kf_y)
+        self.kf_P *= 1.0 - gain
+
+    def initialize_particles(self, x=None, y=None):
+        n = self.num_particles
+        if x is None:
+            if self.layout is not None:
+                self.particles = self.layout.random_walkable(n, self.rng)
+            else:
+                self.particles = self.rng.uniform(0.0, self.room_size, size=(n, 2))
+        else:
+            spread = self.rng.uniform(-self.particle_step, self.particle_step, size=(n, 2))
+            self.particles = np.clip(np.array([x, y]) + spread, 0.0, self.room_size)
+            if self.layout is not None:
+                self.particles = np.column_stack(
+                    self.layout.snap_many(self.particles[:, 0], self.particles[:, 1]))
+        self.weights = np.full(n, 1.0 / n)
+
+    def update_particles(self, measured_x, measured_y, uncertainty):
+        if self.particles is None:
+            self.initialize_particles()
+
+        n = self.num_particles
+        step = self.rng.uniform(-self.particle_step, self.particle_step, size=(n, 2))
+        moved = np.clip(self.particles + step, 0.0, self.room_size)
+
+        blocked = None
+        if self.layout is not None:
+            # Endpoint and midpoint lookups catch both landing in and stepping across a shelf
+            probes = np.concatenate((moved, (self.particles + moved) * 0.5))
+            clearance = self.layout.signed_distance_many(probes[:, 0], probes[:, 1])
+            blocked = (clearance[:n] < 0) | (clearance[n:] < 0)
+            moved[blocked] = self.particles[blocked]
+        self.particles = moved
+
+        d2 = (self.particles[:, 0] - measured_x) ** 2 + (self.particles[:, 1] - measured_y) ** 2
+        weights = np.exp(-d2 / (2.0 * uncertainty * uncertainty))
+        if blocked is not None:
+            weights[blocked] *= self.blocked_penalty
+        total = weights.sum()
+        self.weights = weights / total if total > 0 else np.full(n, 1.0 / n)
+
+        effective = 1.0 / np.sum(self.weights ** 2)
+        if effective < n / 2:
+            cumulative = np.cumsum(self.weights)
+            picks = np.searchsorted(cumulative, self.rng.random(n) * cumulative[-1])
+            self.particles = self.particles[np.minimum(picks, n - 1)]
+            self.weights = np.full(n, 1.0 / n)
+
+    def particle_position(self):
+        x, y = self.weights @ self.particles
+        return float(x), float(y)
+
+    def snap(self, x, y):
+        """
+        Grid snapping with the firmware's 0.5m cell-centre offset. With a
+        layout, a grid centre inside a shelf moves to the nearest walkable cell.
+        """
+        res = self.snap_resolution
+        # C round() goes half away from zero; positions are never negative here
+        sx = min(max(np.floor(x / res + 0.5) * res + 0.5, 0.0), self.room_size)
+        sy = min(max(np.floor(y / res + 0.5) * res + 0.5, 0.0), self.room_size)
+        if self.layout is not None:
+            # the 0.5m offset can land half of an aisle on the next shelf
+            return self.layout.snap(float(sx), float(sy))
+        return float(sx), float(sy)
+
+    def update(self, now=None):
+        """
+        One pass of the firmware loop() after a scan.
+        Returns (snapped_x, snapped_y, uncertainty, filtered_x, filtered_y).
+        """
+        if now is None:
+            now = time.time()
+
+        self.valid &= (now - self.last_seen) <= BEACON_TIMEOUT
+
+        raw = self.calculate_position()
+        if raw is not None:
+            raw_x, raw_y, uncertainty = raw
+            if np.hypot(raw_x - self.kf_x, raw_y - self.kf_y) > self.filter_reset_distance:
+                # Filter SNAP: jump both filters to the new raw fix
+                self.kf_x, self.kf_y = raw_x, raw_y
+                self.kf_P[:] = 1.0
+                self.initialize_particles(raw_x, raw_y)
+            self.consecutive_fallback_cycles = 0
+        else:
+            uncertainty = self.room_size / 2.0
+            self.consecutive_fallback_cycles += 1
+
+        if self.consecutive_fallback_cycles > MAX_FALLBACK_CYCLES:
+            center = self.room_size / 2.0
+            self.kf_x, self.kf_y = center, center
+            self.kf_P[:] = 10.0
+            self.initialize_particles(center, center)
+            self.consecutive_fallback_cycles = 0
+
+        if not self.use_kalman:
+            # Pass-through: the "filter state" is simply the latest raw fix
+            if raw is not None:
+                self.kf_x, self.kf_y = raw_x, raw_y
+        elif raw is not None:
+            self.update_kalman(raw_x, raw_y, uncertainty)
+        else:
+            self.update_kalman(self.kf_x, self.kf_y, self.measurement_noise * 10.0)
+
+        if self.use_particle_filter:
+            self.update_particles(self.kf_x, self.kf_y, uncertainty)
+            final_x, final_y = self.particle_position()
+        else:
+            final_x, final_y = self.kf_x, self.kf_y
+        if self.layout is not None:
+            # The weighted mean of a cloud split by a shelf can fall inside it
+            final_x, final_y = self.layout.snap(final_x, final_y)
+        snapped_x, snapped_y = self.snap(final_x, final_y)
+        return snapped_x, snapped_y, uncertainty, final_x, final_y
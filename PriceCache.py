@@ -0,0 +1,97 @@
+import json
+import threading
+from collections import deque
+
+# ----------------- CONFIGURATION -----------------
+EARLY_EVENT_LIMIT = 256     # catalogue events kept while waiting for the first snapshot
+
+
+class PriceCache:
+    """
+    Local barcode -> (name, price) table that lets the checkout answer a
+    scan without a server round trip. It is warmed from a CATALOG snapshot
+    and kept current by the catalogue change events the server pushes.
+    Every entry remembers the catalogue version it came from, so an older
+    snapshot never overwrites a newer event. A version gap (a missed event)
+    or a new server epoch (a restart) asks the caller to fetch a fresh
+    snapshot. Events that arrive before that snapshot are held and merged
+    once it loads, so a change made while it was in flight is not lost.
+    Updates arrive on MQTT threads and lookups on the UI thread, so writes
+    take a lock and lookups are single dict reads.
+    """
+
+    def __init__(self):
+        self.entries = {}               # barcode -> (name, price, version)
+        self.epoch = None
+        self.version = None
+        self.early = deque(maxlen=EARLY_EVENT_LIMIT)    # (epoch, version, items) before a snapshot
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, barcode):
+        """(name, price) or None when the barcode has not been seen"""
+        entry = self.entries.get(barcode)
+        return None if entry is None else entry[:2]
+
+    def _merge(self, items, version):
+        for barcode, (name, price, _quantity) in items.items():
+            old = self.entries.get(barcode)
+            if old is None or old[2] <= version:
+                self.entries[barcode] = (name, float(price), version)
+
+    def load_snapshot(self, text):
+        """
+        Merge the server's CATALOG reply, then any events held back for it.
+        Returns True when those events show a gap and another snapshot
+        should be fetched.
+        """
+        data = json.loads(text)
+        with self.lock:
+            if data["epoch"] != self.epoch:
+                # a new server run: nothing cached from the previous one is trusted
+                self.entries = {}
+                self.epoch = data["epoch"]
+                self.version = None
+            self._merge(data["items"], data["version"])
+            self.version = data["version"] if self.version is None else max(self.version, data["version"])
+
+            early = sorted((e for e in self.early if e[0] == self.epoch), key=lambda e: e[1])
+            self.early.clear()
+            missed = False
+            for _epoch, version, items in early:
+                if version <= self.version:
+                    continue
+                missed = missed or version > self.version + 1
+                self._merge(items, version)
+                self.version = version
+            return missed
+
+    def apply_event(self, text):
+        """
+        Merge a pushed catalogue change. Returns True when the cache may have
+        missed changes and a snapshot should be fetched.
+        """
+        data = json.loads(text)
+        if data.get("type") != "catalog_changed":
+            return False
+        with self.lock:
+            if data["epoch"] != self.epoch or self.version is None:
+                # no snapshot for this server run yet: keep the event for when it loads
+                self.early.append((data["epoch"], data["version"], data["items"]))
+                return True
+            version = data["version"]
+            self._merge(data["items"], version)
+            missed = version > self.version + 1
+            self.version = max(self.version, version)
+            return missed
+
+    def put(self, barcode, name, price):
+        """Record an answer the server just gave (GET_ITEM)"""
+        with self.lock:
+            self.entries[barcode] = (name, float(price), self.version or 0)
+
+    def discard(self, barcode):
+        with self.lock:
+            self.entries.pop(barcode, None)
@@ -0,0 +1,128 @@
+import json
+from collections import namedtuple
+
+import numpy as np
+
+# ----------------- CONFIGURATION -----------------
+PROXIMITY_THRESHOLD = 0.3   # metres; an item closer than this counts as reached
+MOVE_EPSILON = 0.02         # metres the cart must move before queries are recomputed
+GRID_CELL = 1.0             # metres per spatial index cell
+MAX_GRID_CELLS = 1_000_000
+
+ProximityResult = namedtuple("ProximityResult", "nearest nearest_distance reached")
+
+
+def parse_items_update(payload):
+    """(x, y, name) tuples of the server's "items_update" message; None for any other message"""
+    data = json.loads(payload)
+    if data.get("type") != "items_update":
+        return None
+    return [(item["x"], item["y"], item["name"]) for item in data["items"]]
+
+
+class ItemGrid:
+    """
+    Uniform-grid spatial index over item coordinates. Item indices are sorted
+    by cell id (row-major), so every grid row of a rectangle query is one
+    contiguous slice and a query costs O(rows in view), not O(items).
+    """
+
+    def __init__(self, xs, ys, cell=GRID_CELL):
+        self.x0 = float(xs.min()) if len(xs) else 0.0
+        self.y0 = float(ys.min()) if len(ys) else 0.0
+        extent_x = (float(xs.max()) - self.x0) if len(xs) else 0.0
+        extent_y = (float(ys.max()) - self.y0) if len(ys) else 0.0
+        # grow the cell for very sparse, very large extents
+        cell = max(cell, np.sqrt((extent_x + cell) * (extent_y + cell) / MAX_GRID_CELLS))
+        self.cell = cell
+        self.cols = int(extent_x // cell) + 1
+        self.rows = int(extent_y // cell) + 1
+
+        col = ((xs - self.x0) // cell).astype(np.intp)
+        row = ((ys - self.y0) // cell).astype(np.intp)
+        ids = row * self.cols + col
+        self.order = np.argsort(ids, kind="stable")
+        self.starts = np.searchsorted(ids[self.order], np.arange(self.rows * self.cols + 1))
+
+    def query(self, x0, y0, x1, y1):
+        """Indices of items in the cells overlapping the rectangle (may include a cell-wide margin)"""
+        c0 = max(0, int((x0 - self.x0) // self.cell))
+        c1 = min(self.cols - 1, int((x1 - self.x0) // self.cell))
+        r0 = max(0, int((y0 - self.y0) // self.cell))
+        r1 = min(self.rows - 1, int((y1 - self.y0) // self.cell))
+        if c0 > c1 or r0 > r1:
+            return np.empty(0, dtype=np.intp)
+        if c0 == 0 and c1 == self.cols - 1:
+            return self.order[self.starts[r0 * self.cols]:self.starts[(r1 + 1) * self.cols]]
+
+        slices = [self.order[self.starts[r * self.cols + c0]:self.starts[r * self.cols + c1 + 1]]
+                  for r in range(r0, r1 + 1)]
+        return np.concatenate(slices)
+
+
+class ProximityEngine:
+    """
+    Nearest-item and reached-item queries over the client's item list.
+    Coordinates are kept in contiguous NumPy arrays rebuilt only when the
+    item list version changes. A query is one vectorized distance pass, and
+    it is skipped entirely while the cart stays within MOVE_EPSILON of the
+    last queried position. visible() answers viewport queries through an
+    ItemGrid built lazily from the same arrays.
+    """
+
+    def __init__(self, threshold=PROXIMITY_THRESHOLD, epsilon=MOVE_EPSILON):
+        self.threshold = threshold
+        self.epsilon = epsilon
+        self.items = []
+        self.xs = np.empty(0)
+        self.ys = np.empty(0)
+        self.version = None
+        self.query_position = None
+        self.result = ProximityResult(None, None, [])
+        self.grid = None
+
+    def sync(self, items, version):
+        """Take a snapshot of `items` ((x, y, name) tuples) if `version` changed."""
+        if version == self.version:
+            return False
+        self.items = list(items)
+        count = len(self.items)
+        self.xs = np.fromiter((item[0] for item in self.items), dtype=float, count=count)
+        self.ys = np.fromiter((item[1] for item in self.items), dtype=float, count=count)
+        self.version = version
+        self.query_position = None
+        self.grid = None
+        return True
+
+    def visible(self, bounds):
+        """Indices into `items` of the items inside store rectangle `bounds` (x0, y0, x1, y1)"""
+        if not self.items:
+            return np.empty(0, dtype=np.intp)
+        if self.grid is None:
+            self.grid = ItemGrid(self.xs, self.ys)
+        x0, y0, x1, y1 = bounds
+        candidates = self.grid.query(x0, y0, x1, y1)
+        xs, ys = self.xs[candidates], self.ys[candidates]
+        inside = (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+        return candidates[inside]
+
+    def query(self, x, y):
+        """
+        ProximityResult for the cart at (x, y): the nearest item tuple and its
+        distance (None without items) and the item tuples within the threshold.
+        """
+        last = self.query_position
+        if last is not None and (x - last[0]) ** 2 + (y - last[1]) ** 2 < self.epsilon ** 2:
+            return self.result
+
+        self.query_position = (x, y)
+        if not self.items:
+            self.result = ProximityResult(None, None, [])
+            return self.result
+
+        dist2 = (self.xs - x) ** 2 + (self.ys - y) ** 2
+        nearest = int(np.argmin(dist2))
+        reached = np.flatnonzero(dist2 < self.threshold ** 2)
+        self.result = ProximityResult(self.items[nearest], float(np.sqrt(dist2[nearest])),
+                                      [self.items[i] for i in reached])
+        return self.result
@@ -0,0 +1,182 @@
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# ----------------- CONFIGURATION -----------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RECEIPT_DIR = os.path.join(BASE_DIR, "receipts")
+RECEIPT_MAX_AGE = 24 * 3600     # seconds a written receipt is kept for the server to email
+PAGE_WIDTH, PAGE_HEIGHT = 612.0, 792.0     # reportlab's `letter`, in points
+ROW_HEIGHT = 18
+BOTTOM_MARGIN = 100         # item rows stop here and continue on the next page
+CLOSING_HEIGHT = 190        # totals, payment info and footer below the last row
+
+STORE_HEADER = "store_header"
+COLUMN_HEADERS = "column_headers"
+FOOTER = "footer"
+
+
+def _define_forms(c):
+    """
+    Draw the parts every receipt shares once per document as form XObjects;
+    each page then places them by reference instead of redrawing them.
+    Column headers and footer are drawn around y=0 and placed with a translate.
+    """
+    c.beginForm(STORE_HEADER)
+    c.setFont("Helvetica-Bold", 22)
+    c.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 60, "CyberKart")
+    c.setFont("Helvetica", 11)
+    c.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 90, "Kennesaw State University")
+    c.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 105, "1100 S Marietta Pkwy SE, Marietta, GA 30060")
+    c.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 120, "Phone: (470) 578-6000")
+    c.endForm()
+
+    c.beginForm(COLUMN_HEADERS, lowery=-20, uppery=20)
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(80, 0, "Item")
+    c.drawString(300, 0, "Qty")
+    c.drawString(360, 0, "Price")
+    c.drawString(430, 0, "Amount")
+    c.line(70, -15, 520, -15)
+    c.endForm()
+
+    c.beginForm(FOOTER, lowery=-30, uppery=20)
+    c.setFont("Helvetica-Oblique", 11)
+    c.drawCentredString(PAGE_WIDTH / 2, 0, "Thank you for shopping with CyberKart!")
+    c.drawCentredString(PAGE_WIDTH / 2, -20, "Please come again.")
+    c.endForm()
+
+
+def _place(c, form, y):
+    c.saveState()
+    c.translate(0, y)
+    c.doForm(form)
+    c.restoreState()
+
+
+def _start_items_page(c, y):
+    """Column headers at `y`; returns where the first row goes"""
+    _place(c, COLUMN_HEADERS, y)
+    c.setFont("Helvetica", 11)      # every new page starts with the default font
+    return y - 35
+
+
+_receipt_numbers = itertools.count(1)
+
+
+def receipt_filename(receipt_dir=RECEIPT_DIR):
+    """
+    A path no other receipt uses, so a receipt still waiting for the server's
+    EMAIL_RECEIPT is never overwritten by the next checkout's
+    """
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(receipt_dir, f"CyberKart_Receipt_{stamp}_{os.getpid()}_{next(_receipt_numbers)}.pdf")
+
+
+def prune_receipts(receipt_dir=RECEIPT_DIR, max_age=RECEIPT_MAX_AGE):
+    cutoff = time.time() - max_age
+    try:
+        with os.scandir(receipt_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".pdf") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+    except OSError:
+        pass
+
+
+def render_receipt(cart_items, total, filename):
+    """
+    Write the receipt PDF and return its absolute path. Rows are written as
+    they are read, continuing on as many pages as the cart needs, each with
+    the column headers repeated.
+    """
+    # reportlab is slow to import and only needed at checkout, so it stays out of startup
+    from reportlab.pdfgen import canvas
+
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    now = datetime.now()
+    c = canvas.Canvas(filename, pagesize=(PAGE_WIDTH, PAGE_HEIGHT))
+    _define_forms(c)
+
+    # Header and transaction info
+    c.doForm(STORE_HEADER)
+    c.setFont("Helvetica", 11)
+    transaction_num = f"Trans {int(now.timestamp()) % 10000}"
+    c.drawString(80, PAGE_HEIGHT - 150, f"{transaction_num}     Date {now.strftime('%m/%d/%y   Time %I:%M %p')}")
+    y = _start_items_page(c, PAGE_HEIGHT - 180)
+
+    # Item list
+    for item in cart_items:
+        if y < BOTTOM_MARGIN:
+            c.showPage()
+            y = _start_items_page(c, PAGE_HEIGHT - 60)
+        c.drawString(80, y, item['name'])
+        c.drawString(310, y, str(item['quantity']))
+        c.drawString(365, y, f"${item['price']:.2f}")
+        c.drawString(435, y, f"${item['price'] * item['quantity']:.2f}")
+        y -= ROW_HEIGHT
+
+    if y - CLOSING_HEIGHT < 40:
+        c.showPage()
+        y = PAGE_HEIGHT - 60
+
+    y -= 10
+    c.line(70, y, 520, y)
+    y -= 25
+
+    # Totals
+    c.setFont("Helvetica-Bold", 12)
+    c.drawRightString(510, y, f"Total: ${total:.2f}")
+    y -= 40
+
+    # Payment info
+    c.setFont("Helvetica", 11)
+    for line in ("Payment Method: VISA **** 1234",
+                 "Transaction Type: Sale",
+                 "Entry Method: Contactless",
+                 f"Auth Time: {now.strftime('%I:%M %p')}",
+                 "Trace Number: 46640501"):
+        c.drawString(80, y, line)
+        y -= 15
+    y -= 15
+
+    _place(c, FOOTER, y)
+
+    c.showPage()
+    c.save()
+    return os.path.abspath(filename)
+
+
+class ReceiptWorker:
+    """
+    Renders receipts on one background thread, in the order they were
+    asked for, so checkout never waits on reportlab. The items are copied
+    when the job is queued, so the cart can be cleared straight away. Each
+    receipt gets its own file under RECEIPT_DIR; files older than
+    RECEIPT_MAX_AGE are removed as new ones are written.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="receipt")
+
+    def submit(self, cart_items, total, callback=None, filename=None):
+        """
+        Queue a receipt; returns a Future for its path. `callback(path, error)`
+        runs on the worker thread when it is written or has failed.
+        """
+        items = [dict(item) for item in cart_items]
+        if filename is None:
+            filename = receipt_filename()
+            self.executor.submit(prune_receipts)
+        future = self.executor.submit(render_receipt, items, total, filename)
+        if callback is not None:
+            def done(f):
+                error = f.exception()
+                callback(None if error else f.result(), error)
+            future.add_done_callback(done)
+        return future
+
+    def close(self):
+        self.executor.shutdown(wait=False)
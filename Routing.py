@@ -0,0 +1,222 @@
+import heapq
+import threading
+
+import numpy as np
+
+from MapView import LRUCache
+from StoreLayout import StoreLayout
+
+# ----------------- CONFIGURATION -----------------
+ROUTE_RESOLUTION = 0.25     # metres per aisle graph node
+MAX_ROUTE_NODES = 40000     # coarser nodes for very large stores
+FIELD_CACHE_SIZE = 32       # per-target distance fields kept
+PLAN_CACHE_SIZE = 64
+
+# 8-connected moves (drow, dcol, cost in cells)
+_MOVES = [(-1, 0, 1.0), (1, 0, 1.0), (0, -1, 1.0), (0, 1, 1.0),
+          (-1, -1, 2 ** 0.5), (-1, 1, 2 ** 0.5), (1, -1, 2 ** 0.5), (1, 1, 2 ** 0.5)]
+
+
+class RouteField:
+    """
+    Shortest walking distance from every aisle node to one target node, plus
+    the next hop towards the target. Computed once per target; after that a
+    route from anywhere is a pointer walk and a distance is one lookup.
+    """
+
+    def __init__(self, grid, target):
+        self.target = target
+        self.distance = _dijkstra(grid.walkable, target) * grid.resolution
+        self.next_hop = _next_hops(self.distance, grid.walkable)
+
+
+def _neighbours_ok(walkable, dr, dc):
+    """Mask of cells whose (dr, dc) neighbour is walkable, without cutting shelf corners"""
+    rows, cols = walkable.shape
+    ok = np.zeros_like(walkable)
+    src = (slice(max(0, -dr), rows - max(0, dr)), slice(max(0, -dc), cols - max(0, dc)))
+    dst = (slice(max(0, dr), rows - max(0, -dr)), slice(max(0, dc), cols - max(0, -dc)))
+    ok[src] = walkable[src] & walkable[dst]
+    if dr and dc:
+        ok &= _neighbours_ok(walkable, dr, 0) & _neighbours_ok(walkable, 0, dc)
+    return ok
+
+
+def _dijkstra(walkable, target):
+    rows, cols = walkable.shape
+    dist = np.full(rows * cols, np.inf)
+    moves = [(dr * cols + dc, cost, _neighbours_ok(walkable, dr, dc).ravel()) for dr, dc, cost in _MOVES]
+
+    start = target[0] * cols + target[1]
+    dist[start] = 0.0
+    heap = [(0.0, start)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        for offset, cost, ok in moves:
+            if ok[node]:
+                nxt = node + offset
+                nd = d + cost
+                if nd < dist[nxt]:
+                    dist[nxt] = nd
+                    heapq.heappush(heap, (nd, nxt))
+    return dist.reshape(rows, cols)
+
+
+def _next_hops(distance, walkable):
+    """Flat index of the neighbour closest to the target, per node (vectorized over the grid)"""
+    rows, cols = distance.shape
+    padded = np.pad(distance, 1, constant_values=np.inf)
+    best = distance.copy()
+    base = np.arange(rows * cols).reshape(rows, cols)
+    hop = base.copy()
+    for dr, dc, cost in _MOVES:
+        shifted = padded[1 + dr:1 + dr + rows, 1 + dc:1 + dc + cols]
+        shifted = np.where(_neighbours_ok(walkable, dr, dc), shifted, np.inf)
+        better = shifted < best
+        best = np.where(better, shifted, best)
+        hop = np.where(better, base + dr * cols + dc, hop)
+    return hop.ravel()
+
+
+class Router:
+    """
+    Route planner over a coarse aisle graph derived from the store layout.
+    Nodes are walkable cells of a ROUTE_RESOLUTION grid, edges the 8
+    neighbours (no corner cutting). Each target gets a cached RouteField, so
+    per-move work is a few lookups plus walking the next-hop pointers.
+    Planning may run on a worker thread; the caches are shared under a lock.
+    """
+
+    def __init__(self, layout, resolution=ROUTE_RESOLUTION, max_nodes=MAX_ROUTE_NODES):
+        resolution = max(resolution, float(np.sqrt(layout.width * layout.height / max_nodes)))
+        rows = max(1, int(np.ceil(layout.height / resolution)))
+        cols = max(1, int(np.ceil(layout.width / resolution)))
+        xs, ys = np.meshgrid((np.arange(cols) + 0.5) * resolution, (np.arange(rows) + 0.5) * resolution)
+        walkable = layout.walkable_many(xs, ys)
+
+        # the coarse grid is itself a StoreLayout, which gives snapping for free
+        self.grid = StoreLayout(walkable, layout.width, layout.height, resolution, source="aisle graph")
+        self.fields = LRUCache(FIELD_CACHE_SIZE)
+        self.plans = LRUCache(PLAN_CACHE_SIZE)
+        self.lock = threading.Lock()
+
+    def node(self, x, y):
+        """Aisle node (row, col) for a store position; positions in shelves use the nearest aisle"""
+        x, y = self.grid.snap(x, y)
+        row, col = self.grid.cell_index(x, y)
+        return int(row), int(col)
+
+    def node_center(self, flat):
+        row, col = divmod(int(flat), self.grid.cols)
+        return (col + 0.5) * self.grid.resolution, (row + 0.5) * self.grid.resolution
+
+    def field(self, target_node):
+        with self.lock:
+            field = self.fields.get(target_node)
+        if field is None:
+            field = RouteField(self.grid, target_node)
+            with self.lock:
+                self.fields.put(target_node, field)
+        return field
+
+    def distance(self, start_node, target_node):
+        return float(self.field(target_node).distance[start_node])
+
+    def path(self, start_node, target_node):
+        """Node centres from start to target, keeping only the turns"""
+        field = self.field(target_node)
+        cols = self.grid.cols
+        node = start_node[0] * cols + start_node[1]
+        goal = target_node[0] * cols + target_node[1]
+        if not np.isfinite(field.distance.flat[node]):
+            return []
+
+        nodes = [node]
+        while node != goal:
+            node = int(field.next_hop[node])
+            nodes.append(node)
+
+        # drop nodes where the direction does not change
+        kept = [nodes[0]]
+        for prev, here, nxt in zip(nodes, nodes[1:], nodes[2:]):
+            if here - prev != nxt - here:
+                kept.append(here)
+        if len(nodes) > 1:
+            kept.append(nodes[-1])
+        return [self.node_center(n) for n in kept]
+
+    def visiting_order(self, start_node, target_nodes):
+        """
+        Open-path order over the targets: nearest neighbour from the cart,
+        then 2-opt. Unreachable targets are left out.
+        """
+        reachable = [i for i, t in enumerate(target_nodes) if np.isfinite(self.distance(start_node, t))]
+        if len(reachable) <= 1:
+            return reachable
+
+        # pairwise walking distances come straight from the cached fields
+        legs = {(i, j): self.distance(target_nodes[i], target_nodes[j])
+                for i in reachable for j in reachable if i != j}
+        first = {i: self.distance(start_node, target_nodes[i]) for i in reachable}
+
+        order = [min(reachable, key=first.get)]
+        left = set(reachable) - set(order)
+        while left:
+            nxt = min(left, key=lambda j: legs[order[-1], j])
+            order.append(nxt)
+            left.discard(nxt)
+
+        def length(seq):
+            return first[seq[0]] + sum(legs[a, b] for a, b in zip(seq, seq[1:]))
+
+        improved = True
+        while improved:
+            improved = False
+            for i in range(len(order) - 1):
+                for j in range(i + 1, len(order)):
+                    candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                    if length(candidate) < length(order) - 1e-9:
+                        order, improved = candidate, True
+        return order
+
+    def _plan_key(self, start, targets):
+        return self.node(*start), tuple(self.node(x, y) for x, y in targets)
+
+    def planned(self, start, targets):
+        """plan() if it is already cached, else None; never runs Dijkstra"""
+        key = self._plan_key(start, targets)
+        with self.lock:
+            cached = self.plans.get(key)
+        if cached is None:
+            return None
+        order, tail = cached
+        return order, [tuple(start)] + tail
+
+    def plan(self, start, targets):
+        """
+        Route from `start` (x, y) through every reachable target (x, y).
+        Returns (order, points): indices into `targets` and the polyline in
+        store coordinates. The order and the path after the start are cached
+        per (start node, target nodes); the line always begins at `start`.
+        """
+        key = self._plan_key(start, targets)
+        start_node, target_nodes = key
+        with self.lock:
+            cached = self.plans.get(key)
+        if cached is None:
+            order = self.visiting_order(start_node, list(target_nodes))
+            tail = []
+            node = start_node
+            for index in order:
+                leg = self.path(node, target_nodes[index])
+                tail.extend(leg[1:])
+                tail.append(tuple(targets[index]))
+                node = target_nodes[index]
+            cached = (order, tail)
+            with self.lock:
+                self.plans.put(key, cached)
+
+        order, tail = cached
+        return order, [tuple(start)] + tail
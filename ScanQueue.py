@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import time
+
+import AsyncLog
+from CommandClient import reply_text
+
+# ----------------- CONFIGURATION -----------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCAN_QUEUE_FILE = os.path.join(BASE_DIR, ".scan_queue.jsonl")
+
+LOG = AsyncLog.get_logger("scan_queue")
+
+
+class ScanQueue:
+    """
+    Scans the server has not confirmed yet, in scan order, persisted as one
+    JSON line per scan so they survive a crash or restart while offline.
+    Appends are flushed and synced immediately. Every other change is an
+    atomic rewrite. Confirmed scans are dropped by identity, so scans
+    queued while a replay was in flight are kept. Scans whose cart line
+    is removed, cleared or paid for are dropped as well, so a restart
+    never brings them back.
+    """
+
+    def __init__(self, path=SCAN_QUEUE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = []
+        torn = False
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        self.entries.append(json.loads(line))
+                    except ValueError:
+                        torn = True     # last line of a crash mid-write
+        except OSError:
+            pass
+        if torn:
+            with self.lock:
+                self._rewrite()     # or the next append would join the torn line
+
+    def __len__(self):
+        return len(self.entries)
+
+    def pending(self):
+        """Barcodes of every queued scan, repeats included"""
+        with self.lock:
+            return [entry["barcode"] for entry in self.entries]
+
+    def append(self, barcode):
+        entry = {"barcode": barcode, "time": time.time()}
+        with self.lock:
+            self.entries.append(entry)
+            try:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError:
+                pass    # still queued in memory
+
+    def batch(self):
+        """(entries, distinct barcodes) of the scans queued so far, for one replay"""
+        with self.lock:
+            entries = list(self.entries)
+        return entries, list(dict.fromkeys(entry["barcode"] for entry in entries))
+
+    def replay(self, commands, price_cache):
+        """
+        Confirm the scans queued so far with one GET_ITEMS request. Returns
+        the server's {barcode: [name, price, ...] or None} after dropping the
+        confirmed scans, or None when the request failed and they stay queued.
+        """
+        entries, barcodes = self.batch()
+        response = reply_text(commands.request("GET_ITEMS:" + ",".join(barcodes)))
+        if not response.startswith("ITEMS:"):
+            LOG.warning("Scan queue replay failed: %s", response)
+            return None
+        try:
+            found = json.loads(response[len("ITEMS:"):])
+        except ValueError as e:
+            LOG.error("Bad GET_ITEMS reply: %s", e)
+            return None
+        for barcode, entry in found.items():
+            if entry is not None:
+                price_cache.put(barcode, entry[0], entry[1])
+        self.discard(entries)
+        LOG.info("Replayed %d queued scans (%d barcodes) in one request", len(entries), len(barcodes))
+        return found
+
+    def discard(self, entries):
+        """Drop the batch()ed `entries` once the server has answered for them"""
+        answered = {id(entry) for entry in entries}
+        with self.lock:
+            self.entries = [entry for entry in self.entries if id(entry) not in answered]
+            self._rewrite()
+
+    def drop(self, barcode, count=1):
+        """Forget the newest `count` queued scans of `barcode` (its cart line went down)"""
+        with self.lock:
+            keep = []
+            for entry in reversed(self.entries):
+                if count and entry["barcode"] == barcode:
+                    count -= 1
+                else:
+                    keep.append(entry)
+            if len(keep) != len(self.entries):
+                self.entries = keep[::-1]
+                self._rewrite()
+
+    def clear(self):
+        with self.lock:
+            if self.entries:
+                self.entries = []
+                self._rewrite()
+
+    def _rewrite(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in self.entries)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
@@ -0,0 +1,86 @@
+import json
+from collections import defaultdict
+
+import numpy as np
+
+# ----------------- CONFIGURATION -----------------
+MAX_GRAM = 3                # index every substring up to this length
+SEARCH_FIELDS = ("name", "barcode")
+
+_EMPTY = np.empty(0, dtype=np.int32)
+
+
+def products_from_catalog(text):
+    """Product dicts for the search popup, from the server's CATALOG reply"""
+    items = json.loads(text)["items"]
+    return [{'name': name, 'price': price, 'quantity': quantity, 'barcode': barcode}
+            for barcode, (name, price, quantity) in items.items()]
+
+
+class SearchIndex:
+    """
+    Case-insensitive substring search over the product catalogue, built
+    once when the catalogue loads. Every substring of up to MAX_GRAM
+    characters of a product's name and barcode maps to a sorted array of
+    product ids, so a query that short is one dictionary lookup. Longer
+    queries intersect the postings of their trigrams, shortest first, and
+    check only the surviving candidates. While the user keeps typing, the
+    previous result set is narrowed instead of searched again.
+    Results keep catalogue order.
+    """
+
+    def __init__(self, products, fields=SEARCH_FIELDS, max_gram=MAX_GRAM):
+        self.products = list(products)
+        self.max_gram = max_gram
+        # fields are joined with a separator no query contains, so no gram spans two fields
+        self.texts = ["\0".join(str(p.get(f, "")).lower() for f in fields) for p in self.products]
+
+        postings = defaultdict(list)
+        for i, text in enumerate(self.texts):
+            grams = set()
+            for n in range(1, max_gram + 1):
+                grams.update(text[j:j + n] for j in range(len(text) - n + 1))
+            grams = {g for g in grams if "\0" not in g}
+            for gram in grams:
+                postings[gram].append(i)
+        self.postings = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+
+        self.last_query = None
+        self.last_ids = None
+
+    def __len__(self):
+        return len(self.products)
+
+    def search_ids(self, query):
+        """Sorted ids of the products whose name or barcode contains `query`"""
+        q = query.lower()
+        if not q:
+            return _EMPTY
+        if q == self.last_query:
+            return self.last_ids
+
+        if len(q) <= self.max_gram:
+            ids = self.postings.get(q, _EMPTY)
+        else:
+            grams = [self.postings.get(q[j:j + self.max_gram], _EMPTY)
+                     for j in range(len(q) - self.max_gram + 1)]
+            grams.sort(key=len)
+            ids = grams[0]
+            for posting in grams[1:]:
+                if len(ids) <= 32:
+                    break   # cheaper to check the few left than to intersect further
+                ids = np.intersect1d(ids, posting, assume_unique=True)
+
+            # typing one more character can only remove matches
+            if self.last_query is not None and self.last_query in q and len(self.last_ids) < len(ids):
+                ids = self.last_ids
+            texts = self.texts
+            ids = np.fromiter((i for i in ids.tolist() if q in texts[i]), dtype=np.int32)
+
+        self.last_query, self.last_ids = q, ids
+        return ids
+
+    def search(self, query):
+        """Product dicts matching `query`, in catalogue order"""
+        products = self.products
+        return [products[i] for i in self.search_ids(query).tolist()]
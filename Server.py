@@ -12,6 +12,8 @@ from email.mime.base import MIMEBase
 from email import encoders
 import json
 
+import AsyncLog
+
 # Store Stock in dictionary with barcode support and locations
 stock = {
     "Preztzel - Mini": {"quantity": 1, "price": 4.99, "barcode": "077975022177", "location": (0.5, 4.5)},
@@ -41,13 +43,22 @@ MQTT_ITEM_TOPIC = "indoor/items"
 MQTT_COMMANDS_TOPIC = "shopping_app/commands"
 MQTT_RESPONSES_TOPIC = "shopping_app/responses"
 MQTT_PINNED_TOPIC = "shopping_app/pinned_items"  # New topic for pinned items
+MQTT_CATALOG_TOPIC = "shopping_app/catalog"  # price / stock change events for client barcode caches
 MQTT_CLIENT_ID = "Stock_Server"
 
+# per-request traces go through the async logger; the console CLI keeps print
+LOG = AsyncLog.get_logger("server")
+
 # MQTT Client
 mqtt_client = None
 # Store client sessions
 client_sessions = {}
 
+# Catalogue versioning for client caches: every change event bumps the version, and the
+# epoch changes with each server run so clients know to drop what they cached before
+CATALOG_EPOCH = int(time.time())
+catalog_version = 0
+
 ##############################################################################################
 # MQTT Functions
 ##############################################################################################
@@ -90,7 +101,7 @@ def on_message(client, userdata, msg):
         payload = msg.payload.decode()
 
         if topic == MQTT_COMMANDS_TOPIC:
-            print(f"Received command: {payload}")
+            LOG.debug("Received command: %s", payload)
 
             # Parse the command
             if ':' in payload:
@@ -103,16 +114,20 @@ def on_message(client, userdata, msg):
             threading.Thread(target=process_command, args=(client_id, command), daemon=True).start()
 
     except Exception as e:
-        print(f"Error processing MQTT message: {e}")
+        LOG.error("Error processing MQTT message: %s", e)
+
+def client_identity(client_id):
+    """The client's id without the "#<request id>" tag a CommandClient adds; the tag is only echoed back"""
+    return client_id.split("#", 1)[0]
 
 def send_response(client_id, response):
     """Send response back to client"""
     if mqtt_client and mqtt_client.is_connected():
         response_payload = f"{client_id}:{response}"
         mqtt_client.publish(MQTT_RESPONSES_TOPIC, response_payload)
-        print(f"Sent response to client {client_id}")
+        LOG.debug("Sent response to client %s", client_id)
     else:
-        print("MQTT client not connected, cannot send response")
+        LOG.warning("MQTT client not connected, cannot send response")
 
 def publish_pinned_item(item_name, barcode, location):
     """Publish pinned item to all clients"""
@@ -141,15 +156,49 @@ def publish_pinned_item(item_name, barcode, location):
         print(f"âŒ Error publishing pinned item: {e}")
         return False
 
+def catalog_entry(item_name):
+    """[name, price, quantity] of an item; the caller holds the stock lock"""
+    data = stock[item_name]
+    return [item_name, data["price"], data["quantity"]]
+
+def catalog_snapshot():
+    """Whole catalogue keyed by barcode, with the version it reflects"""
+    with lock:
+        return json.dumps({
+            "epoch": CATALOG_EPOCH,
+            "version": catalog_version,
+            "items": {data["barcode"]: catalog_entry(name) for name, data in stock.items()}
+        })
+
+def publish_catalog_change(item_names):
+    """Push the new price/stock of `item_names` to client caches. Call without holding the lock."""
+    global catalog_version
+    with lock:
+        catalog_version += 1
+        message = {
+            "type": "catalog_changed",
+            "epoch": CATALOG_EPOCH,
+            "version": catalog_version,
+            "items": {stock[name]["barcode"]: catalog_entry(name) for name in item_names if name in stock}
+        }
+
+    # a lost event shows up as a version gap, and clients then fetch a fresh snapshot
+    if mqtt_client and mqtt_client.is_connected():
+        mqtt_client.publish(MQTT_CATALOG_TOPIC, json.dumps(message))
+    else:
+        LOG.warning("MQTT client not connected, catalogue change %d not pushed", message["version"])
+
 def process_command(client_id, command):
     """Process commands from clients"""
-    print(f"Processing command from {client_id}: {command}")
+    LOG.info("Processing command from %s: %s", client_id, command)
 
     try:
         if command == "PRICES":
             with lock:
                 price_list = "\n".join(f"{item}:{data['price']}" for item, data in stock.items())
             send_response(client_id, price_list)
+        elif command == "CATALOG":
+            send_response(client_id, catalog_snapshot())
         elif command == "STOCK":
             with lock:
                 stock_list = "\n".join(f"{item}:{data['quantity']}" for item, data in stock.items())
@@ -162,6 +211,13 @@ def process_command(client_id, command):
                     send_response(client_id, f"BARCODE:{item_name}:{barcode}")
                 else:
                     send_response(client_id, f"ERROR:Item {item_name} not found")
+        elif command.startswith("GET_ITEMS:"):
+            # batched lookup, e.g. a client replaying scans queued while offline
+            barcodes = [b.strip() for b in command.replace("GET_ITEMS:", "", 1).split(",") if b.strip()]
+            with lock:
+                found = {b: [barcode_to_item[b], stock[barcode_to_item[b]]["price"]]
+                         if b in barcode_to_item else None for b in barcodes}
+            send_response(client_id, "ITEMS:" + json.dumps(found))
         elif command.startswith("GET_ITEM:"):
             barcode = command.replace("GET_ITEM:", "").strip()
             with lock:
@@ -178,7 +234,7 @@ def process_command(client_id, command):
             if len(parts) >= 2:
                 item_name = parts[0]
                 barcode = parts[1] if len(parts) > 1 else ""
-                print(f" PIN request from {client_id}: {item_name} (Barcode: {barcode})")
+                print(f" PIN request from {client_identity(client_id)}: {item_name} (Barcode: {barcode})")
 
                 # Find the item in stock
                 found_item = None
@@ -209,7 +265,7 @@ def process_command(client_id, command):
                         "item_name": found_item,
                         "barcode": stock[found_item]["barcode"],
                         "location": item_location,
-                        "pinned_by": client_id,
+                        "pinned_by": client_identity(client_id),
                         "timestamp": time.time()
                     }
 
@@ -230,6 +286,7 @@ def process_command(client_id, command):
             items = command.replace("CHECKOUT", "").strip().split()
             response_lines = []
             stock_updated = False
+            changed_items = set()
 
             with lock:
                 for entry in items:
@@ -248,6 +305,7 @@ def process_command(client_id, command):
                                 response_lines.append(
                                     f"Deducted {qty} {item_name}(s). Remaining: {stock[item_name]['quantity']}")
                                 stock_updated = True
+                                changed_items.add(item_name)
                             else:
                                 response_lines.append(f"Not enough {item_name} in stock.")
                         else:
@@ -262,9 +320,10 @@ def process_command(client_id, command):
             if stock_updated:
                 print("Stock updated, propagating to indoor positioning...")
                 publish_items_update()
+                publish_catalog_change(changed_items)
         elif command.startswith("RECEIPT"):
             receipt_content = command.replace("RECEIPT", "", 1).strip()
-            filename = f"receipt_{client_id}_{int(time.time())}.txt"
+            filename = f"receipt_{client_identity(client_id)}_{int(time.time())}.txt"
             with open(filename, "w") as f:
                 f.write(receipt_content)
             send_response(client_id, f"Receipt saved on server as {filename}")
@@ -667,6 +726,8 @@ def command_loop():
 
             publish_items_update()
 
+            publish_catalog_change([item])
+
 
 
         elif command == "subtract" and len(cmd) == 3:
@@ -685,6 +746,8 @@ def command_loop():
 
 
 
+            removed = False
+
             with lock:
 
                 if item in stock:
@@ -693,11 +756,9 @@ def command_loop():
 
                         stock[item]["quantity"] -= qty
 
-                        print(f"Removed {qty} {item}(s). New quantity: {stock[item]['quantity']}")
-
-                        print("Auto-propagating to indoor positioning...")
+                        removed = True
 
-                        publish_items_update()
+                        print(f"Removed {qty} {item}(s). New quantity: {stock[item]['quantity']}")
 
                     else:
 
@@ -709,6 +770,18 @@ def command_loop():
 
 
 
+            # publishing takes the stock lock itself, so it must happen after releasing it
+
+            if removed:
+
+                print("Auto-propagating to indoor positioning...")
+
+                publish_items_update()
+
+                publish_catalog_change([item])
+
+
+
         elif command == "set_price" and len(cmd) == 3:
 
             item = cmd[1]
@@ -727,7 +800,9 @@ def command_loop():
 
             with lock:
 
-                if item in stock:
+                found = item in stock
+
+                if found:
 
                     stock[item]["price"] = price
 
@@ -739,6 +814,12 @@ def command_loop():
 
 
 
+            if found:
+
+                publish_catalog_change([item])
+
+
+
         elif command == "set_location" and len(cmd) == 4:
 
             item = cmd[1]
@@ -873,6 +954,8 @@ def start_server():
 
     """Start the MQTT-based server"""
 
+    AsyncLog.setup()
+
     print("Starting MQTT Stock Server with Indoor Positioning Integration...")
 
     print(f"MQTT Broker: {MQTT_BROKER}:{MQTT_PORT}")
@@ -885,6 +968,8 @@ def start_server():
 
     print(f"Pinned items topic: {MQTT_PINNED_TOPIC}")
 
+    print(f"Catalogue topic: {MQTT_CATALOG_TOPIC}")
+
 
 
     if not setup_mqtt():
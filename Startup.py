@@ -0,0 +1,72 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import AsyncLog
+
+# ----------------- CONFIGURATION -----------------
+STARTUP_BUDGET = 1.5        # seconds from launch to an interactive map; slower starts log a warning
+
+LOG = AsyncLog.get_logger("startup")
+
+
+class StartupTimer:
+    """
+    Timeline of a cold start, measured from when this module was first
+    imported (the first import in the client). Milestones are marked from
+    any thread, and work that runs concurrently with the UI is timed as
+    spans. Only the first occurrence of a name counts, so reconnects do not
+    add to the timeline. report() logs the timeline once the app is
+    interactive; anything that finishes after that is logged as it happens.
+    """
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.events = []                # (at, duration or None, name), seconds since start
+        self.names = set()
+        self.lock = threading.Lock()
+        self.reported = False
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def _record(self, at, duration, name):
+        with self.lock:
+            if name in self.names:
+                return
+            self.names.add(name)
+            self.events.append((at, duration, name))
+            late = self.reported
+        if late:
+            LOG.info("%s", self._line(at, duration, name))
+
+    def mark(self, name):
+        self._record(self.elapsed(), None, name)
+
+    @contextmanager
+    def span(self, name):
+        begin = self.elapsed()
+        try:
+            yield
+        finally:
+            end = self.elapsed()
+            self._record(end, end - begin, name)
+
+    @staticmethod
+    def _line(at, duration, name):
+        took = "" if duration is None else f"  ({duration * 1000:.0f} ms)"
+        return f"{at * 1000:7.0f} ms  {name}{took}"
+
+    def report(self, interactive="interactive"):
+        """Mark `interactive` and log every phase so far in time order"""
+        self.mark(interactive)
+        with self.lock:
+            events = sorted(self.events, key=lambda event: event[0])
+            self.reported = True
+        total = events[-1][0]
+        LOG.info("Startup timeline:\n%s", "\n".join(self._line(*event) for event in events))
+        if total > STARTUP_BUDGET:
+            LOG.warning("%s after %.2f s, over the %.1f s budget", interactive, total, STARTUP_BUDGET)
+
+
+STARTUP = StartupTimer()
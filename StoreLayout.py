@@ -0,0 +1,247 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# ----------------- CONFIGURATION -----------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LAYOUT_FILE = os.path.join(BASE_DIR, "store_layout.json")
+MAP_IMAGE = os.path.join(BASE_DIR, "theMap.png")
+
+STORE_WIDTH = 7.0
+STORE_HEIGHT = 7.0
+LAYOUT_RESOLUTION = 0.1     # metres per raster cell
+
+# theMap.png pixels darker than this (0-255 luminance) are treated as shelving
+SHELF_LUMINANCE = 96
+
+# Keeps the per-row working set of the distance transform around 32 MB
+_EDT_BLOCK_CELLS = 4_000_000
+
+
+def _nearest_cells(target):
+    """
+    Exact Euclidean distance transform with feature indices.
+    For every cell returns (distance_in_cells, nearest_row, nearest_col) of the
+    closest True cell in `target`. Separable two-pass version: nearest target
+    per column first, then a vectorized min over columns one block of rows at a time.
+    """
+    rows, cols = target.shape
+    big = rows + cols + 1
+    row_ids = np.arange(rows)[:, None]
+
+    # Pass 1: nearest target row within each column
+    above = np.where(target, row_ids, -big)
+    above = np.maximum.accumulate(above, axis=0)
+    below = np.where(target, row_ids, 2 * big)
+    below = np.minimum.accumulate(below[::-1], axis=0)[::-1]
+
+    take_below = (below - row_ids) < (row_ids - above)
+    col_row = np.where(take_below, below, above)
+    col_dist = np.abs(col_row - row_ids).astype(np.float64)
+    col_dist[(col_row < 0) | (col_row >= rows)] = np.inf
+
+    # Pass 2: combine columns, min over (dc^2 + column_distance^2)
+    col_ids = np.arange(cols)
+    dc2 = ((col_ids[:, None] - col_ids[None, :]) ** 2).astype(np.float64)
+
+    dist2 = np.empty((rows, cols))
+    nearest_col = np.empty((rows, cols), dtype=np.intp)
+    block = max(1, _EDT_BLOCK_CELLS // (cols * cols))
+    for start in range(0, rows, block):
+        stop = min(rows, start + block)
+        cost = dc2[None, :, :] + (col_dist[start:stop, None, :] ** 2)
+        best = np.argmin(cost, axis=2)
+        nearest_col[start:stop] = best
+        dist2[start:stop] = np.take_along_axis(cost, best[:, :, None], axis=2)[:, :, 0]
+
+    nearest_row = np.take_along_axis(col_row, nearest_col, axis=1)
+    return np.sqrt(dist2), nearest_row, nearest_col
+
+
+class StoreLayout:
+    """
+    Walkability raster of the store floor. Row 0 is y = 0 so raster indices
+    line up with store coordinates. Every query is an array lookup; the
+    nearest walkable cell for each blocked cell comes from a distance
+    transform that runs once, on the first snap that needs it, so loading a
+    layout stays cheap.
+    """
+
+    def __init__(self, walkable, width=STORE_WIDTH, height=STORE_HEIGHT,
+                 resolution=LAYOUT_RESOLUTION, source="defaults"):
+        self.walkable = np.ascontiguousarray(walkable, dtype=bool)
+        self.width = float(width)
+        self.height = float(height)
+        self.resolution = float(resolution)
+        self.source = source
+        self.rows, self.cols = self.walkable.shape
+
+        if not self.walkable.any():
+            raise ValueError("Store layout has no walkable cells")
+
+        self._nearest = None
+        self._signed_distance = None
+        self._build_lock = threading.Lock()
+
+    # --- Constructors ---
+    @classmethod
+    def from_shelves(cls, shelves, width=STORE_WIDTH, height=STORE_HEIGHT,
+                     resolution=LAYOUT_RESOLUTION, source="shelves"):
+        """Rasterize shelf rectangles given as (x0, y0, x1, y1) in metres"""
+        rows = int(round(height / resolution))
+        cols = int(round(width / resolution))
+        walkable = np.ones((rows, cols), dtype=bool)
+
+        centers_x = (np.arange(cols) + 0.5) * resolution
+        centers_y = (np.arange(rows) + 0.5) * resolution
+        for x0, y0, x1, y1 in shelves:
+            in_x = (centers_x >= min(x0, x1)) & (centers_x <= max(x0, x1))
+            in_y = (centers_y >= min(y0, y1)) & (centers_y <= max(y0, y1))
+            walkable[np.ix_(in_y, in_x)] = False
+
+        return cls(walkable, width, height, resolution, source)
+
+    @classmethod
+    def from_file(cls, path=LAYOUT_FILE, resolution=None):
+        with open(path, "r") as f:
+            data = json.load(f)
+
+        return cls.from_shelves(
+            data.get("shelves", []),
+            width=data.get("width", STORE_WIDTH),
+            height=data.get("height", STORE_HEIGHT),
+            resolution=resolution or data.get("resolution", LAYOUT_RESOLUTION),
+            source=path
+        )
+
+    @classmethod
+    def from_image(cls, path=MAP_IMAGE, width=STORE_WIDTH, height=STORE_HEIGHT,
+                   resolution=LAYOUT_RESOLUTION, threshold=SHELF_LUMINANCE):
+        """Dark pixels of the floor plan are shelving, everything else is floor"""
+        from PIL import Image
+
+        rows = int(round(height / resolution))
+        cols = int(round(width / resolution))
+        img = Image.open(path).convert("L").resize((cols, rows), Image.BOX)
+        luminance = np.asarray(img)[::-1]   # image row 0 is the top of the store
+        return cls(luminance >= threshold, width, height, resolution, path)
+
+    @classmethod
+    def load(cls, width=STORE_WIDTH, height=STORE_HEIGHT, resolution=None):
+        """Layout file if present, else theMap.png, else an open floor"""
+        if os.path.exists(LAYOUT_FILE):
+            return cls.from_file(LAYOUT_FILE, resolution)
+        if os.path.exists(MAP_IMAGE):
+            return cls.from_image(MAP_IMAGE, width, height, resolution or LAYOUT_RESOLUTION)
+
+        print(" Warning: no store layout found - every position is treated as walkable")
+        return cls.from_shelves([], width, height, resolution or LAYOUT_RESOLUTION, "open floor")
+
+    def _nearest_walkable(self):
+        """(distance in cells, x, y) of the nearest walkable cell centre, per cell; built on first use"""
+        table = self._nearest
+        if table is None:
+            with self._build_lock:
+                table = self._nearest
+                if table is None:
+                    to_walkable, near_row, near_col = _nearest_cells(self.walkable)
+                    table = self._nearest = (to_walkable, (near_col + 0.5) * self.resolution,
+                                             (near_row + 0.5) * self.resolution)
+        return table
+
+    def snap_table(self):
+        """(x, y) centre of the nearest walkable cell, per cell"""
+        return self._nearest_walkable()[1:]
+
+    @property
+    def signed_distance(self):
+        """
+        Signed distance field in metres, built on first use: positive in aisles
+        (clearance to the nearest shelf), negative inside shelves (depth to
+        the nearest aisle)
+        """
+        field = self._signed_distance
+        if field is None:
+            to_walkable = self._nearest_walkable()[0]
+            with self._build_lock:
+                field = self._signed_distance
+                if field is None:
+                    if self.walkable.all():
+                        to_blocked = np.full(self.walkable.shape, max(self.rows, self.cols), dtype=float)
+                    else:
+                        to_blocked = _nearest_cells(~self.walkable)[0]
+                    field = self._signed_distance = np.where(self.walkable, to_blocked, -to_walkable) * self.resolution
+        return field
+
+    # --- Queries ---
+    def cell_index(self, x, y):
+        """Raster (row, col) for store coordinates; works on scalars and arrays"""
+        col = np.clip(np.floor(np.asarray(x) / self.resolution), 0, self.cols - 1).astype(np.intp)
+        row = np.clip(np.floor(np.asarray(y) / self.resolution), 0, self.rows - 1).astype(np.intp)
+        return row, col
+
+    def in_bounds(self, x, y):
+        return (0.0 <= x <= self.width) and (0.0 <= y <= self.height)
+
+    def is_walkable(self, x, y):
+        if not self.in_bounds(x, y):
+            return False
+        row, col = self.cell_index(x, y)
+        return bool(self.walkable[row, col])
+
+    def snap(self, x, y):
+        """Return (x, y) unchanged if walkable, otherwise the nearest walkable cell centre"""
+        x = min(max(x, 0.0), self.width)
+        y = min(max(y, 0.0), self.height)
+        row, col = self.cell_index(x, y)
+        if self.walkable[row, col]:
+            return x, y
+        snap_x, snap_y = self.snap_table()
+        return float(snap_x[row, col]), float(snap_y[row, col])
+
+    def signed_distance_many(self, xs, ys):
+        """Signed distance field gather; anything outside the store counts as blocked"""
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+
+        # Hot path of the constrained particle filter: truncate, clip in place, flat take
+        col = (xs * (1.0 / self.resolution)).astype(np.intp)
+        row = (ys * (1.0 / self.resolution)).astype(np.intp)
+        np.clip(col, 0, self.cols - 1, out=col)
+        np.clip(row, 0, self.rows - 1, out=row)
+        row *= self.cols
+        row += col
+        values = self.signed_distance.take(row)
+        outside = (xs < 0) | (xs > self.width) | (ys < 0) | (ys > self.height)
+        if outside.any():
+            values = np.where(outside, -self.resolution, values)
+        return values
+
+    def random_walkable(self, count, rng):
+        """Uniform samples over the walkable floor, returned as an (count, 2) array"""
+        cells = np.flatnonzero(self.walkable)
+        picks = cells[rng.integers(0, len(cells), size=count)]
+        row, col = np.divmod(picks, self.cols)
+        jitter = rng.random((count, 2))
+        return np.column_stack(((col + jitter[:, 0]) * self.resolution,
+                                (row + jitter[:, 1]) * self.resolution))
+
+    def walkable_many(self, xs, ys):
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        inside = (xs >= 0) & (xs <= self.width) & (ys >= 0) & (ys <= self.height)
+        row, col = self.cell_index(xs, ys)
+        return inside & self.walkable[row, col]
+
+    def snap_many(self, xs, ys):
+        xs = np.clip(np.asarray(xs, dtype=float), 0.0, self.width)
+        ys = np.clip(np.asarray(ys, dtype=float), 0.0, self.height)
+        row, col = self.cell_index(xs, ys)
+        ok = self.walkable[row, col]
+        if ok.all():
+            return xs, ys
+        snap_x, snap_y = self.snap_table()
+        return (np.where(ok, xs, snap_x[row, col]),
+                np.where(ok, ys, snap_y[row, col]))
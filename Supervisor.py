@@ -0,0 +1,210 @@
+import argparse
+import time
+
+import numpy as np
+
+from kivy.app import App
+from kivy.uix.stencilview import StencilView
+from kivy.uix.floatlayout import FloatLayout
+from kivy.uix.label import Label
+from kivy.graphics import Color, InstructionGroup, Mesh
+from kivy.clock import Clock
+from kivy.metrics import dp
+
+import AsyncLog
+import Broker
+from Fleet import FleetState, CongestionMap, FLEET_TOPIC, start_simulation
+from MapView import Viewport
+from MapWidgets import BackgroundWidget, ItemMarkerBatch, PanZoomMixin
+from StoreLayout import StoreLayout
+
+# ----------------- CONFIGURATION -----------------
+MQTT_BROKER = "192.168.137.8"
+OVERLAY_INTERVAL = 1.0      # seconds between congestion / lost-cart refreshes
+CART_TEMPLATE = [[0, 7], [-5, -4], [5, -4]]
+
+LOG = AsyncLog.get_logger("supervisor")
+
+STORE_LAYOUT = StoreLayout.load()
+
+
+class ZoneOverlay:
+    """Congestion zones drawn as one translucent quad Mesh per level"""
+    COLORS = [(1, 0.85, 0, 0.25), (1, 0.5, 0, 0.35), (0.9, 0.1, 0.1, 0.45)]
+    QUADS_PER_MESH = 65535 // 4     # 16-bit mesh indices
+    QUAD = np.array([0, 1, 2, 2, 3, 0])
+
+    def __init__(self):
+        self.group = InstructionGroup()
+        self.meshes = []
+        for rgba in self.COLORS:
+            self.group.add(Color(*rgba))
+            mesh = Mesh(mode='triangles')
+            self.group.add(mesh)
+            self.meshes.append(mesh)
+
+    def update(self, rects, levels, origin, scale):
+        """`rects` (n, 4) store rectangles with `levels` 1..len(COLORS)"""
+        for level, mesh in enumerate(self.meshes, start=1):
+            r = rects[levels == level][:self.QUADS_PER_MESH]
+            x0 = origin[0] + r[:, 0] * scale[0]
+            y0 = origin[1] + r[:, 1] * scale[1]
+            x1 = x0 + r[:, 2] * scale[0]
+            y1 = y0 + r[:, 3] * scale[1]
+            vertices = np.zeros((len(r), 4, 4), dtype=np.float32)
+            vertices[:, :, 0] = np.column_stack((x0, x1, x1, x0))
+            vertices[:, :, 1] = np.column_stack((y0, y0, y1, y1))
+            mesh.vertices = vertices.ravel().tolist()
+            mesh.indices = (np.arange(len(r))[:, None] * 4 + self.QUAD).ravel().tolist()
+
+
+class FleetMapWidget(PanZoomMixin, StencilView):
+    """
+    Live map of every cart. Carts are markers in two ItemMarkerBatches (live
+    and lost), so the whole fleet is a handful of meshes however many carts
+    report. Each frame drains the FleetState inbox and re-lays out only the
+    carts that reported since the previous frame. The congestion overlay and
+    the live/lost split are refreshed every OVERLAY_INTERVAL.
+    """
+
+    def __init__(self, fleet, viewport, **kwargs):
+        super().__init__(**kwargs)
+        self.fleet = fleet
+        self.viewport = viewport
+        self.touches = []
+        self.congestion = CongestionMap(STORE_LAYOUT)
+        self.zones = (np.empty((0, 4)), np.empty(0, dtype=np.intp))
+
+        self.overlay = ZoneOverlay()
+        self.lost_markers = ItemMarkerBatch((0.45, 0.45, 0.45, 0.6), CART_TEMPLATE)
+        self.live_markers = ItemMarkerBatch((0.1, 0.45, 1, 0.9), CART_TEMPLATE)
+        self.canvas.add(self.overlay.group)
+        self.canvas.add(self.lost_markers.group)
+        self.canvas.add(self.live_markers.group)
+
+        self.frame_time = 0.0
+        self.set_transform()
+        self.viewport.bind(self.on_viewport)
+        self.bind(pos=self.follow_widget, size=self.follow_widget)
+
+        Clock.schedule_interval(self.update_frame, 0)
+        Clock.schedule_interval(self.update_overlay, OVERLAY_INTERVAL)
+
+    def follow_widget(self, *args):
+        self.viewport.set_widget(self.pos, self.size)
+
+    def set_transform(self):
+        origin, scale = self.viewport.transform()
+        self.live_markers.set_transform(origin, scale)
+        self.lost_markers.set_transform(origin, scale)
+        self.overlay.update(*self.zones, origin, scale)
+
+    def on_viewport(self, viewport):
+        self.set_transform()
+
+    def update_frame(self, dt):
+        start = time.perf_counter()
+        added, updated = self.fleet.drain()
+        if updated:
+            live = self.live_markers
+            revived = [c for c in updated if c in self.lost_markers.slots]
+            if revived:
+                self.lost_markers.remove_many(revived)
+            moved = [c for c in updated if c in live.slots]
+            fresh = [c for c in updated if c not in live.slots]
+            live.move_many(moved, self.fleet.positions(moved))
+            live.add_many(fresh, self.fleet.positions(fresh))
+            if added:
+                LOG.info("%d new cart(s), %d tracked", len(added), len(self.fleet))
+
+        self.live_markers.flush()
+        self.lost_markers.flush()
+        self.frame_time = time.perf_counter() - start
+
+    def update_overlay(self, dt=None):
+        now = time.time()
+        for cart_id in self.fleet.expire(now):
+            batch = self.live_markers if cart_id in self.live_markers.slots else self.lost_markers
+            batch.remove_many([cart_id])
+
+        live = self.fleet.live(now)
+        stale = [self.fleet.ids[s] for s in np.flatnonzero(~live)]
+        lost = [c for c in stale if c in self.live_markers.slots]
+        if lost:
+            self.live_markers.remove_many(lost)
+            self.lost_markers.add_many(lost, self.fleet.positions(lost))
+
+        count = len(self.fleet)
+        zones, levels = self.congestion.congested(self.fleet.x[:count][live], self.fleet.y[:count][live])
+        self.zones = (self.congestion.rects(zones), levels)
+        origin, scale = self.viewport.transform()
+        self.overlay.update(*self.zones, origin, scale)
+
+    def stats(self):
+        return {
+            "carts": len(self.fleet),
+            "lost": len(self.lost_markers),
+            "jammed": int(np.count_nonzero(self.zones[1] == len(ZoneOverlay.COLORS))),
+            "frame_ms": self.frame_time * 1000,
+        }
+
+
+class SupervisorApp(App):
+    def __init__(self, fleet, **kwargs):
+        super().__init__(**kwargs)
+        self.fleet = fleet
+        self.last_received = 0
+        self.last_status = time.monotonic()
+
+    def build(self):
+        self.title = "CyberKart - Fleet Supervisor"
+        viewport = Viewport(STORE_LAYOUT.width, STORE_LAYOUT.height)
+
+        root = FloatLayout()
+        root.add_widget(BackgroundWidget(viewport=viewport))
+        self.map_widget = FleetMapWidget(self.fleet, viewport)
+        root.add_widget(self.map_widget)
+
+        self.status = Label(size_hint=(1, None), height=dp(32), pos_hint={'x': 0, 'top': 1},
+                            color=(0, 0, 0, 1), font_size='16sp')
+        root.add_widget(self.status)
+        Clock.schedule_interval(self.refresh_status, 1.0)
+        return root
+
+    def refresh_status(self, dt):
+        now = time.monotonic()
+        rate = (self.fleet.received - self.last_received) / max(now - self.last_status, 1e-6)
+        self.last_received, self.last_status = self.fleet.received, now
+        stats = self.map_widget.stats()
+        self.status.text = (f"{stats['carts']} carts ({stats['lost']} lost) | {rate:.0f} updates/s | "
+                            f"{stats['jammed']} jammed zones | frame {stats['frame_ms']:.2f} ms")
+
+
+# ----------------- MAIN EXECUTION -----------------
+def main():
+    parser = argparse.ArgumentParser(description="Live map of every cart in the store")
+    parser.add_argument("--broker", default=MQTT_BROKER)
+    parser.add_argument("--simulate", type=int, metavar="CARTS", default=0,
+                        help="feed this many simulated carts instead of connecting to the broker")
+    parser.add_argument("--rate", type=float, default=5.0, help="simulated updates per cart per second")
+    args = parser.parse_args()
+
+    AsyncLog.setup()
+    fleet = FleetState(STORE_LAYOUT)
+    stop = None
+    if args.simulate:
+        LOG.info("Simulating %d carts at %.1f Hz", args.simulate, args.rate)
+        stop = start_simulation(fleet, STORE_LAYOUT, args.simulate, args.rate)
+    else:
+        # connects in the background and subscribes again after every reconnect
+        Broker.get_connection(args.broker).subscribe(FLEET_TOPIC, fleet.on_message)
+
+    SupervisorApp(fleet).run()
+
+    if stop is not None:
+        stop.set()
+    Broker.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from Positioning import PositioningEngine, BEACONS
+
+# ----------------- CONFIGURATION -----------------
+MQTT_BROKER = "192.168.137.8"
+MQTT_PORT = 1883
+MQTT_RSSI_TOPIC = "indoor/rssi"             # the firmware publishes to indoor/rssi/<cart id>
+MQTT_POSITION_TOPIC = "indoor/position"     # and to indoor/position/<cart id>
+CLIENT_ID = f"Trace_Recorder_{int(time.time())}"
+
+CHUNK_ROWS = 4096           # rows buffered per stream before a chunk is written
+CYCLE_PERIOD = 3.0          # firmware loop period (2 s scan + 1 s delay), used when no positions were recorded
+
+# stream -> ordered (column, dtype)
+STREAMS = {
+    "rssi": [("t", np.float64), ("device_ms", np.uint32), ("beacon", np.int8), ("rssi", np.int16)],
+    "position": [("t", np.float64), ("x", np.float32), ("y", np.float32), ("uncertainty", np.float32)],
+}
+
+
+# ----------------- RECORDING -----------------
+class TraceWriter:
+    """
+    Columnar, chunked trace on disk:
+        <trace>/meta.json
+        <trace>/<stream>/<column>.<chunk>.npy
+    Every chunk is a plain .npy file so readers can memory-map it.
+    """
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS, cart_id=None):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.cart_id = cart_id
+        self.lock = threading.Lock()
+        self.buffers = {name: {col: [] for col, _ in cols} for name, cols in STREAMS.items()}
+        self.chunk_counts = {name: 0 for name in STREAMS}
+        self.row_counts = {name: 0 for name in STREAMS}
+        self.created = datetime.now().isoformat(timespec="seconds")
+
+        for name in STREAMS:
+            os.makedirs(os.path.join(path, name), exist_ok=True)
+        self._write_meta()
+
+    def append(self, stream, **values):
+        with self.lock:
+            buffer = self.buffers[stream]
+            for col, _ in STREAMS[stream]:
+                buffer[col].append(values[col])
+            if len(buffer["t"]) >= self.chunk_rows:
+                self._flush_stream(stream)
+
+    def extend(self, stream, **columns):
+        """Append many rows at once (equal-length column sequences)"""
+        with self.lock:
+            buffer = self.buffers[stream]
+            for col, _ in STREAMS[stream]:
+                buffer[col].extend(columns[col])
+            if len(buffer["t"]) >= self.chunk_rows:
+                self._flush_stream(stream)
+
+    def flush(self):
+        with self.lock:
+            for stream in STREAMS:
+                self._flush_stream(stream)
+
+    def _flush_stream(self, stream):
+        buffer = self.buffers[stream]
+        rows = len(buffer["t"])
+        if rows == 0:
+            return
+
+        chunk = self.chunk_counts[stream]
+        for col, dtype in STREAMS[stream]:
+            target = os.path.join(self.path, stream, f"{col}.{chunk:05d}.npy")
+            np.save(target, np.asarray(buffer[col], dtype=dtype))
+            buffer[col] = []
+
+        self.chunk_counts[stream] += 1
+        self.row_counts[stream] += rows
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {
+            "version": 1,
+            "created": self.created,
+            "cart": self.cart_id,
+            "beacons": [b[1] for b in BEACONS],
+            "streams": {name: [col for col, _ in cols] for name, cols in STREAMS.items()},
+            "chunks": self.chunk_counts,
+            "rows": self.row_counts,
+        }
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+
+def parse_rssi_payload(payload):
+    """'beacon,rssi,millis;...' from publishRawReadings() -> (beacon, rssi, device_ms) lists"""
+    beacons, rssis, device_ms = [], [], []
+    for entry in payload.strip().split(";"):
+        if not entry:
+            continue
+        b, r, ms = entry.split(",")
+        beacons.append(int(b))
+        rssis.append(int(r))
+        device_ms.append(int(ms))
+    return beacons, rssis, device_ms
+
+
+class TraceRecorder:
+    """
+    Subscribes to one cart's raw RSSI and positions and writes both to a
+    TraceWriter. The shared indoor/position topic mixes every cart, so only
+    the per-cart topics are recorded.
+    """
+
+    def __init__(self, path, cart_id, broker=MQTT_BROKER, port=MQTT_PORT, chunk_rows=CHUNK_ROWS):
+        self.writer = TraceWriter(path, chunk_rows, cart_id)
+        self.rssi_topic = f"{MQTT_RSSI_TOPIC}/{cart_id}"
+        self.position_topic = f"{MQTT_POSITION_TOPIC}/{cart_id}"
+        self.broker = broker
+        self.port = port
+        self.mqtt_client = None
+
+    def start(self):
+        import paho.mqtt.client as mqtt
+
+        self.mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=CLIENT_ID)
+        self.mqtt_client.on_connect = self.on_connect
+        self.mqtt_client.message_callback_add(self.rssi_topic, self.on_rssi)
+        self.mqtt_client.message_callback_add(self.position_topic, self.on_position)
+        self.mqtt_client.connect(self.broker, self.port, 60)
+        self.mqtt_client.loop_start()
+
+    def stop(self):
+        if self.mqtt_client:
+            self.mqtt_client.loop_stop()
+            self.mqtt_client.disconnect()
+        self.writer.flush()
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc == 0:
+            client.subscribe(self.rssi_topic)
+            client.subscribe(self.position_topic)
+            print(f" Recording {self.rssi_topic} and {self.position_topic} to {self.writer.path}")
+        else:
+            print(f" Trace recorder failed to connect, return code {rc}")
+
+    def on_rssi(self, client, userdata, msg):
+        try:
+            beacons, rssis, device_ms = parse_rssi_payload(msg.payload.decode())
+            now = time.time()
+            self.writer.extend("rssi", t=[now] * len(beacons), device_ms=device_ms,
+                               beacon=beacons, rssi=rssis)
+        except Exception as e:
+            print(f" Error recording RSSI payload: {e}")
+
+    def on_position(self, client, userdata, msg):
+        try:
+            parts = msg.payload.decode().strip().split(",")
+            uncertainty = float(parts[2]) if len(parts) > 2 else 0.0
+            self.writer.append("position", t=time.time(), x=float(parts[0]),
+                               y=float(parts[1]), uncertainty=uncertainty)
+        except Exception as e:
+            print(f" Error recording position payload: {e}")
+
+
+# ----------------- READING -----------------
+class TraceReader:
+    """Memory-maps the chunks of a recorded trace"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+
+    def chunks(self, stream):
+        """Yield one dict of memory-mapped columns per chunk"""
+        for chunk in range(self.meta["chunks"].get(stream, 0)):
+            yield {
+                col: np.load(os.path.join(self.path, stream, f"{col}.{chunk:05d}.npy"), mmap_mode="r")
+                for col in self.meta["streams"][stream]
+            }
+
+    def load(self, stream):
+        """All chunks of a stream concatenated into one dict of arrays"""
+        columns = {col: [] for col in self.meta["streams"][stream]}
+        for chunk in self.chunks(stream):
+            for col, values in chunk.items():
+                columns[col].append(values)
+        return {
+            col: (np.concatenate(parts) if parts else np.empty(0, dtype=dict(STREAMS[stream])[col]))
+            for col, parts in columns.items()
+        }
+
+
+# ----------------- REPLAY -----------------
+def replay(reader, speed=None, on_position=None, **engine_params):
+    """
+    Stream a recording through a fresh PositioningEngine.
+
+    Readings are fed in batches between consecutive position ticks (the
+    recorded indoor/position timestamps, or CYCLE_PERIOD steps if none were
+    recorded). speed=None runs as fast as possible; otherwise replay is paced
+    at `speed` times real time (e.g. 1000). engine_params go straight to
+    PositioningEngine, so PATH_LOSS_EXPONENT, FILTER_RESET_DISTANCE and filter
+    noise can be swept without touching the firmware.
+
+    Returns a dict of arrays: t, x, y, uncertainty, filtered_x, filtered_y,
+    plus the recorded firmware positions for comparison.
+    """
+    rssi = reader.load("rssi")
+    recorded = reader.load("position")
+
+    if len(recorded["t"]):
+        ticks = np.asarray(recorded["t"])
+    elif len(rssi["t"]):
+        ticks = np.arange(rssi["t"][0] + CYCLE_PERIOD, rssi["t"][-1] + CYCLE_PERIOD, CYCLE_PERIOD)
+    else:
+        ticks = np.empty(0)
+
+    engine = PositioningEngine(**engine_params)
+    out = np.empty((len(ticks), 5))
+
+    # Batch boundaries: every reading with t <= tick that was not fed yet
+    bounds = np.searchsorted(rssi["t"], ticks, side="right")
+    start = 0
+    wall_start = time.perf_counter()
+
+    for i, tick in enumerate(ticks):
+        stop = bounds[i]
+        if stop > start:
+            engine.add_readings(rssi["beacon"][start:stop], rssi["rssi"][start:stop], rssi["t"][start:stop])
+            start = stop
+
+        out[i] = engine.update(tick)
+        if on_position:
+            on_position(tick, out[i])
+
+        if speed:
+            ahead = (tick - ticks[0]) / speed - (time.perf_counter() - wall_start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    return {
+        "t": ticks,
+        "x": out[:, 0],
+        "y": out[:, 1],
+        "uncertainty": out[:, 2],
+        "filtered_x": out[:, 3],
+        "filtered_y": out[:, 4],
+        "recorded_x": np.asarray(recorded["x"], dtype=float),
+        "recorded_y": np.asarray(recorded["y"], dtype=float),
+    }
+
+
+def score_replay(result):
+    """Default sweep score: agreement with the recorded firmware output and path jitter"""
+    fx, fy = result["filtered_x"], result["filtered_y"]
+    scores = {"updates": int(len(fx))}
+    if len(fx) > 1:
+        scores["mean_step"] = float(np.mean(np.hypot(np.diff(fx), np.diff(fy))))
+    if len(result["recorded_x"]) == len(fx) and len(fx):
+        scores["mean_offset_from_recorded"] = float(np.mean(
+            np.hypot(result["x"] - result["recorded_x"], result["y"] - result["recorded_y"])))
+    return scores
+
+
+def sweep(reader, grid, score=score_replay, seed=0):
+    """
+    Replay the same recording once per combination in `grid`
+    ({param: [values, ...]}) and return [(params, scores), ...].
+    """
+    names = sorted(grid)
+    results = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(zip(names, values))
+        result = replay(reader, seed=seed, **params)
+        results.append((params, score(result)))
+    return results
+
+
+# ----------------- COMMAND LINE -----------------
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay positioning traces")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="record one cart's raw RSSI and positions from MQTT")
+    rec.add_argument("path")
+    rec.add_argument("--cart", required=True, help="cart id: the tag's Wi-Fi MAC without colons")
+    rec.add_argument("--broker", default=MQTT_BROKER)
+
+    rep = sub.add_parser("replay", help="replay a trace through the Python engine")
+    rep.add_argument("path")
+    rep.add_argument("--speed", type=float, default=None, help="times real time (default: unpaced)")
+    rep.add_argument("--set", action="append", default=[], metavar="PARAM=VALUE")
+
+    swp = sub.add_parser("sweep", help="replay a trace once per parameter combination")
+    swp.add_argument("path")
+    swp.add_argument("--grid", action="append", default=[], metavar="PARAM=V1,V2,...")
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        recorder = TraceRecorder(args.path, args.cart, broker=args.broker)
+        recorder.start()
+        print(" Press Ctrl+C to stop recording")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        recorder.stop()
+        print(f" Trace saved: {recorder.writer.row_counts}")
+
+    elif args.command == "replay":
+        params = dict(item.split("=", 1) for item in args.set)
+        params = {k: _parse_value(v) for k, v in params.items()}
+        started = time.perf_counter()
+        result = replay(TraceReader(args.path), speed=args.speed, **params)
+        elapsed = time.perf_counter() - started
+        span = result["t"][-1] - result["t"][0] if len(result["t"]) > 1 else 0.0
+        print(json.dumps(score_replay(result), indent=2))
+        print(f" Replayed {span:.1f}s of recording in {elapsed:.3f}s")
+
+    elif args.command == "sweep":
+        grid = {}
+        for item in args.grid:
+            name, values = item.split("=", 1)
+            grid[name] = [_parse_value(v) for v in values.split(",")]
+        for params, scores in sweep(TraceReader(args.path), grid):
+            print(json.dumps({"params": params, "scores": scores}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import logging
+import queue
+
+import AsyncLog
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def make_logger(name, level):
+    logger = logging.getLogger(f"{AsyncLog.ROOT_LOGGER}.test.{name}")
+    logger.setLevel(level)
+    logger.propagate = False
+    handler = ListHandler()
+    logger.addHandler(handler)
+    return logger, handler
+
+
+def test_log_site_samples_and_reports_suppressed_calls():
+    logger, handler = make_logger("sample", logging.DEBUG)
+    site = AsyncLog.LogSite(logger, logging.DEBUG, sample=3)
+    for i in range(7):
+        site("tick %d", i)
+    assert handler.messages == ["tick 2 (+2 suppressed)", "tick 5 (+2 suppressed)"]
+
+
+def test_log_site_is_silent_when_its_level_is_disabled():
+    logger, handler = make_logger("disabled", logging.INFO)
+    site = AsyncLog.LogSite(logger, logging.DEBUG, interval=5.0)
+    site("never")
+    assert not site.enabled()
+    assert handler.messages == [] and site.calls == 0
+
+
+def test_log_site_rate_limits_by_interval():
+    logger, handler = make_logger("interval", logging.DEBUG)
+    site = AsyncLog.LogSite(logger, logging.DEBUG, interval=60.0)
+    for i in range(5):
+        site("tick %d", i)
+    assert handler.messages == ["tick 0"] and site.suppressed == 4
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    handler = AsyncLog.DroppingQueueHandler(queue.Queue(2))
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "msg", None, None)
+    for _ in range(5):
+        handler.handle(record)
+    assert handler.queue.qsize() == 2 and handler.dropped == 3
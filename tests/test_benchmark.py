@@ -0,0 +1,19 @@
+import numpy as np
+
+from Benchmark import PIPELINES, RSSI_MODELS, run_pipeline, simulate_rssi, simulate_trajectory, true_cells
+from StoreLayout import StoreLayout
+
+
+def test_every_pipeline_is_scored_against_the_same_walkable_cells():
+    layout = StoreLayout.from_shelves([(1.0, 1.0, 2.0, 6.0), (3.0, 1.0, 4.0, 6.0), (5.0, 1.0, 6.0, 6.0)])
+    rng = np.random.default_rng(0)
+    t, xy = simulate_trajectory(layout, 120.0, rng)
+    assert layout.walkable_many(xy[:, 0], xy[:, 1]).all()
+
+    ticks, truth, batches = simulate_rssi(t, xy, RSSI_MODELS["nominal"], rng)
+    cells = true_cells(truth, layout)
+    assert layout.walkable_many(cells[:, 0], cells[:, 1]).all()
+
+    results = {name: run_pipeline(name, ticks, truth, cells, batches, layout, 0) for name in PIPELINES}
+    assert all(r["updates"] == len(ticks) for r in results.values())
+    assert results["idw+kalman+particle+map"]["snap_walkable"] == 1.0
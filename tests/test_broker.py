@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+from Broker import BrokerConnection
+
+CONNECTED = SimpleNamespace(is_failure=False)
+
+
+def message(topic, payload=b""):
+    return SimpleNamespace(topic=topic, payload=payload)
+
+
+def test_messages_are_routed_by_topic_filter():
+    connection = BrokerConnection("localhost", client_id="test")
+    seen = []
+    connection.subscribe("indoor/position/+", lambda c, u, msg: seen.append(("cart", msg.topic)))
+    connection.subscribe("indoor/items", lambda c, u, msg: seen.append(("items", msg.topic)))
+    connection.subscribe("indoor/items", lambda c, u, msg: 1 / 0)     # must not stop the others
+
+    connection.on_message(None, None, message("indoor/position/aa:bb"))
+    connection.on_message(None, None, message("indoor/items"))
+    connection.on_message(None, None, message("shopping_app/responses"))
+    assert seen == [("cart", "indoor/position/aa:bb"), ("items", "indoor/items")]
+
+
+def test_every_reconnect_restores_subscriptions_and_tells_listeners():
+    connection = BrokerConnection("localhost", client_id="test")
+    subscribed, events = [], []
+    client = SimpleNamespace(subscribe=lambda topics: subscribed.append(sorted(t for t, _ in topics)))
+    handler = lambda c, u, msg: None
+    connection.subscribe("indoor/items", handler)
+    connection.subscribe("shopping_app/responses", handler)
+    connection.when_connected(lambda: events.append("up"))
+    connection.when_disconnected(lambda: events.append("down"))
+
+    connection.on_connect(client, None, None, CONNECTED)
+    connection.on_disconnect(client, None, None, "lost")
+    assert not connection.connected.is_set()
+    connection.on_connect(client, None, None, CONNECTED)
+    assert connection.connected.is_set()
+    assert subscribed == [["indoor/items", "shopping_app/responses"]] * 2
+    assert events == ["up", "down", "up"]
+
+    # registered while up: runs at once rather than at the next reconnect
+    connection.when_connected(lambda: events.append("late"))
+    assert events[-1] == "late"
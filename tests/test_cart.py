@@ -0,0 +1,68 @@
+from Cart import CartModel, apply_scan_check, check_cached_scan
+from PriceCache import PriceCache
+
+
+def test_cart_keeps_scan_order_and_a_running_total():
+    cart = CartModel()
+    events = []
+    cart.bind(lambda event, item: events.append((event, item and item['barcode'])))
+
+    cart.add("111", "Milk", 3.49)
+    cart.add("222", "Oats", 0.1)
+    cart.add("111", "Milk", 3.49)
+    cart.increment("222", 2)
+    assert [item['barcode'] for item in cart] == ["111", "222"]
+    assert cart.get("111")['quantity'] == 2
+    assert cart.total_cents == 2 * 349 + 3 * 10
+    assert events == [("added", "111"), ("added", "222"), ("updated", "111"), ("updated", "222")]
+
+    events.clear()
+    cart.decrement("111")
+    cart.decrement("111")
+    assert "111" not in cart
+    assert events == [("updated", "111"), ("removed", "111")]
+    assert cart.total_cents == 30
+
+    assert cart.decrement("999") is None and cart.increment("999") is None
+    assert events == [("updated", "111"), ("removed", "111")]
+
+
+def test_snapshot_outlives_clear():
+    cart = CartModel()
+    cart.add("111", "Milk", 3.49, quantity=2)
+    receipt = cart.snapshot()
+    cart.increment("111")
+    cart.clear()
+    assert receipt == [{'barcode': "111", 'name': "Milk", 'price': 3.49, 'quantity': 2}]
+    assert len(cart) == 0 and cart.total == 0
+
+
+def test_reprice_corrects_the_line_and_the_total():
+    cart = CartModel()
+    events = []
+    cart.add("111", "Milk", 3.49, quantity=2)
+    cart.bind(lambda event, item: events.append(event))
+    cart.reprice("111", "Milk", 3.49)
+    assert events == []
+    cart.reprice("111", "Whole Milk", 2.99)
+    assert events == ["updated"]
+    assert cart.get("111")['name'] == "Whole Milk"
+    assert cart.total_cents == 598
+
+
+def test_cached_scans_are_undone_only_when_the_server_does_not_know_the_barcode():
+    cache = PriceCache()
+    cart = CartModel()
+    cache.put("111", "Milk", 3.49)
+    cart.add("111", "Milk", 3.49)
+
+    check = check_cached_scan(cache, "111", "ERROR: No response from server")
+    assert check is None
+    apply_scan_check(cart, "111", check)
+    assert cart.get("111")['quantity'] == 1 and cache.lookup("111") == ("Milk", 3.49)
+
+    apply_scan_check(cart, "111", check_cached_scan(cache, "111", "ITEM:111:Whole Milk:2.99"))
+    assert cart.get("111")['name'] == "Whole Milk" and cache.lookup("111") == ("Whole Milk", 2.99)
+
+    apply_scan_check(cart, "111", check_cached_scan(cache, "111", "ERROR: Item not found"))
+    assert cart.get("111") is None and cache.lookup("111") is None
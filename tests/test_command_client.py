@@ -0,0 +1,85 @@
+from concurrent.futures import CancelledError
+from types import SimpleNamespace
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from CommandClient import CommandClient, reply_text
+
+
+class FakeConnection:
+    """Stands in for a shared, connected Broker.BrokerConnection"""
+
+    def __init__(self):
+        self.published = []
+        self.routes = []
+
+    def subscribe(self, topic, handler):
+        self.routes.append((topic, handler))
+
+    def unsubscribe(self, topic, handler):
+        self.routes.remove((topic, handler))
+
+    def wait_connected(self, timeout=None):
+        return True
+
+    def publish(self, topic, payload):
+        self.published.append(payload)
+        return SimpleNamespace(rc=mqtt.MQTT_ERR_SUCCESS)
+
+
+def connected_client():
+    return CommandClient(client_id="cart1", connection=FakeConnection())
+
+
+def reply(commands, payload):
+    commands.on_message(None, None, SimpleNamespace(payload=payload.encode()))
+
+
+def test_replies_resolve_their_own_request_in_any_order():
+    commands = connected_client()
+    stock, prices = commands.request("STOCK"), commands.request("PRICES")
+    assert commands.connection.published == ["cart1#1:STOCK", "cart1#2:PRICES"]
+
+    reply(commands, "cart2#2:not ours")
+    reply(commands, "cart1#2:Milk: 1.99")
+    assert not stock.done() and prices.result() == "Milk: 1.99"
+    reply(commands, "cart1#1:Milk: 3")
+    assert stock.result() == "Milk: 3"
+
+    # a duplicate reply for a finished request is dropped
+    reply(commands, "cart1#1:again")
+    assert stock.result() == "Milk: 3" and commands.pending == {}
+
+
+def test_cancelled_requests_are_forgotten():
+    commands = connected_client()
+    lookup = commands.request("GET_BARCODE:Milk")
+    lookup.cancel()
+    assert commands.pending == {}
+    with pytest.raises(CancelledError):
+        lookup.result()
+    assert reply_text(lookup) == "ERROR: Request cancelled"
+
+
+def test_closing_leaves_a_shared_connection_up():
+    connection = FakeConnection()
+    commands = CommandClient(client_id="cart1", connection=connection)
+    commands.request("STOCK")
+    assert [topic for topic, _ in connection.routes] == ["shopping_app/responses"]
+    commands.close()
+    assert connection.routes == [] and commands.connection is connection
+
+
+def test_requests_after_close_do_not_listen_again():
+    connection = FakeConnection()
+    commands = CommandClient(client_id="cart1", connection=connection)
+    pending = commands.request("STOCK")
+    commands.close()
+    assert pending.cancelled()
+
+    late = commands.request("GET_BARCODE:Milk")
+    assert late.cancelled()
+    assert not commands.connect(wait=0)
+    assert connection.routes == [] and connection.published == ["cart1#1:STOCK"]
+    assert not commands.running
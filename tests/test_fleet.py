@@ -0,0 +1,47 @@
+import numpy as np
+
+from Fleet import CongestionMap, FleetState, cart_id_from_topic, parse_position
+from StoreLayout import StoreLayout
+
+
+def test_drain_keeps_the_newest_position_per_cart():
+    fleet = FleetState(capacity=2)
+    fleet.ingest("A", 1.0, 1.0, 10.0)
+    fleet.ingest("B", 2.0, 2.0, 10.0)
+    fleet.ingest("A", 1.5, 1.0, 11.0)
+    fleet.ingest("C", 3.0, 3.0, 11.0)
+    added, updated = fleet.drain()
+    assert added == ["A", "B", "C"] and len(fleet) == 3
+    np.testing.assert_array_equal(fleet.positions(["A", "C"]), [[1.5, 1.0], [3.0, 3.0]])
+    assert fleet.drain() == ([], [])
+
+    fleet.ingest("B", 2.5, 2.0, 12.0)
+    assert fleet.drain() == ([], ["B"])
+    assert fleet.live(now=15.0, stale_after=3.5).tolist() == [False, True, False]
+
+
+def test_expire_swaps_the_last_cart_into_the_freed_slot():
+    fleet = FleetState()
+    for i, t in enumerate([0.0, 100.0, 200.0]):
+        fleet.ingest(f"C{i}", float(i), 0.0, t)
+    fleet.drain()
+    assert fleet.expire(now=200.0, drop_after=120.0) == ["C0"]
+    assert fleet.ids == ["C2", "C1"] and fleet.slots == {"C2": 0, "C1": 1}
+    np.testing.assert_array_equal(fleet.positions(["C2", "C1"]), [[2.0, 0.0], [1.0, 0.0]])
+
+
+def test_congestion_counts_carts_per_walkable_area():
+    # zone (0, 0) is half shelving, so the same carts make it twice as dense
+    layout = StoreLayout.from_shelves([(0.0, 0.0, 0.5, 1.0)], width=2.0, height=1.0, resolution=0.1)
+    congestion = CongestionMap(layout, zone=1.0, levels=(1.0, 3.0))
+    np.testing.assert_allclose(congestion.area, [0.5, 1.0])
+
+    xs, ys = np.array([0.7, 0.8, 1.5, 1.6]), np.array([0.5, 0.5, 0.5, 0.5])
+    np.testing.assert_allclose(congestion.density(xs, ys), [4.0, 2.0])
+    zones, levels = congestion.congested(xs, ys)
+    assert zones.tolist() == [0, 1] and levels.tolist() == [2, 1]
+
+
+def test_topic_and_payload_parsing():
+    assert cart_id_from_topic("indoor/position/A0B1C2D3E4F5") == "A0B1C2D3E4F5"
+    assert parse_position(b"1.5,2.25,0.3") == (1.5, 2.25)
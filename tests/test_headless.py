@@ -0,0 +1,68 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+import Headless
+from Headless import HeadlessCart, build_report
+from Proximity import parse_items_update
+from Routing import Router
+from SearchIndex import SearchIndex, products_from_catalog
+from StoreLayout import StoreLayout
+
+CATALOG = json.dumps({"epoch": 1, "version": 0, "items": {"111": ["Milk", 3.49, 10]}})
+
+
+class FakeConnection:
+    host, port = "localhost", 1883
+
+    def __init__(self):
+        self.published = []
+
+    def subscribe(self, topic, handler):
+        pass
+
+    def unsubscribe(self, topic, handler):
+        pass
+
+    def publish(self, topic, payload):
+        self.published.append((topic, payload))
+        return SimpleNamespace(rc=mqtt.MQTT_ERR_SUCCESS)
+
+
+def test_items_update_parsing_is_shared_with_the_client():
+    payload = json.dumps({"type": "items_update", "items": [{"x": 1.0, "y": 2.0, "name": "Milk"}]})
+    assert parse_items_update(payload) == [(1.0, 2.0, "Milk")]
+    assert parse_items_update(json.dumps({"type": "catalog_changed"})) is None
+    assert products_from_catalog(CATALOG) == [{'name': "Milk", 'price': 3.49, 'quantity': 10, 'barcode': "111"}]
+
+
+def test_shopper_walks_the_aisles_until_the_item_is_reached(monkeypatch):
+    monkeypatch.setattr(Headless, "POSITION_RATE", 1000.0)
+    monkeypatch.setattr(Headless, "WALK_SPEED", 100.0)        # 0.1 m per published position
+    layout = StoreLayout.load()
+    rng = np.random.default_rng(3)
+    connection = FakeConnection()
+    cart = HeadlessCart("SIM0000", connection, CATALOG, SearchIndex(products_from_catalog(CATALOG)),
+                        layout, Router(layout), rng)
+    target = tuple(float(v) for v in layout.random_walkable(1, rng)[0])
+    cart.store_items = [(target[0], target[1], "Milk")]
+
+    assert cart.walk_to("Milk", target, threading.Event())
+    positions = [tuple(map(float, payload.split(","))) for topic, payload in connection.published]
+    assert all(topic == "indoor/position/SIM0000" for topic, _ in connection.published)
+    assert np.hypot(positions[-1][0] - target[0], positions[-1][1] - target[1]) < Headless.ProximityEngine().threshold
+    # never through a shelf (published positions are rounded to the millimetre)
+    assert all(layout.is_walkable(x, y) for x, y in positions[:-1])
+
+
+def test_report_totals_every_cart():
+    summaries = [{"cart": f"SIM{i}", "errors": {op: i for op in Headless.OPERATIONS},
+                  "latencies_ms": {op: [float(i + 1)] for op in Headless.OPERATIONS}} for i in range(3)]
+    report = build_report(summaries)
+    assert report["totals_ms"]["scan"]["count"] == 3
+    assert report["totals_ms"]["scan"]["errors"] == 3
+    assert report["totals_ms"]["scan"]["p50"] == 2.0
+    assert [cart["cart"] for cart in report["carts"]] == ["SIM0", "SIM1", "SIM2"]
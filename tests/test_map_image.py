@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+import MapImage
+
+
+def write_png(path, color):
+    pixels = np.zeros((4, 6, 4), dtype=np.uint8)
+    pixels[...] = color
+    pixels[0] = (255, 255, 255, 255)      # top row, so the flip is visible
+    Image.fromarray(pixels, "RGBA").save(path)
+
+
+def test_rgba_is_decoded_once_then_memory_mapped(tmp_path):
+    image, cache = str(tmp_path / "theMap.png"), str(tmp_path / "cache")
+    write_png(image, (10, 20, 30, 255))
+
+    first = MapImage.load_rgba(image, cache)
+    assert first.shape == (4, 6, 4)
+    # bottom-up rows: the image's top row is last
+    assert tuple(first[-1, 0]) == (255, 255, 255, 255) and tuple(first[0, 0]) == (10, 20, 30, 255)
+
+    second = MapImage.load_rgba(image, cache)
+    assert isinstance(second, np.memmap)
+    np.testing.assert_array_equal(first, second)
+
+
+def test_changed_image_replaces_its_stale_cache_entry(tmp_path):
+    image, cache = str(tmp_path / "theMap.png"), str(tmp_path / "cache")
+    write_png(image, (10, 20, 30, 255))
+    old_entry = MapImage.cache_path(image, cache)
+    MapImage.load_rgba(image, cache)
+
+    write_png(image, (40, 50, 60, 255))
+    os.utime(image, ns=(0, os.stat(image).st_mtime_ns + 10 ** 9))
+    assert tuple(MapImage.load_rgba(image, cache)[0, 0]) == (40, 50, 60, 255)
+    assert not os.path.exists(old_entry)
+    assert [e for e in os.listdir(cache) if e.endswith(".rgba.npy")] == [os.path.basename(MapImage.cache_path(image, cache))]
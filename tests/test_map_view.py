@@ -0,0 +1,47 @@
+import numpy as np
+
+from MapView import LRUCache, MapTiles, Viewport, cluster_points
+
+
+def test_zoom_keeps_the_point_under_the_cursor_and_fit_restores_the_store():
+    viewport = Viewport(100.0, 60.0)
+    viewport.set_widget((10, 20), (800, 600))
+    assert viewport.zoom == 8.0
+    x0, y0, x1, y1 = viewport.bounds()
+    assert x0 <= 0 and y0 <= 0 and x1 >= 100 and y1 >= 60
+
+    before = viewport.to_store(300, 200)
+    viewport.zoom_at(4.0, 300, 200)
+    assert viewport.zoom == 32.0 and not viewport.fitted
+    np.testing.assert_allclose(viewport.to_store(300, 200), before)
+
+    viewport.zoom_at(1e-3, 300, 200)
+    assert viewport.fitted and viewport.zoom == viewport.min_zoom
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert "a" in cache and "c" in cache and "b" not in cache
+
+
+def test_tiles_cover_the_view_at_the_level_for_the_zoom():
+    rgba = np.arange(1000 * 600 * 4, dtype=np.uint32).astype(np.uint8).reshape(600, 1000, 4)
+    tiles = MapTiles(rgba, 100.0, 60.0, tile_size=256)
+    assert tiles.level_for(10.0) == 0 and tiles.level_for(2.5) == 2
+
+    keys = tiles.visible((0.0, 0.0, 100.0, 60.0), 0)
+    assert len(keys) == 4 * 3
+    assert tiles.pixels((0, 3, 2)).shape == (600 - 512, 1000 - 768, 4)
+    np.testing.assert_array_equal(tiles.pixels((1, 0, 0)), rgba[:512:2, :512:2])
+    assert tiles.pixels((2, 0, 0)).shape[:2] == (150, 250)
+
+
+def test_clusters_are_centroids_of_grid_cells():
+    xs = np.array([0.1, 0.4, 5.2, 5.6])
+    ys = np.array([0.2, 0.6, 5.5, 5.5])
+    cx, cy, counts = cluster_points(xs, ys, 1.0)
+    assert sorted(zip(cx.round(2), cy.round(2), counts)) == [(0.25, 0.4, 2), (5.4, 5.5, 2)]
@@ -0,0 +1,69 @@
+import numpy as np
+
+from Positioning import (DistanceTables, PositioningEngine, PATH_LOSS_EXPONENT, REFERENCE_RSSI,
+                         RSSI_MAX, RSSI_MIN)
+
+
+def direct_distance(ref, rssi):
+    """calculateDistance() from the firmware, evaluated per reading"""
+    return min(max(10 ** ((ref - rssi) / (10 * PATH_LOSS_EXPONENT)), 0.1), 15.0)
+
+
+def test_tables_match_direct_formula():
+    refs = [-58, -62, -55]
+    tables = DistanceTables(refs)
+    for b, ref in enumerate(refs):
+        rssi = np.arange(RSSI_MIN, RSSI_MAX + 1)
+        distance, _, _ = tables.lookup(np.full(len(rssi), b), rssi)
+        expected = [direct_distance(ref, r) for r in rssi]
+        np.testing.assert_allclose(distance, expected)
+
+
+def test_valid_window_matches_is_rssi_valid():
+    tables = DistanceTables([REFERENCE_RSSI])
+    rssi = np.arange(-110, 0)
+    _, _, ok = tables.lookup(np.zeros(len(rssi), dtype=int), rssi)
+    expected = [RSSI_MIN <= r <= RSSI_MAX and REFERENCE_RSSI - 40 <= r <= REFERENCE_RSSI + 25 for r in rssi]
+    assert ok.tolist() == expected
+
+
+def test_recalibrate_swaps_all_tables_at_once():
+    tables = DistanceTables([-58, -58])
+    before = tables._tables
+    tables.set_beacon_calibration(1, -70)
+    assert before[0].tolist() == [-58, -58]
+    assert tables.ref_rssi.tolist() == [-58, -70]
+    d, _, _ = tables.lookup([0, 1], [-70, -70])
+    assert d[1] == direct_distance(-70, -70)
+    assert d[0] == direct_distance(-58, -70)
+
+
+def test_invalid_readings_are_not_buffered():
+    engine = PositioningEngine(seed=0)
+    accepted = engine.add_readings([0, 0, 1], [-20, -120, -60], [1.0, 1.0, 1.0])
+    assert accepted == 1
+    assert engine.rssi[1] == -60
+    assert not engine.valid[0]
+
+
+def test_constrained_particles_and_snapped_output_stay_out_of_shelves():
+    from StoreLayout import StoreLayout
+
+    layout = StoreLayout.from_shelves([(1.0, 1.0, 2.0, 6.0), (3.0, 1.0, 4.0, 6.0), (5.0, 1.0, 6.0, 6.0)])
+    engine = PositioningEngine(layout=layout, blocked_penalty=0.0, num_particles=200, seed=1)
+    engine.initialize_particles()
+    assert layout.walkable_many(engine.particles[:, 0], engine.particles[:, 1]).all()
+
+    for step in range(50):
+        engine.update_particles(2.5, 0.5 + step * 0.1, 0.5)
+        assert layout.walkable_many(engine.particles[:, 0], engine.particles[:, 1]).all()
+
+
+def test_grid_snap_never_lands_in_a_shelf():
+    from StoreLayout import StoreLayout
+
+    layout = StoreLayout.from_shelves([(1.0, 1.0, 2.0, 6.0)])
+    engine = PositioningEngine(layout=layout)
+    for x in np.linspace(0.0, 7.0, 29):
+        for y in np.linspace(0.0, 7.0, 29):
+            assert layout.is_walkable(*engine.snap(x, y))
@@ -0,0 +1,50 @@
+import json
+
+from PriceCache import PriceCache
+
+
+def snapshot(epoch, version, items):
+    return json.dumps({"epoch": epoch, "version": version, "items": items})
+
+
+def event(epoch, version, items):
+    return json.dumps({"type": "catalog_changed", "epoch": epoch, "version": version, "items": items})
+
+
+def test_events_update_the_snapshot_and_gaps_ask_for_a_resync():
+    cache = PriceCache()
+    assert not cache.load_snapshot(snapshot(1, 4, {"111": ["Milk", 3.49, 10], "222": ["Oats", 2.0, 5]}))
+    assert cache.lookup("111") == ("Milk", 3.49)
+    assert cache.lookup("999") is None
+
+    assert not cache.apply_event(event(1, 5, {"111": ["Milk", 2.99, 10]}))
+    assert cache.lookup("111") == ("Milk", 2.99)
+
+    # an older snapshot never undoes a newer event
+    cache.load_snapshot(snapshot(1, 4, {"111": ["Milk", 3.49, 10]}))
+    assert cache.lookup("111") == ("Milk", 2.99)
+
+    assert cache.apply_event(event(1, 7, {"222": ["Oats", 2.5, 5]}))
+    assert not cache.apply_event(json.dumps({"type": "something_else"}))
+
+
+def test_a_server_restart_drops_the_old_entries():
+    cache = PriceCache()
+    cache.load_snapshot(snapshot(1, 9, {"111": ["Milk", 3.49, 10]}))
+    assert cache.apply_event(event(2, 1, {"222": ["Oats", 2.0, 5]}))
+    cache.load_snapshot(snapshot(2, 0, {"333": ["Tea", 4.0, 1]}))
+    assert cache.lookup("111") is None
+    assert cache.lookup("222") == ("Oats", 2.0)
+    assert cache.lookup("333") == ("Tea", 4.0)
+
+
+def test_events_that_beat_the_first_snapshot_are_kept():
+    cache = PriceCache()
+    assert cache.apply_event(event(1, 5, {"111": ["Milk", 2.99, 10]}))
+    assert cache.apply_event(event(1, 3, {"111": ["Milk", 9.99, 10]}))
+    assert not cache.load_snapshot(snapshot(1, 4, {"111": ["Milk", 3.49, 10]}))
+    assert cache.lookup("111") == ("Milk", 2.99)
+
+    cache = PriceCache()
+    cache.apply_event(event(1, 6, {"111": ["Milk", 2.99, 10]}))
+    assert cache.load_snapshot(snapshot(1, 4, {"111": ["Milk", 3.49, 10]}))
@@ -0,0 +1,47 @@
+import numpy as np
+
+from Proximity import ProximityEngine
+
+
+def test_query_matches_a_python_scan():
+    rng = np.random.default_rng(5)
+    items = [(float(x), float(y), f"item{i}") for i, (x, y) in enumerate(rng.uniform(0, 7, (500, 2)))]
+    engine = ProximityEngine(threshold=0.3, epsilon=0.0)
+    engine.sync(items, 1)
+
+    for x, y in rng.uniform(0, 7, (20, 2)):
+        distances = [np.hypot(x - ix, y - iy) for ix, iy, _ in items]
+        result = engine.query(x, y)
+        assert result.nearest == items[int(np.argmin(distances))]
+        assert abs(result.nearest_distance - min(distances)) < 1e-9
+        assert result.reached == [item for item, d in zip(items, distances) if d < 0.3]
+
+
+def test_query_is_reused_until_the_cart_moves_or_items_change():
+    engine = ProximityEngine(threshold=0.3, epsilon=0.02)
+    engine.sync([(1.0, 1.0, "milk")], 1)
+    first = engine.query(1.5, 1.0)
+    assert first.reached == []
+    assert engine.query(1.51, 1.0) is first
+
+    # same version: the item list is not re-read
+    assert not engine.sync([(1.5, 1.0, "milk")], 1)
+    assert engine.query(1.5, 1.0) is first
+
+    assert engine.sync([(1.5, 1.0, "milk")], 2)
+    assert engine.query(1.5, 1.0).reached == [(1.5, 1.0, "milk")]
+
+    engine.sync([], 3)
+    assert engine.query(1.5, 1.0).nearest is None
+
+
+def test_visible_matches_a_bounds_filter():
+    rng = np.random.default_rng(9)
+    xy = rng.uniform(0, 100, (5000, 2))
+    engine = ProximityEngine()
+    engine.sync([(x, y, f"item{i}") for i, (x, y) in enumerate(xy)], 1)
+
+    for x0, y0 in rng.uniform(-10, 90, (10, 2)):
+        bounds = (x0, y0, x0 + 17.5, y0 + 9.25)
+        inside = (xy[:, 0] >= bounds[0]) & (xy[:, 0] <= bounds[2]) & (xy[:, 1] >= bounds[1]) & (xy[:, 1] <= bounds[3])
+        assert sorted(engine.visible(bounds).tolist()) == np.flatnonzero(inside).tolist()
@@ -0,0 +1,30 @@
+import importlib.util
+import os
+
+import pytest
+
+from Receipt import ReceiptWorker, prune_receipts, receipt_filename
+
+
+@pytest.mark.skipif(importlib.util.find_spec("reportlab") is None, reason="reportlab not installed")
+def test_long_carts_render_on_the_worker_to_distinct_files(tmp_path):
+    items = [{'barcode': str(i), 'name': f"Item {i}", 'price': 1.25, 'quantity': 2} for i in range(100)]
+    worker = ReceiptWorker()
+    try:
+        first = worker.submit(items, 250.0, filename=receipt_filename(str(tmp_path))).result(timeout=30)
+        second = worker.submit(items[:1], 2.5, filename=receipt_filename(str(tmp_path))).result(timeout=30)
+    finally:
+        worker.close()
+    assert first != second
+    with open(first, "rb") as f:
+        pdf = f.read()
+    assert pdf.startswith(b"%PDF") and pdf.count(b"/Type /Page\n") + pdf.count(b"/Type /Page\r") >= 3
+
+
+def test_prune_keeps_recent_receipts(tmp_path):
+    old, new = tmp_path / "old.pdf", tmp_path / "new.pdf"
+    old.write_bytes(b"%PDF")
+    new.write_bytes(b"%PDF")
+    os.utime(old, (0, 0))
+    prune_receipts(str(tmp_path), max_age=3600)
+    assert not old.exists() and new.exists()
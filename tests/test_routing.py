@@ -0,0 +1,36 @@
+import numpy as np
+
+from Routing import Router
+from StoreLayout import StoreLayout
+
+
+def aisle_store():
+    # two shelves with a gap only at the top: x = 1..2 and x = 3..4, y = 0..6 of 7
+    return StoreLayout.from_shelves([(1.0, 0.0, 2.0, 6.0), (3.0, 0.0, 4.0, 6.0)], width=7.0, height=7.0)
+
+
+def test_route_goes_around_shelves_and_stays_in_aisles():
+    layout = aisle_store()
+    router = Router(layout)
+    order, points = router.plan((0.5, 0.5), [(2.5, 0.5)])
+    assert order == [0]
+    assert points[0] == (0.5, 0.5) and points[-1] == (2.5, 0.5)
+    # it must climb over the end of the first shelf
+    assert max(y for _, y in points) > 6.0
+
+    for (x0, y0), (x1, y1) in zip(points[1:-2], points[2:-1]):
+        for t in np.linspace(0, 1, 20):
+            assert layout.is_walkable(x0 + t * (x1 - x0), y0 + t * (y1 - y0))
+
+
+def test_plans_are_cached_and_always_start_at_the_cart():
+    router = Router(aisle_store())
+    targets = [(5.5, 0.5), (0.5, 3.0)]
+    assert router.planned((0.5, 0.5), targets) is None
+
+    order, points = router.plan((0.5, 0.5), targets)
+    assert order == [1, 0]
+    # a move inside the same aisle node reuses the plan but starts from the new position
+    cached_order, cached_points = router.planned((0.52, 0.55), targets)
+    assert cached_order == order
+    assert cached_points[0] == (0.52, 0.55) and cached_points[1:] == points[1:]
@@ -0,0 +1,84 @@
+from concurrent.futures import Future
+
+from PriceCache import PriceCache
+from ScanQueue import ScanQueue
+
+
+class FakeCommands:
+    """Answers every request with the next of `replies`; an exception fails it"""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.sent = []
+
+    def request(self, command):
+        self.sent.append(command)
+        future = Future()
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            future.set_exception(reply)
+        else:
+            future.set_result(reply)
+        return future
+
+
+def test_scans_survive_a_restart_and_a_torn_last_line(tmp_path):
+    path = tmp_path / "queue.jsonl"
+    queue = ScanQueue(str(path))
+    queue.append("111")
+    queue.append("222")
+    queue.append("111")
+    with open(path, "a") as f:
+        f.write('{"barcode": "33')
+
+    restored = ScanQueue(str(path))
+    assert restored.pending() == ["111", "222", "111"]
+    restored.append("444")
+    assert ScanQueue(str(path)).pending() == ["111", "222", "111", "444"]
+
+
+def test_replay_discards_only_what_it_confirmed(tmp_path):
+    path = str(tmp_path / "queue.jsonl")
+    queue = ScanQueue(path)
+    for barcode in ["111", "222", "111"]:
+        queue.append(barcode)
+
+    entries, barcodes = queue.batch()
+    assert barcodes == ["111", "222"]
+    # while the replay is in flight: one scan removed, one new scan queued
+    queue.drop("111")
+    queue.append("333")
+    queue.discard(entries)
+    assert queue.pending() == ["333"]
+    assert ScanQueue(path).pending() == ["333"]
+
+    queue.clear()
+    assert len(ScanQueue(path)) == 0
+
+
+def test_drop_takes_the_newest_scan_of_a_barcode(tmp_path):
+    queue = ScanQueue(str(tmp_path / "queue.jsonl"))
+    for barcode in ["111", "222", "111", "222"]:
+        queue.append(barcode)
+    queue.drop("111")
+    assert queue.pending() == ["111", "222", "222"]
+    queue.drop("999")
+    assert queue.pending() == ["111", "222", "222"]
+
+
+def test_a_failed_replay_keeps_the_scans_for_the_retry(tmp_path):
+    queue = ScanQueue(str(tmp_path / "queue.jsonl"))
+    cache = PriceCache()
+    for barcode in ["111", "222", "111"]:
+        queue.append(barcode)
+    commands = FakeCommands(TimeoutError("No response from server"), "ERROR: Server busy", "ITEMS:{not json",
+                            'ITEMS:{"111": ["Milk", 3.49, 10], "222": null}')
+
+    for _ in range(3):
+        assert queue.replay(commands, cache) is None
+        assert queue.pending() == ["111", "222", "111"]
+
+    found = queue.replay(commands, cache)
+    assert found == {"111": ["Milk", 3.49, 10], "222": None}
+    assert commands.sent == ["GET_ITEMS:111,222"] * 4
+    assert len(queue) == 0 and cache.lookup("111") == ("Milk", 3.49)
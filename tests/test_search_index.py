@@ -0,0 +1,30 @@
+import random
+
+from SearchIndex import SearchIndex
+
+
+def brute_force(products, query):
+    q = query.lower()
+    return [p for p in products if q in p["name"].lower() or q in p["barcode"].lower()]
+
+
+def test_search_matches_a_full_scan_while_typing():
+    rng = random.Random(4)
+    words = ["Milk", "Oat", "Cheez", "It", "Mini", "Sock", "Pretzel", "Snoopy", "Winter", "Altoids"]
+    products = [{"name": " ".join(rng.sample(words, 3)), "barcode": f"{rng.randrange(10 ** 12):012d}"}
+                for _ in range(2000)]
+    index = SearchIndex(products)
+
+    for query in ["m", "mi", "min", "mini", "mini s", "mini sn", "mini snoopy", "0", "007", "0077",
+                  "ILK", "milk oat", "xyz", "it\0mi"]:
+        assert index.search(query) == brute_force(products, query), query
+
+    # backspacing must not keep narrowing from the longer query
+    for query in ["pretzel", "pretz", "pre", "p"]:
+        assert index.search(query) == brute_force(products, query), query
+
+
+def test_grams_do_not_span_name_and_barcode():
+    index = SearchIndex([{"name": "Milk", "barcode": "12"}])
+    assert index.search("lk1") == []
+    assert index.search("") == []
@@ -0,0 +1,33 @@
+import threading
+
+from Startup import StartupTimer
+
+
+def test_timeline_keeps_first_occurrences_in_time_order():
+    clock = iter([0.1, 0.2, 0.3, 0.4, 0.6, 0.7]).__next__
+    timer = StartupTimer(start=0.0)
+    timer.elapsed = clock
+
+    timer.mark("modules imported")                  # 0.1
+    with timer.span("map background loaded"):       # 0.2 .. 0.3
+        pass
+    timer.mark("modules imported")                  # 0.4, a repeat: ignored
+    timer.report("first map frame")                 # 0.6
+    timer.mark("broker connected")                  # 0.7, after the report
+
+    assert [(round(at, 3), duration and round(duration, 3), name) for at, duration, name in timer.events] == [
+        (0.1, None, "modules imported"),
+        (0.3, 0.1, "map background loaded"),
+        (0.6, None, "first map frame"),
+        (0.7, None, "broker connected"),
+    ]
+
+
+def test_marks_from_many_threads_are_all_kept():
+    timer = StartupTimer()
+    threads = [threading.Thread(target=timer.mark, args=(f"phase {i}",)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(timer.events) == 20
@@ -0,0 +1,59 @@
+import numpy as np
+
+from StoreLayout import StoreLayout, _nearest_cells
+
+
+def brute_force_nearest(target):
+    cells = np.argwhere(target)
+    rows, cols = target.shape
+    distance = np.empty((rows, cols))
+    for r in range(rows):
+        for c in range(cols):
+            distance[r, c] = np.sqrt(((cells - (r, c)) ** 2).sum(axis=1)).min()
+    return distance
+
+
+def test_distance_transform_matches_brute_force():
+    rng = np.random.default_rng(3)
+    target = rng.random((23, 31)) < 0.15
+    distance, near_row, near_col = _nearest_cells(target)
+    np.testing.assert_allclose(distance, brute_force_nearest(target))
+    # the reported feature is a target cell at exactly that distance
+    assert target[near_row, near_col].all()
+    rows, cols = np.indices(target.shape)
+    np.testing.assert_allclose(np.hypot(near_row - rows, near_col - cols), distance)
+
+
+def test_shelves_block_cells_and_snap_to_nearest_aisle():
+    layout = StoreLayout.from_shelves([(1.0, 1.0, 2.0, 6.0)], width=7.0, height=7.0, resolution=0.1)
+    assert layout.is_walkable(0.5, 3.0)
+    assert not layout.is_walkable(1.5, 3.0)
+    assert not layout.is_walkable(-0.1, 3.0)
+
+    x, y = layout.snap(1.12, 3.02)
+    assert layout.is_walkable(x, y)
+    assert abs(x - 0.95) < 1e-9 and abs(y - 3.05) < 1e-9
+
+
+def test_snap_table_is_built_on_first_blocked_snap():
+    layout = StoreLayout.from_shelves([(1.0, 1.0, 2.0, 6.0)])
+    assert layout.snap(0.5, 0.5) == (0.5, 0.5)
+    xs, ys = layout.snap_many([0.5, 3.0], [0.5, 3.0])
+    assert layout._nearest is None
+
+    xs, ys = layout.snap_many([0.5, 1.5], [0.5, 3.0])
+    assert layout._nearest is not None
+    assert layout.walkable_many(xs, ys).all()
+
+
+def test_signed_distance_is_positive_in_aisles_and_negative_in_shelves():
+    layout = StoreLayout.from_shelves([(1.0, 1.0, 2.0, 6.0)])
+    assert layout._signed_distance is None
+    field = layout.signed_distance
+    assert (field[layout.walkable] > 0).all()
+    assert (field[~layout.walkable] < 0).all()
+
+    xs = np.array([0.5, 1.5, -1.0])
+    ys = np.array([3.0, 3.0, 3.0])
+    values = layout.signed_distance_many(xs, ys)
+    assert values[0] > 0 and values[1] < 0 and values[2] < 0
@@ -0,0 +1,46 @@
+import numpy as np
+
+from Trace import TraceReader, TraceRecorder, TraceWriter, parse_rssi_payload, replay
+
+
+def test_parse_rssi_payload():
+    assert parse_rssi_payload("0,-60,1000;2,-71,1005;") == ([0, 2], [-60, -71], [1000, 1005])
+    assert parse_rssi_payload("") == ([], [], [])
+
+
+def test_written_chunks_read_back_in_order(tmp_path):
+    writer = TraceWriter(str(tmp_path), chunk_rows=4, cart_id="A1")
+    for i in range(10):
+        writer.append("position", t=float(i), x=i * 0.5, y=1.0, uncertainty=0.2)
+    writer.extend("rssi", t=[0.5, 1.5], device_ms=[500, 1500], beacon=[0, 1], rssi=[-60, -65])
+    writer.flush()
+
+    reader = TraceReader(str(tmp_path))
+    assert reader.meta["cart"] == "A1"
+    assert reader.meta["chunks"]["position"] == 3
+    positions = reader.load("position")
+    np.testing.assert_array_equal(positions["t"], np.arange(10.0))
+    np.testing.assert_allclose(positions["x"], np.arange(10) * 0.5)
+    assert reader.load("rssi")["rssi"].tolist() == [-60, -65]
+
+
+def test_recorder_follows_one_cart_only(tmp_path):
+    recorder = TraceRecorder(str(tmp_path), "A1B2C3")
+    assert recorder.rssi_topic == "indoor/rssi/A1B2C3"
+    assert recorder.position_topic == "indoor/position/A1B2C3"
+
+
+def test_replay_yields_one_position_per_recorded_tick(tmp_path):
+    writer = TraceWriter(str(tmp_path))
+    rng = np.random.default_rng(0)
+    for tick in range(1, 21):
+        t = tick * 3.0
+        writer.extend("rssi", t=[t - 1.0] * 4, device_ms=[0] * 4, beacon=[0, 1, 2, 3],
+                      rssi=rng.integers(-70, -55, size=4).tolist())
+        writer.append("position", t=t, x=3.5, y=3.5, uncertainty=0.5)
+    writer.flush()
+
+    result = replay(TraceReader(str(tmp_path)), seed=0)
+    assert len(result["x"]) == 20
+    assert np.isfinite(result["filtered_x"]).all()
+    assert ((result["x"] >= 0) & (result["x"] <= 7)).all()